@@ -0,0 +1,163 @@
+import asyncio
+import json
+import os
+import time
+import numpy as np
+import requests
+from datetime import datetime, timezone
+from core.logger import logger
+from core import metrics
+from utils import get_current_utc_timestamp_ms
+
+LEVEL_NAMES = ("threshold2", "threshold")
+
+class StdoutSink:
+    name = "stdout"
+
+    def __init__(self, sink_config):
+        pass
+
+    async def send(self, alert):
+        print(f"ALERT {alert['asset']} {alert['column']} {alert['percentage']}% crossed {alert['level']} ({alert['threshold']}%) {alert['direction']}", flush=True)
+
+class JsonlSink:
+    """Appends one JSON object per alert to a file."""
+    name = "jsonl"
+
+    def __init__(self, sink_config):
+        self.path = sink_config.get("path", "logs/alerts.jsonl")
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _append(self, line):
+        with open(self.path, "a") as f:
+            f.write(line + "\n")
+
+    async def send(self, alert):
+        await asyncio.get_running_loop().run_in_executor(None, self._append, json.dumps(alert))
+
+class WebhookSink:
+    """POSTs each alert as JSON to a url, e.g. a local bot."""
+    name = "webhook"
+
+    def __init__(self, sink_config):
+        self.url = sink_config["url"]
+        self.timeout = sink_config.get("timeout", 2)
+        self.session = requests.Session()
+
+    def _post(self, alert):
+        response = self.session.post(self.url, json=alert, timeout=self.timeout)
+        response.raise_for_status()
+
+    async def send(self, alert):
+        await asyncio.get_running_loop().run_in_executor(None, self._post, alert)
+
+SINK_TYPES = {sink.name: sink for sink in (StdoutSink, JsonlSink, WebhookSink)}
+
+def get_level(thresholds, value, previous_level, hysteresis):
+    """Number of thresholds (ascending) |value| is past, given the level before: a level is only left
+    once value falls hysteresis below its threshold. Works on scalars and on numpy arrays of values."""
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    value = np.asarray(value, dtype=np.float64)[..., None]
+    raw = (value >= thresholds).sum(axis=-1)
+    held = (value >= thresholds * (1 - hysteresis)).sum(axis=-1)
+    return np.maximum(raw, np.minimum(previous_level, held))
+
+class AlertEngine:
+    """Raises an alert when a column's % change crosses its threshold2 or threshold.
+
+    check() runs on every change to the results cache (price ticks and
+    scans), so it only compares a row against the level each column was at
+    before. A level is left only once the change falls hysteresis (0.1 =
+    10%) below its threshold, so a price hovering at a threshold does not
+    alert on every tick, and the same alert is not repeated within
+    cooldown seconds. The first value seen for a column only sets its level.
+    Every sink has its own bounded queue and task: check() never waits,
+    a slow sink only delays (and when its queue is full, drops) its own alerts.
+    """
+
+    def __init__(self, columns_config, alerts_config=None):
+        alerts_config = alerts_config or {}
+        # column -> thresholds in level order (threshold2 first), names alongside
+        self.columns = {}
+        for column in columns_config:
+            levels = [(name, column.get(name)) for name in LEVEL_NAMES if column.get(name) is not None]
+            if levels:
+                self.columns[column["name"]] = levels
+        self.hysteresis = alerts_config.get("hysteresis", 0.1)
+        self.cooldown_ms = alerts_config.get("cooldown", 300) * 1000
+        self.queue_size = alerts_config.get("queue_size", 1000)
+        self.levels = {}     # (asset, column) -> (level, direction); level counts the thresholds passed
+        self.last_sent = {}  # (asset, column, level, direction) -> ms
+        self.sinks = []
+        for sink_config in alerts_config.get("sinks", [{"type": "stdout"}]):
+            sink_type = SINK_TYPES.get(sink_config.get("type"))
+            if sink_type is None:
+                logger.error(f"Unknown alert sink type {sink_config.get('type')}, skipping it")
+                continue
+            self.sinks.append((sink_type(sink_config), asyncio.Queue(maxsize=self.queue_size)))
+
+    def check(self, asset, asset_data, event_time_ms=None):
+        """Compares a changed row against the previous levels; call on every cache update."""
+        for column_name, levels in self.columns.items():
+            data = asset_data.get(column_name) or {}
+            try:
+                percentage = float(data.get("percentage"))
+            except (TypeError, ValueError):
+                continue
+            direction = "up" if percentage >= 0 else "down"
+            key = (asset, column_name)
+            previous = self.levels.get(key)
+            # A flip of sign starts over from no level: the opposite side has its own crossings.
+            previous_level = previous[0] if previous and previous[1] == direction else 0
+            level = int(get_level([threshold for _, threshold in levels], abs(percentage), previous_level, self.hysteresis))
+            self.levels[key] = (level, direction)
+            if previous is None or level <= previous_level:
+                continue
+            self._raise(asset, column_name, levels[level - 1], level, direction, data, event_time_ms)
+
+    def _raise(self, asset, column_name, level, level_number, direction, data, event_time_ms):
+        now_ms = get_current_utc_timestamp_ms()
+        dedupe_key = (asset, column_name, level_number, direction)
+        if now_ms - self.last_sent.get(dedupe_key, -self.cooldown_ms) < self.cooldown_ms:
+            return
+        self.last_sent[dedupe_key] = now_ms
+
+        event_time_ms = event_time_ms or now_ms
+        alert = {
+            "time": datetime.fromtimestamp(event_time_ms / 1000, timezone.utc).isoformat(timespec="milliseconds"),
+            "event_time_ms": event_time_ms,
+            "asset": asset,
+            "column": column_name,
+            "level": level[0],
+            "threshold": level[1],
+            "direction": direction,
+            "percentage": data.get("percentage"),
+            "volatility": data.get("volatility"),
+            "old_price": data.get("old_price"),
+        }
+        metrics.alerts_total.inc(level=level[0])
+        for sink, queue in self.sinks:
+            try:
+                queue.put_nowait(alert)
+            except asyncio.QueueFull:
+                metrics.alerts_dropped.inc(sink=sink.name)
+                logger.warning(f"Alert queue of the {sink.name} sink is full, dropping alert for {asset} {column_name}")
+
+    async def _run_sink(self, sink, queue):
+        while True:
+            alert = await queue.get()
+            try:
+                await sink.send(alert)
+            except Exception as e:
+                metrics.alert_sink_errors.inc(sink=sink.name)
+                logger.error(f"Alert sink {sink.name} failed: {e}")
+                continue
+            # Crossing to delivery: from the price update (exchange event time when streaming) to the sink being done.
+            latency = time.time() - alert["event_time_ms"] / 1000
+            metrics.alert_delivery_seconds.observe(max(latency, 0), sink=sink.name)
+
+    async def run(self):
+        """Delivers queued alerts until cancelled."""
+        await asyncio.gather(*(self._run_sink(sink, queue) for sink, queue in self.sinks))
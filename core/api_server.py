@@ -0,0 +1,232 @@
+import asyncio
+import json
+from urllib.parse import urlsplit, parse_qs
+from core.logger import logger
+from core.scanner import VolatilityScanner
+from core.metrics import metrics
+from core.sharding import apply_rows
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+MAX_INGEST_BYTES = 32 * 1024 * 1024
+STATUS_TEXT = {200: "OK", 304: "Not Modified", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found", 405: "Method Not Allowed",
+               411: "Length Required", 413: "Payload Too Large", 503: "Service Unavailable"}
+
+class ApiServer:
+    """Serves the scanner results to local dashboards and bots over HTTP.
+
+    GET /snapshot           every asset's row; the ETag is the data version, If-None-Match gets a 304
+    GET /snapshot?since=V   only the rows that changed after version V
+    GET /events             Server-Sent Events: a snapshot, then the changed rows after every update
+    GET /metrics            scanner metrics in the Prometheus text format
+    POST /ingest            rows from shards on other hosts (only with "ingest" enabled)
+
+    The cache is read once per publish_interval and only re-serialized when
+    the data version moved, so the cost does not grow with the number of
+    clients. SSE clients that fall behind are disconnected; they resume with
+    Last-Event-ID and get the rows they missed.
+    """
+
+    def __init__(self, api_config=None):
+        api_config = api_config or {}
+        self.host = api_config.get("host", DEFAULT_HOST)
+        self.port = api_config.get("port", DEFAULT_PORT)
+        self.publish_interval = api_config.get("publish_interval", 1)
+        self.keepalive_interval = api_config.get("keepalive_interval", 15)
+        self.max_clients = api_config.get("max_sse_clients", 100)
+        self.client_queue_size = api_config.get("client_queue_size", 16)
+        self.ingest = api_config.get("ingest", False)
+        self.ingest_token = api_config.get("ingest_token")
+        self.running = True
+        self.version = None
+        self.timestamp = None
+        self.rows = {}
+        self.row_versions = {}
+        self.snapshot = None  # serialized body of the latest snapshot
+        self.deltas = {}      # since -> serialized delta body, for the current version only
+        self.clients = set()  # queues of connected SSE clients
+
+    def stop(self):
+        self.running = False
+
+    def _serialize(self, since=None):
+        assets = self.rows if since is None else {asset: self.rows[asset] for asset, version in self.row_versions.items() if version > since}
+        body = {"version": self.version, "timestamp": self.timestamp, "assets": assets}
+        if since is not None:
+            body["since"] = since
+        return json.dumps(body, separators=(",", ":")).encode()
+
+    def _get_delta(self, since):
+        if since not in self.deltas:
+            self.deltas[since] = self._serialize(since)
+        return self.deltas[since]
+
+    def _event(self, name, body):
+        return f"id: {self.version}\nevent: {name}\n".encode() + b"data: " + body + b"\n\n"
+
+    async def _publish(self):
+        """Takes a new snapshot if the scanner data changed and pushes the changed rows to SSE clients."""
+        async with VolatilityScanner.cache_lock:
+            version = VolatilityScanner.data_version
+            if version == self.version:
+                return
+            rows = VolatilityScanner.asset_data_cache.copy()
+            row_versions = VolatilityScanner.asset_data_versions.copy()
+            timestamp = VolatilityScanner.current_prices_cache.get("timestamp")
+
+        previous = self.version
+        self.version, self.timestamp, self.rows, self.row_versions = version, timestamp, rows, row_versions
+        self.snapshot = self._serialize()
+        self.deltas = {}
+        if not self.clients:
+            return
+
+        event = self._event("update", self._get_delta(previous) if previous is not None else self.snapshot)
+        for queue in list(self.clients):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Replace the backlog with the close marker; the client reconnects and catches up by Last-Event-ID.
+                self.clients.discard(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+                logger.warning("Dropping a slow API event stream client")
+
+    async def _run_publisher(self):
+        while self.running:
+            try:
+                await self._publish()
+            except Exception as e:
+                logger.error(f"Error publishing API snapshot: {e}")
+            await asyncio.sleep(self.publish_interval)
+
+    async def _write_response(self, writer, status, body=b"", headers=None, keep_alive=True):
+        lines = [f"HTTP/1.1 {status} {STATUS_TEXT[status]}", f"Content-Length: {len(body)}",
+                 f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        for name, value in (headers or {}).items():
+            lines.append(f"{name}: {value}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + body)
+        await writer.drain()
+
+    async def _handle_snapshot(self, writer, query, headers, keep_alive):
+        if self.snapshot is None:
+            await self._write_response(writer, 503, b'{"error":"no scan results yet"}', {"Content-Type": "application/json"}, keep_alive)
+            return
+
+        etag = f'"{self.version}"'
+        if headers.get("if-none-match") == etag:
+            await self._write_response(writer, 304, headers={"ETag": etag}, keep_alive=keep_alive)
+            return
+
+        since = query.get("since")
+        try:
+            body = self.snapshot if since is None else self._get_delta(int(since[0]))
+        except ValueError:
+            await self._write_response(writer, 400, b'{"error":"since must be an integer version"}', {"Content-Type": "application/json"}, keep_alive)
+            return
+        await self._write_response(writer, 200, body, {"Content-Type": "application/json", "ETag": etag, "Cache-Control": "no-cache"}, keep_alive)
+
+    async def _handle_events(self, writer, headers):
+        if len(self.clients) >= self.max_clients or self.snapshot is None:
+            await self._write_response(writer, 503, keep_alive=False)
+            return
+
+        queue = asyncio.Queue(maxsize=self.client_queue_size)
+        last_event_id = headers.get("last-event-id", "")
+        # A reconnecting client only needs what changed since the last event it saw.
+        first = self._event("update", self._get_delta(int(last_event_id))) if last_event_id.isdigit() else self._event("snapshot", self.snapshot)
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\nConnection: keep-alive\r\n\r\n" + first)
+        await writer.drain()
+
+        self.clients.add(queue)
+        try:
+            while self.running:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=self.keepalive_interval)
+                except asyncio.TimeoutError:
+                    event = b": keepalive\n\n"
+                if event is None:
+                    break
+                writer.write(event)
+                await writer.drain()
+        finally:
+            self.clients.discard(queue)
+
+    async def _handle_ingest(self, reader, writer, headers, keep_alive):
+        """Merges the rows a remote shard posted: {"shard": "2/4", "timestamp": ms, "assets": {asset: row}}."""
+        if self.ingest_token and headers.get("authorization") != f"Bearer {self.ingest_token}":
+            await self._write_response(writer, 401, keep_alive=False)
+            return False
+        if not headers.get("content-length", "").isdigit():
+            await self._write_response(writer, 411, keep_alive=False)
+            return False
+        length = int(headers["content-length"])
+        if length > MAX_INGEST_BYTES:
+            await self._write_response(writer, 413, keep_alive=False)
+            return False
+
+        body = await reader.readexactly(length)
+        try:
+            payload = json.loads(body)
+            rows = payload["assets"]
+            if not isinstance(rows, dict):
+                raise ValueError("assets must be an object")
+        except (ValueError, KeyError, TypeError) as e:
+            await self._write_response(writer, 400, json.dumps({"error": f"bad ingest body: {e}"}).encode(), {"Content-Type": "application/json"}, keep_alive)
+            return keep_alive
+        await apply_rows(rows, payload.get("timestamp"))
+        logger.debug(f"Ingested {len(rows)} rows from shard {payload.get('shard')}")
+        await self._write_response(writer, 200, json.dumps({"accepted": len(rows)}).encode(), {"Content-Type": "application/json"}, keep_alive)
+        return keep_alive
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while self.running:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                parts = request_line.decode("latin-1").split()
+                keep_alive = headers.get("connection", "").lower() != "close"
+                if len(parts) != 3:
+                    await self._write_response(writer, 400, keep_alive=False)
+                    break
+                method, target, _ = parts
+                url = urlsplit(target)
+                if method == "POST" and url.path == "/ingest" and self.ingest:
+                    keep_alive = await self._handle_ingest(reader, writer, headers, keep_alive)
+                elif method != "GET":
+                    keep_alive = False  # a request body may follow that is not read
+                    await self._write_response(writer, 405, headers={"Allow": "GET"}, keep_alive=keep_alive)
+                elif url.path == "/snapshot":
+                    await self._handle_snapshot(writer, parse_qs(url.query), headers, keep_alive)
+                elif url.path == "/metrics":
+                    body = metrics.render().encode()
+                    await self._write_response(writer, 200, body, {"Content-Type": "text/plain; version=0.0.4"}, keep_alive)
+                elif url.path == "/events":
+                    await self._handle_events(writer, headers)
+                    break
+                else:
+                    await self._write_response(writer, 404, keep_alive=keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            pass  # shutdown; nothing awaits connection tasks, so end quietly
+        finally:
+            writer.close()
+
+    async def run(self):
+        server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        logger.info(f"API listening on http://{self.host}:{self.port} (/snapshot, /events, /metrics)")
+        async with server:
+            await self._run_publisher()
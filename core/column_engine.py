@@ -0,0 +1,110 @@
+import numpy as np
+
+def align_klines(kline_store, assets, interval, interval_ms, window_start_ms, now_ms, fields=("close",)):
+    """Aligns every asset's stored klines onto one time grid, in one pass for all the fields needed.
+
+    Returns (open_times, {field: matrix}, close_times): open_times is the
+    shared grid of candle open times, the field matrices (closes, volumes, ...)
+    and close_times are assets x time with NaN (or 0) where an asset has no candle.
+    """
+    grid_start = -(-window_start_ms // interval_ms) * interval_ms  # first open_time >= window_start_ms
+    num_steps = max(0, (now_ms - grid_start) // interval_ms + 1)
+    open_times = grid_start + np.arange(num_steps, dtype=np.int64) * interval_ms
+
+    matrices = {field: np.full((len(assets), num_steps), np.nan) for field in fields}
+    close_times = np.zeros((len(assets), num_steps), dtype=np.int64)
+    for row, asset in enumerate(assets):
+        klines = kline_store.get_window(asset, interval, grid_start)
+        if len(klines) == 0:
+            continue
+        steps = (klines["open_time"] - grid_start) // interval_ms
+        in_grid = steps < num_steps
+        for field, matrix in matrices.items():
+            matrix[row, steps[in_grid]] = klines[field][in_grid]
+        close_times[row, steps[in_grid]] = klines["close_time"][in_grid]
+    return open_times, matrices, close_times
+
+def compute_change_columns(open_times, closes, close_times, current_prices, durations, interval_ms, now_ms, std_dev_multiplier, min_coverage=1.0):
+    """Computes % change and volatility for every duration across all assets in one pass.
+
+    current_prices is a vector with one price per asset (NaN if unknown). Returns
+    a dict of assets x durations matrices: "percentage", "volatility",
+    "old_price" and "old_timestamp" (ms), NaN where history is missing.
+    A window has a volatility when at least min_coverage of its step changes
+    are known (and 2). std_dev_multiplier None leaves out "volatility".
+    """
+    values = compute_change_series(open_times, closes, close_times, current_prices[:, None], durations, interval_ms, np.array([now_ms], dtype=np.int64), std_dev_multiplier,
+                                   min_coverage=min_coverage)
+    return {name: matrix[:, 0, :] for name, matrix in values.items()}
+
+def compute_change_series(open_times, closes, close_times, prices, durations, interval_ms, eval_times, std_dev_multiplier, last_closes=None, min_coverage=1.0):
+    """compute_change_columns for many points in time at once, e.g. to replay history.
+
+    prices is assets x eval_times. Each eval time only sees the grid up to
+    the candle it falls in, the newest candle being the still forming one;
+    last_closes (assets x eval_times, optional) is that candle's close as it
+    was at each eval time, when the grid holds its final close instead.
+    Returns assets x eval_times x durations matrices.
+    """
+    num_assets, num_steps = closes.shape
+    durations_ms = np.asarray(durations, dtype=np.int64) * 1000
+    eval_times = np.asarray(eval_times, dtype=np.int64)
+    empty = np.full((num_assets, len(eval_times), len(durations_ms)), np.nan)
+    if num_steps == 0:
+        return {"percentage": empty, "volatility": empty.copy(), "old_price": empty.copy(), "old_timestamp": empty.copy()}
+
+    last_steps = np.clip((eval_times - open_times[0]) // interval_ms, 0, num_steps - 1)  # newest candle per eval time
+
+    # Reference candle: the one opening a full interval before the start of each duration.
+    reference_steps = (eval_times[:, None] - durations_ms - interval_ms - open_times[0] + interval_ms - 1) // interval_ms
+    has_reference = (reference_steps >= 0) & (reference_steps <= last_steps[:, None])
+    reference_steps = np.clip(reference_steps, 0, num_steps - 1)
+
+    old_prices = np.where(has_reference, closes[:, reference_steps], np.nan)
+    old_timestamps = np.where(has_reference & ~np.isnan(old_prices), close_times[:, reference_steps], np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        percentages = (prices[:, :, None] - old_prices) / old_prices * 100
+    percentages[~np.isfinite(percentages)] = np.nan
+    if std_dev_multiplier is None:
+        return {"percentage": percentages, "old_price": old_prices, "old_timestamp": old_timestamps}
+
+    # Volatility: std-dev of step % changes over the last duration // interval candles, for every
+    # duration at once from running sums, over the candles of the window that are there.
+    with np.errstate(divide="ignore", invalid="ignore"):
+        step_changes = np.diff(closes, axis=1) / closes[:, :-1] * 100
+    valid = np.isfinite(step_changes)
+    step_changes = np.where(valid, step_changes, 0.0)
+    zeros = np.zeros((num_assets, 1))
+    sums = np.concatenate((zeros, np.cumsum(step_changes, axis=1)), axis=1)
+    squares = np.concatenate((zeros, np.cumsum(step_changes ** 2, axis=1)), axis=1)
+    counts = np.concatenate((zeros, np.cumsum(valid, axis=1)), axis=1)
+
+    # Running sums up to the newest candle's change, which is taken from last_closes when given.
+    window_ends = last_steps
+    end_sums, end_squares, end_counts = sums[:, window_ends], squares[:, window_ends], counts[:, window_ends]
+    if last_closes is not None:
+        previous = np.maximum(window_ends - 1, 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            last_changes = (last_closes - closes[:, previous]) / closes[:, previous] * 100
+        last_valid = np.isfinite(last_changes) & (window_ends > 0)
+        last_changes = np.where(last_valid, last_changes, 0.0)
+        end_sums = sums[:, previous] + last_changes
+        end_squares = squares[:, previous] + last_changes ** 2
+        end_counts = counts[:, previous] + last_valid
+
+    num_changes = durations_ms // interval_ms - 1
+    window_starts = np.clip(window_ends[:, None] - num_changes, 0, None)
+    window_sums = end_sums[:, :, None] - sums[:, window_starts]
+    window_squares = end_squares[:, :, None] - squares[:, window_starts]
+    window_counts = end_counts[:, :, None] - counts[:, window_starts]
+    min_counts = np.maximum(2, np.ceil(min_coverage * num_changes - 1e-9))
+    complete = (window_counts >= min_counts) & (num_changes >= 2) & (num_changes <= window_ends[:, None])
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        means = window_sums / window_counts
+        variances = np.maximum(window_squares / window_counts - means ** 2, 0.0)
+    std_devs = np.sqrt(variances)
+    volatilities = std_devs * std_dev_multiplier
+    volatilities[~complete | np.isclose(std_devs, 0.0)] = np.nan  # flat series, same as calculate_volatility
+
+    return {"percentage": percentages, "volatility": volatilities, "old_price": old_prices, "old_timestamp": old_timestamps}
@@ -1,5 +1,6 @@
 import json
 import os
+import sys
 
 CONFIG_DIR = "config"
 
@@ -19,5 +20,7 @@ assets_config = load_config("assets.json")
 scanner_config = load_config("scanner_config.json")
 #ta_assets_config = load_config("ta.json")
 
-if not assets_config or not scanner_config:
-    exit(1)
\ No newline at end of file
+def require_config():
+    """Exits if a config file is missing or invalid; called by entry points, not at import."""
+    if not assets_config or not scanner_config:
+        sys.exit(1)
\ No newline at end of file
@@ -1,74 +1,120 @@
-from rich.console import Console
 from rich.table import Table
-from datetime import datetime
 from rich.columns import Columns
 from rich.panel import Panel
 from rich.align import Align
+from rich.text import Text
 from rich import box
+import time
 from core.logger import logger
+from core import metrics
 from core.config_loader import scanner_config
+from core.flow_columns import FLOW_TYPES
 
-console = Console()
+EMPTY_CELL = "-"
+# TA rating cells: short label and style
+RATING_CELLS = {
+    "STRONG_BUY": ("S.Buy", "bold green"),
+    "BUY": ("Buy", "green"),
+    "NEUTRAL": ("Neutral", ""),
+    "SELL": ("Sell", "red"),
+    "STRONG_SELL": ("S.Sell", "bold red"),
+}
 
 class DisplayManager:
-    def display_results(self, assets_config, asset_data, current_prices={}):
+    """Builds the results tables, re-rendering only the rows whose data changed since the last frame.
+
+    Column thresholds are compiled into styles once. Each row's rendered cells
+    are cached together with the data version the scanner stamped on it, and
+    the whole frame is reused when no row changed.
+    """
+
+    def __init__(self):
+        # name, thresholds and the unit after the value: % for change columns, the flow columns have their own
+        self.columns = [(col["name"], col.get("threshold"), col.get("threshold2"), FLOW_TYPES.get(col.get("type"), (None, None, "%"))[2])
+                        for col in scanner_config["columns"]]
+        ta_config = scanner_config.get("ta", {})
+        self.ta_columns = [col["name"] for col in ta_config.get("columns", [])] if ta_config.get("enabled") else []
+        self.num_tables = scanner_config.get("screen", {}).get("table", 1)
+        self.row_cache = {}  # asset -> (data version, rendered cells)
+        self.frame = None
+        self.frame_assets = None
+
+    def _cell_style(self, percentage, threshold, threshold2):
+        if threshold is None:
+            return None
+        style = "green" if percentage > 0 else "red" if percentage < 0 else ""
+        magnitude = abs(percentage)
+        if magnitude >= threshold:
+            style += " on dark_sea_green3" if percentage > 0 else " on light_pink1"
+        elif threshold2 is not None and magnitude >= threshold2:
+            style += " on honeydew2" if percentage > 0 else " on cornsilk1"
+        return style.strip() or None
+
+    def _render_row(self, asset, asset_data):
+        row = [asset.removesuffix('USDT')]
+        for col_name, threshold, threshold2, unit in self.columns:
+            data = asset_data.get(col_name) if asset_data else None
+            if data is None:
+                row.append(EMPTY_CELL)
+                continue
+            percentage = data.get("percentage")
+            if percentage is None:
+                row.append(Align(EMPTY_CELL, align="center"))
+                continue
+            # The sign is dropped from the text, the colour shows the direction.
+            text = Text(f"{percentage.lstrip('-')}{unit}")
+            try:
+                text.stylize(self._cell_style(float(percentage), threshold, threshold2) or "")
+            except (ValueError, TypeError):
+                pass
+            row.append(Align(text, align="center"))
+        for col_name in self.ta_columns:
+            data = asset_data.get(col_name) if asset_data else None
+            if data is None:
+                row.append(Align(EMPTY_CELL, align="center"))
+            elif data.get("rating"):
+                label, style = RATING_CELLS.get(data["rating"], (data["rating"], ""))
+                row.append(Align(Text(label, style=style), align="center"))
+            else:
+                row.append(Align(data.get("value", EMPTY_CELL), align="center"))
+        return row
+
+    def display_results(self, assets_config, asset_data, current_prices={}, versions=None):
+        """Returns the renderable for the results; rows are re-rendered only when their version changed.
+
+        Without versions every row is rendered again.
+        """
         if not assets_config:
             logger.info("No assets to display.")
-            return
+            return None
 
-        #console.clear()
+        render_start = time.perf_counter()
+        changed = self.frame is None or self.frame_assets != assets_config
+        for asset in assets_config:
+            version = versions.get(asset, 0) if versions is not None else None  # 0: no data for the asset yet
+            cached = self.row_cache.get(asset)
+            if version is None or cached is None or cached[0] != version:
+                self.row_cache[asset] = (version, self._render_row(asset, asset_data.get(asset)))
+                changed = True
 
-        desired_column_order = [col["name"] for col in scanner_config["columns"]]
-        num_tables = scanner_config.get("screen", {}).get("table", 1)
-        asset_names = assets_config
-        num_assets = len(asset_names)
-        assets_per_table = (num_assets + num_tables - 1) // num_tables
+        if not changed:
+            metrics.render_seconds.observe(time.perf_counter() - render_start)
+            return self.frame
 
         tables = []
-
-        for i in range(num_tables):
+        for i in range(self.num_tables):
             table = Table(show_header=False, box=None, padding=(0, 1))
             table.add_column("Asset", style="bold")
-            for col_name in desired_column_order:
+            for col_name, _, _, _ in self.columns:
+                table.add_column(col_name, justify="center")
+            for col_name in self.ta_columns:
                 table.add_column(col_name, justify="center")
             tables.append(table)
 
-        for i, asset in enumerate(asset_names):
-            table_index = i % num_tables
-            row = [asset.removesuffix('USDT')]
-            for col_name in desired_column_order:
-                if asset in asset_data and col_name in asset_data[asset]:
-                    data = asset_data[asset][col_name]
-                    percentage = data.get("percentage")
-                    if percentage is not None:
-                        percentage_display = float(percentage) * -1 if percentage < '0' else percentage #remove the sign as its coloured now
-                        cell_content = f"{percentage_display}%"
-                    else:
-                        percentage_display = percentage
-                        cell_content = "-"
-
-                    styled_content = cell_content
-                    try:
-                        if percentage is not None:
-                            percentage_float = float(percentage)
-                            threshold = next((col["threshold"] for col in scanner_config["columns"] if col["name"] == col_name), None)
-                            threshold2 = next((col["threshold2"] for col in scanner_config["columns"] if col["name"] == col_name), None)
-                            if threshold is not None:
-                                if percentage_float > 0:
-                                    styled_content = f"[green]{styled_content}[/green]"
-                                elif percentage_float < 0:
-                                    styled_content = f"[red]{styled_content}[/red]"
-                                if threshold2 is not None and abs(percentage_float) >= threshold2 and abs(percentage_float) < threshold:
-                                    styled_content = f"[on honeydew2]{styled_content}[/on honeydew2]" if percentage_float > 0 else f"[on cornsilk1]{styled_content}[/on cornsilk1]"
-                                if abs(percentage_float) >= threshold:
-                                    styled_content = f"[on dark_sea_green3]{styled_content}[/on dark_sea_green3]" if percentage_float > 0 else f"[on light_pink1]{styled_content}[/on light_pink1]"
-                    except (ValueError, TypeError):  # Correctly indented
-                        pass  # Correctly indented
-                    aligned_content = Align(styled_content, align="center")
-                    row.append(aligned_content)
-                else:
-                    row.append("-")
-            tables[table_index].add_row(*row)
+        for i, asset in enumerate(assets_config):
+            tables[i % self.num_tables].add_row(*self.row_cache[asset][1])
 
-        columns = Columns([Panel(table, padding=(0, 0), box=box.SIMPLE_HEAD) for table in tables], equal=True, expand=True, padding=(0, 0))
-        console.print(columns)
\ No newline at end of file
+        self.frame = Columns([Panel(table, padding=(0, 0), box=box.SIMPLE_HEAD) for table in tables], equal=True, expand=True, padding=(0, 0))
+        self.frame_assets = list(assets_config)
+        metrics.render_seconds.observe(time.perf_counter() - render_start)
+        return self.frame
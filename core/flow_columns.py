@@ -0,0 +1,102 @@
+import numpy as np
+
+# Column "type" -> (kline fields it reads, decimals, unit shown after the value)
+FLOW_TYPES = {
+    "volume_zscore": (("volume",), 1, "σ"),
+    "taker_buy": (("volume", "taker_buy_vol"), 1, "%"),
+    "trades": (("number_of_trades",), 0, "%"),
+    "atr": (("high", "low", "close"), 2, "%"),
+}
+
+def is_flow_column(column):
+    return column.get("type", "change") in FLOW_TYPES
+
+def column_decimals(column):
+    """Decimals a column's value is shown with; % change columns have 1."""
+    return FLOW_TYPES.get(column.get("type"), (None, 1))[1]
+
+def history_seconds(column):
+    """Seconds of history a column needs: its duration, plus the lookback of the columns that compare against one."""
+    lookback = int(column.get("lookback", 86400)) if column.get("type") in ("volume_zscore", "trades") else 0
+    return int(column["duration"]) + lookback
+
+def flow_fields(columns):
+    """Kline fields the flow columns need, besides close."""
+    return sorted({field for column in columns for field in FLOW_TYPES[column["type"]][0]} - {"close"})
+
+def _window_sums(values, candles, windows):
+    """Sums of `values` (assets x time) over the last `windows` windows of `candles` candles, newest first.
+    A window missing any candle is NaN."""
+    num_assets, num_steps = values.shape
+    valid = ~np.isnan(values)
+    zeros = np.zeros((num_assets, 1))
+    sums = np.concatenate((zeros, np.cumsum(np.where(valid, values, 0.0), axis=1)), axis=1)
+    counts = np.concatenate((zeros, np.cumsum(valid, axis=1)), axis=1)
+    ends = num_steps - np.arange(windows) * candles
+    starts = ends - candles
+    in_grid = starts >= 0
+    starts, ends = np.clip(starts, 0, None), np.clip(ends, 0, None)
+    window_sums = sums[:, ends] - sums[:, starts]
+    complete = (counts[:, ends] - counts[:, starts] == candles) & in_grid
+    return np.where(complete, window_sums, np.nan)
+
+def _spike(values, candles, lookback_windows, zscore):
+    """The newest window's sum against the sums of the lookback_windows windows before it: a z-score,
+    or the % above their mean."""
+    sums = _window_sums(values, candles, lookback_windows + 1)
+    recent, previous = sums[:, 0], sums[:, 1:]
+    valid = ~np.isnan(previous)
+    known = valid.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.where(valid, previous, 0.0).sum(axis=1) / known
+        if zscore:
+            std = np.sqrt((np.where(valid, previous - mean[:, None], 0.0) ** 2).sum(axis=1) / known)
+            result = (recent - mean) / std
+        else:
+            result = (recent / mean - 1) * 100
+    result[(known < 2) | ~np.isfinite(result)] = np.nan
+    return result
+
+def compute_flow_columns(fields, columns, interval_ms):
+    """Computes the volume/flow columns of one kline interval for all assets at once.
+
+    fields holds assets x time matrices of kline fields aligned on one grid
+    (NaN where a candle is missing), the last step being the forming candle.
+    Every column looks at its last duration of candles up to now, except
+    volume_zscore and trades: they compare whole windows, so theirs ends
+    with the newest closed candle (a forming candle's count is partial).
+      volume_zscore - volume of the window against the volumes of the windows
+                      of the same length over the lookback before it (z-score)
+      taker_buy     - taker buy share of the window's volume, as an imbalance
+                      from -100% (all sells) to 100% (all buys)
+      trades        - trade count of the window, % above the average of the
+                      windows over the lookback
+      atr           - average true range of the window's candles, % of price
+    Returns one assets vector per column, NaN where history is missing.
+    """
+    results = []
+    for column in columns:
+        candles = max(1, int(column["duration"]) * 1000 // interval_ms)
+        lookback_windows = int(column.get("lookback", 86400)) // int(column["duration"])
+        column_type = column["type"]
+        if column_type == "volume_zscore":
+            values = _spike(fields["volume"][:, :-1], candles, lookback_windows, zscore=True)
+        elif column_type == "trades":
+            values = _spike(fields["number_of_trades"][:, :-1], candles, lookback_windows, zscore=False)
+        elif column_type == "taker_buy":
+            volumes = _window_sums(fields["volume"], candles, 1)[:, 0]
+            taker_buys = _window_sums(fields["taker_buy_vol"], candles, 1)[:, 0]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                values = (2 * taker_buys / volumes - 1) * 100
+        else:  # atr
+            highs, lows, closes = fields["high"], fields["low"], fields["close"]
+            previous_closes = np.concatenate((np.full((len(closes), 1), np.nan), closes[:, :-1]), axis=1)
+            # True range; a candle without a previous close falls back to its high - low.
+            with np.errstate(invalid="ignore"):
+                true_ranges = np.fmax(highs - lows, np.fmax(np.abs(highs - previous_closes), np.abs(lows - previous_closes)))
+            true_ranges[np.isnan(highs) | np.isnan(lows)] = np.nan
+            with np.errstate(divide="ignore", invalid="ignore"):
+                values = _window_sums(true_ranges, candles, 1)[:, 0] / candles / closes[:, -1] * 100
+        values = np.where(np.isfinite(values), values, np.nan)
+        results.append(values)
+    return results
@@ -0,0 +1,169 @@
+import os
+import struct
+import numpy as np
+from core.klines import KLINE_DTYPE, empty_klines
+from core.logger import logger
+from utils import get_interval_seconds
+
+DEFAULT_CACHE_DIR = os.path.join("cache", "klines")
+MAGIC = b"KLN1"
+HEADER = struct.Struct("<4sII")  # magic, record size, reserved
+RECORD_DTYPE = KLINE_DTYPE.newbyteorder("<")
+
+class KlineCache:
+    """Append-only on-disk kline history, one binary file per symbol and interval.
+
+    A file is a small header followed by fixed-size little-endian KLINE_DTYPE
+    records in open_time order. Only closed candles are written, as they close.
+    On load the file is checked for torn writes, bad records and gaps; what
+    survives is the contiguous run of candles ending at the newest one.
+    """
+
+    def __init__(self, retention_ms, cache_config=None):
+        cache_config = cache_config or {}
+        self.directory = cache_config.get("directory", DEFAULT_CACHE_DIR)
+        self.max_size_bytes = int(cache_config.get("max_size_mb", 200) * 1024 * 1024)
+        self.retention_ms = retention_ms  # interval -> how far back the scanner needs candles
+        self.last_written = {}  # (symbol, interval) -> open_time of the newest record on disk
+        self.record_counts = {}  # (symbol, interval) -> records on disk
+
+    def _path(self, symbol, interval):
+        return os.path.join(self.directory, interval, f"{symbol}.klines")
+
+    def _write(self, symbol, interval, klines):
+        """Rewrites the whole file with `klines`."""
+        path = self._path(symbol, interval)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, RECORD_DTYPE.itemsize, 0))
+            f.write(klines.astype(RECORD_DTYPE).tobytes())
+        os.replace(tmp_path, path)
+        key = (symbol, interval)
+        self.record_counts[key] = len(klines)
+        if len(klines):
+            self.last_written[key] = int(klines["open_time"][-1])
+        else:
+            self.last_written.pop(key, None)
+
+    def _good_records(self, klines, interval):
+        """Mask of the records that are well-formed candles of the interval."""
+        interval_ms = get_interval_seconds(interval) * 1000
+        open_times = klines["open_time"]
+        return (
+            (open_times % interval_ms == 0)
+            & (klines["close_time"] == open_times + interval_ms - 1)
+            & np.isfinite(klines["close"]) & (klines["close"] > 0)
+            & (klines["low"] <= klines["high"])
+        )
+
+    def _validate(self, klines, interval):
+        """Returns the longest valid, gap-free run of candles ending at the newest good record."""
+        interval_ms = get_interval_seconds(interval) * 1000
+        bad = np.flatnonzero(~self._good_records(klines, interval))
+        if len(bad):
+            klines = klines[:bad[0]]  # anything after a corrupt record is not trusted
+        if len(klines) < 2:
+            return klines, len(bad) > 0
+
+        breaks = np.flatnonzero(np.diff(klines["open_time"]) != interval_ms)  # gaps, duplicates or reordering
+        if len(breaks):
+            klines = klines[breaks[-1] + 1:]
+        return klines, len(bad) > 0 or len(breaks) > 0
+
+    def load(self, symbol, interval, now_ms, repair=True):
+        """Reads the cached candles for a symbol, repairing the file if the integrity check trims it.
+
+        With repair=False gaps are kept (e.g. for long replay histories, where one
+        exchange gap would otherwise drop everything before it): bad records and
+        duplicates are left out of the result and the file is not rewritten.
+        """
+        path = self._path(symbol, interval)
+        key = (symbol, interval)
+        try:
+            with open(path, "rb") as f:
+                magic, record_size, _ = HEADER.unpack(f.read(HEADER.size))
+                if magic != MAGIC or record_size != RECORD_DTYPE.itemsize:
+                    raise ValueError("unknown file format")
+                data = f.read()
+        except FileNotFoundError:
+            return empty_klines()
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning(f"Discarding unreadable kline cache {path}: {e}")
+            if repair:
+                self._write(symbol, interval, empty_klines())
+            return empty_klines()
+
+        torn = len(data) % RECORD_DTYPE.itemsize
+        if torn:
+            data = data[:len(data) - torn]  # partial record from an interrupted append
+        stored = np.frombuffer(data, dtype=RECORD_DTYPE).astype(KLINE_DTYPE)
+        if not repair:
+            klines = stored[self._good_records(stored, interval)]
+            _, first = np.unique(klines["open_time"], return_index=True)  # sorted, one record per candle
+            return klines[first]
+        klines, repaired = self._validate(stored, interval)
+
+        oldest_ms = now_ms - self.retention_ms.get(interval, 0)
+        start_index = np.searchsorted(klines["open_time"], oldest_ms, side="left")
+        if torn or repaired or start_index > 0:
+            if torn or repaired:
+                logger.warning(f"Kline cache {path} failed integrity check, kept {len(klines) - start_index} of {len(stored)} candles")
+            klines = klines[start_index:]
+            self._write(symbol, interval, klines)
+        else:
+            self.record_counts[key] = len(klines)
+            if len(klines):
+                self.last_written[key] = int(klines["open_time"][-1])
+        return klines
+
+    def append(self, symbol, interval, klines, now_ms):
+        """Persists the closed candles of `klines` (the symbol's stored history) that are not on disk yet."""
+        key = (symbol, interval)
+        last_written = self.last_written.get(key)
+        interval_ms = get_interval_seconds(interval) * 1000
+        closed = klines[klines["close_time"] < now_ms]
+        if last_written is None:
+            if len(closed):
+                self._write(symbol, interval, closed)
+            return
+
+        new_klines = closed[closed["open_time"] > last_written]
+        if len(new_klines) == 0:
+            return
+        if new_klines["open_time"][0] != last_written + interval_ms:
+            self._write(symbol, interval, closed)  # history was replaced or has a gap, start the file over
+            return
+
+        with open(self._path(symbol, interval), "ab") as f:
+            f.write(new_klines.astype(RECORD_DTYPE).tobytes())
+        self.last_written[key] = int(new_klines["open_time"][-1])
+        self.record_counts[key] = self.record_counts.get(key, 0) + len(new_klines)
+
+        # Compact once the file holds twice the retention window.
+        if self.record_counts[key] * interval_ms > 2 * self.retention_ms.get(interval, 0):
+            self.load(symbol, interval, now_ms)
+
+    def store(self, symbol, interval, klines):
+        """Replaces the symbol's file with `klines` (closed candles in open_time order), e.g. after a backfill."""
+        self._write(symbol, interval, klines)
+
+    def enforce_size_cap(self, active_symbols):
+        """Deletes files of symbols no longer scanned, then the least recently written ones, until under max_size_mb."""
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                files.append((os.path.getmtime(path), os.path.getsize(path), path, name.removesuffix(".klines")))
+
+        total_size = sum(size for _, size, _, _ in files)
+        # Inactive symbols go first, then the oldest files.
+        for _, size, path, symbol in sorted(files, key=lambda f: (f[3] in active_symbols, f[0])):
+            if total_size <= self.max_size_bytes and symbol in active_symbols:
+                break
+            os.remove(path)
+            total_size -= size
+            interval = os.path.basename(os.path.dirname(path))
+            self.last_written.pop((symbol, interval), None)
+            self.record_counts.pop((symbol, interval), None)
+        return total_size
@@ -0,0 +1,64 @@
+import numpy as np
+from core.klines import empty_klines, merge_klines
+from utils import get_interval_seconds
+
+class KlineStore:
+    """Per-symbol, per-interval kline history keyed on open_time.
+
+    Only candles that have closed are treated as final. The still-open last
+    candle is kept so it can be used, but it is fetched again (and replaced)
+    on the next update.
+    """
+
+    def __init__(self, cache=None):
+        self.klines = {}       # (symbol, interval) -> structured kline array sorted by open_time
+        self.last_closed = {}  # (symbol, interval) -> close_time of the newest closed candle
+        self.cache = cache     # optional KlineCache that closed candles are persisted to
+
+    def get_fetch_start(self, symbol, interval, window_start_ms, now_ms):
+        """Returns the startTime to request from the exchange, or None if nothing new can exist yet."""
+        key = (symbol, interval)
+        last_closed = self.last_closed.get(key)
+        if last_closed is None or last_closed < window_start_ms:
+            return window_start_ms  # never fetched, or the stored history is entirely outside the window
+
+        stored = self.klines[key]
+        if len(stored) and stored["close_time"][-1] >= now_ms:
+            return None  # the newest candle is still open, no candle has closed since the last fetch
+
+        # Everything after the newest closed candle, which also replaces a previously open candle
+        # and fills any gap left by failed fetches.
+        return last_closed + 1
+
+    def get_fetch_limit(self, interval, start_ms, now_ms):
+        """Smallest kline limit covering start_ms..now_ms; Binance charges weight by limit, not by rows returned."""
+        interval_ms = get_interval_seconds(interval) * 1000
+        return min(1000, (now_ms - start_ms) // interval_ms + 2)
+
+    def merge(self, symbol, interval, klines, now_ms, window_start_ms, persist=True):
+        """Stores new klines (replacing candles with the same open_time) and evicts anything older than the window.
+
+        persist=False keeps derived data (e.g. rolled-up bars) out of the on-disk cache.
+        """
+        key = (symbol, interval)
+        stored = merge_klines(self.klines.get(key, empty_klines()), klines)
+
+        closed_times = klines["close_time"][klines["close_time"] < now_ms]
+        if len(closed_times):
+            self.last_closed[key] = max(self.last_closed.get(key, 0), int(closed_times.max()))
+
+        evict_count = np.searchsorted(stored["open_time"], window_start_ms, side="left")
+        self.klines[key] = stored[evict_count:]
+        if persist and self.cache is not None:
+            self.cache.append(symbol, interval, self.klines[key], now_ms)
+
+    def get_window(self, symbol, interval, window_start_ms):
+        """Returns the stored klines with open_time >= window_start_ms, oldest first (a view, not a copy)."""
+        stored = self.klines.get((symbol, interval))
+        if stored is None:
+            return empty_klines()
+        start_index = np.searchsorted(stored["open_time"], window_start_ms, side="left")
+        return stored[start_index:]
+
+    def size(self):
+        return sum(len(stored) for stored in self.klines.values())
@@ -0,0 +1,132 @@
+import asyncio
+import json
+from core.klines import klines_from_stream, empty_klines, merge_klines
+from core.logger import logger
+from utils import get_current_utc_timestamp_ms
+
+DEFAULT_STREAM_URL = "wss://fstream.binance.com/stream"
+DEFAULT_MAX_STREAMS_PER_CONNECTION = 200
+MAX_PENDING_KLINES = 12  # closed candles kept per symbol while it waits for its REST backfill
+
+class KlineStream:
+    """Keeps the scanner's kline store current from combined <symbol>@kline_<interval> streams.
+
+    Symbols are sharded across connections to stay under the per-connection
+    stream limit. Only the scanner's base interval is streamed; closed candles
+    are merged into the store as they arrive (the scanner rolls coarser
+    intervals up from them) and the forming
+    candle is merged every flush_interval seconds. A symbol is "live" once the
+    scanner has backfilled it over REST and its connection is up; after a
+    disconnect the symbol needs a REST catch-up again before it counts as live.
+    Until then its candles stay out of the store: a streamed candle after a
+    gap would move the store's fetch start past the gap. Closed ones are held
+    back and merged once the backfill is done.
+    """
+
+    def __init__(self, scanner, stream_config=None):
+        stream_config = stream_config or {}
+        self.scanner = scanner
+        self.url = stream_config.get("url", DEFAULT_STREAM_URL)
+        self.interval = scanner.base_interval
+        self.max_streams = stream_config.get("max_streams_per_connection", DEFAULT_MAX_STREAMS_PER_CONNECTION)
+        self.reconnect_delay = stream_config.get("reconnect_delay", 1)
+        self.max_reconnect_delay = stream_config.get("max_reconnect_delay", 60)
+        self.flush_interval = stream_config.get("flush_interval", 5)
+        self.running = True
+
+        symbols = [asset.replace("BINANCE:", "") for asset in scanner.assets]
+        self.shards = [symbols[i:i + self.max_streams] for i in range(0, len(symbols), self.max_streams)]
+        self.connected_shards = set()
+        self.shard_of = {symbol: i for i, shard in enumerate(self.shards) for symbol in shard}
+        self.backfilled = set()
+        self.pending = {}  # symbol -> closed candles received before its backfill
+        self.open_klines = {}  # symbol -> latest update of the still-forming candle
+        self.closed_klines_received = 0
+
+    def stop(self):
+        self.running = False
+
+    def is_live(self, symbol):
+        return symbol in self.backfilled and self.shard_of.get(symbol) in self.connected_shards
+
+    def mark_backfilled(self, symbol):
+        self.backfilled.add(symbol)
+        pending = self.pending.pop(symbol, None)
+        if pending is not None:
+            # Closed while the backfill was in flight; they replace the forming candle the REST response may hold.
+            self.scanner.store_klines(symbol, self.interval, pending, int(pending["close_time"][-1]) + 1)
+
+    def _handle_kline(self, kline_event):
+        symbol = kline_event["s"]
+        klines = klines_from_stream(kline_event)
+        if symbol not in self.backfilled:
+            if kline_event["x"]:
+                self.pending[symbol] = merge_klines(self.pending.get(symbol, empty_klines()), klines)[-MAX_PENDING_KLINES:]
+            return
+        if not kline_event["x"]:
+            self.open_klines[symbol] = klines
+            return
+
+        self.open_klines.pop(symbol, None)
+        now_ms = int(kline_event["T"]) + 1
+        self.scanner.store_klines(symbol, self.interval, klines, now_ms)
+        self.closed_klines_received += 1
+
+    def flush_open_klines(self):
+        """Merges the latest state of every forming candle into the store."""
+        now_ms = get_current_utc_timestamp_ms()
+        open_klines, self.open_klines = self.open_klines, {}
+        for symbol, klines in open_klines.items():
+            self.scanner.store_klines(symbol, self.interval, klines, now_ms)
+
+    def _handle_message(self, message):
+        try:
+            data = json.loads(message)
+            kline_event = data.get("data", data).get("k")
+            if kline_event:
+                self._handle_kline(kline_event)
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            logger.warning(f"Ignoring malformed kline stream frame: {e}")
+
+    async def _run_shard(self, shard_index, websockets):
+        shard = self.shards[shard_index]
+        streams = [f"{symbol.lower()}@kline_{self.interval}" for symbol in shard]
+        delay = self.reconnect_delay
+        while self.running:
+            try:
+                async with websockets.connect(self.url, ping_interval=20, ping_timeout=20, max_size=None) as websocket:
+                    await websocket.send(json.dumps({"method": "SUBSCRIBE", "params": streams, "id": shard_index + 1}))
+                    self.connected_shards.add(shard_index)
+                    delay = self.reconnect_delay
+                    logger.info(f"Kline stream shard {shard_index} connected ({len(streams)} streams)")
+                    async for message in websocket:
+                        if not self.running:
+                            break
+                        self._handle_message(message)
+            except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException) as e:
+                logger.warning(f"Kline stream shard {shard_index} disconnected: {e}")
+            finally:
+                # Candles may have been missed while down; the next scan catches these symbols up over REST
+                # (their stream candles are held back until then, so the store's fetch start stays before the gap).
+                self.connected_shards.discard(shard_index)
+                self.backfilled.difference_update(shard)
+                for symbol in shard:
+                    self.open_klines.pop(symbol, None)
+
+            if self.running:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def _run_flush(self):
+        while self.running:
+            await asyncio.sleep(self.flush_interval)
+            self.flush_open_klines()
+
+    async def run(self):
+        try:
+            import websockets
+        except ImportError:
+            logger.warning("websockets is not installed, klines will be fetched over REST")
+            return
+
+        await asyncio.gather(self._run_flush(), *(self._run_shard(i, websockets) for i in range(len(self.shards))))
@@ -0,0 +1,88 @@
+import numpy as np
+from utils import mytime_from_timestamp
+
+# One record per candle, in the column order Binance returns them (the trailing "ignore" field is dropped).
+KLINE_DTYPE = np.dtype([
+    ("open_time", np.int64),
+    ("open", np.float64),
+    ("high", np.float64),
+    ("low", np.float64),
+    ("close", np.float64),
+    ("volume", np.float64),
+    ("close_time", np.int64),
+    ("base_asset_vol", np.float64),
+    ("number_of_trades", np.int64),
+    ("taker_buy_vol", np.float64),
+    ("taker_buy_base_asset_vol", np.float64),
+])
+
+def empty_klines():
+    return np.empty(0, dtype=KLINE_DTYPE)
+
+def klines_from_raw(raw_klines):
+    """Builds a structured kline array straight from the exchange's JSON rows."""
+    if not raw_klines:
+        return empty_klines()
+
+    # float64 holds millisecond timestamps and trade counts exactly, so one parse covers every column
+    values = np.array([row[:len(KLINE_DTYPE.names)] for row in raw_klines], dtype=np.float64)
+    klines = np.empty(len(values), dtype=KLINE_DTYPE)
+    for i, name in enumerate(KLINE_DTYPE.names):
+        klines[name] = values[:, i]
+    return klines
+
+def merge_klines(existing, new):
+    """Merges two kline arrays by open_time, rows from `new` replace rows with the same open_time."""
+    if len(existing) == 0:
+        return new
+    if len(new) == 0:
+        return existing
+    combined = np.concatenate((new, existing))
+    _, first_index = np.unique(combined["open_time"], return_index=True)
+    return combined[first_index]
+
+def kline_to_dict(kline):
+    """Formats a single kline record as a dict, including the local close time; for display and debugging only."""
+    data = {name: kline[name].item() for name in KLINE_DTYPE.names}
+    data["close_time_local"] = mytime_from_timestamp(data["close_time"] / 1000.0)
+    return data
+
+def klines_from_stream(kline_event):
+    """Builds a one-row kline array from the "k" object of a <symbol>@kline_<interval> stream event."""
+    klines = np.empty(1, dtype=KLINE_DTYPE)
+    klines["open_time"] = kline_event["t"]
+    klines["open"] = float(kline_event["o"])
+    klines["high"] = float(kline_event["h"])
+    klines["low"] = float(kline_event["l"])
+    klines["close"] = float(kline_event["c"])
+    klines["volume"] = float(kline_event["v"])
+    klines["close_time"] = kline_event["T"]
+    klines["base_asset_vol"] = float(kline_event["q"])
+    klines["number_of_trades"] = kline_event["n"]
+    klines["taker_buy_vol"] = float(kline_event["V"])
+    klines["taker_buy_base_asset_vol"] = float(kline_event["Q"])
+    return klines
+
+def rollup_klines(klines, interval_ms):
+    """Aggregates klines into coarser bars of interval_ms (OHLC, summed volumes and trades), vectorized.
+
+    Each bar covers whichever source candles fall in its bucket, so the last
+    bar is the still-forming one when the newest source candle is open.
+    """
+    if len(klines) == 0:
+        return empty_klines()
+
+    buckets = klines["open_time"] // interval_ms
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(klines)] - 1
+
+    bars = np.empty(len(starts), dtype=KLINE_DTYPE)
+    bars["open_time"] = buckets[starts] * interval_ms
+    bars["open"] = klines["open"][starts]
+    bars["high"] = np.maximum.reduceat(klines["high"], starts)
+    bars["low"] = np.minimum.reduceat(klines["low"], starts)
+    bars["close"] = klines["close"][ends]
+    bars["close_time"] = bars["open_time"] + interval_ms - 1
+    for name in ("volume", "base_asset_vol", "number_of_trades", "taker_buy_vol", "taker_buy_base_asset_vol"):
+        bars[name] = np.add.reduceat(klines[name], starts)
+    return bars
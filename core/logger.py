@@ -1,23 +1,102 @@
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
+from core.config_loader import scanner_config
 
 LOG_DIR = "logs"
 LOG_FILE = os.path.join(LOG_DIR, "app.log")
 
-os.makedirs(LOG_DIR, exist_ok=True)
+logging_config = (scanner_config or {}).get("logging", {})
 
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
+class LazyRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """Creates the log directory and opens the file with the first record instead of at import."""
 
-file_handler = logging.FileHandler(LOG_FILE)
-file_handler.setLevel(logging.DEBUG)
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
 
-stream_handler = logging.StreamHandler()
-stream_handler.setLevel(logging.DEBUG) #Set the level to DEBUG
+class LazyTimedRotatingFileHandler(logging.handlers.TimedRotatingFileHandler):
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+def _create_file_handler(path):
+    if logging_config.get("rotate_when"):
+        return LazyTimedRotatingFileHandler(path, when=logging_config["rotate_when"], backupCount=logging_config.get("backup_count", 3), delay=True)
+    return LazyRotatingFileHandler(path, maxBytes=int(logging_config.get("max_size_mb", 5) * 1024 * 1024),
+                                   backupCount=logging_config.get("backup_count", 3), delay=True)
 
 formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+
+file_handler = _create_file_handler(LOG_FILE)
+file_handler.setLevel(logging_config.get("file_level", "DEBUG"))
 file_handler.setFormatter(formatter)
+
+# Console output is kept to problems by default, info lines would scroll through the live table.
+stream_handler = logging.StreamHandler()
+stream_handler.setLevel(logging_config.get("console_level", "WARNING"))
 stream_handler.setFormatter(formatter)
 
-logger.addHandler(file_handler)
-logger.addHandler(stream_handler)
\ No newline at end of file
+# Callers only put records on a queue; a listener thread formats and writes them.
+queue_handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+listener = None
+
+logger = logging.getLogger(__name__)
+logger.setLevel(min(file_handler.level, stream_handler.level))
+logger.addHandler(queue_handler)
+logger.propagate = False
+
+def stop_logging():
+    """Writes out the queued records and stops the listener."""
+    global listener
+    if listener is not None:
+        listener.stop()
+        listener = None
+
+def start_logging(log_file=None):
+    """(Re)starts the listener thread, e.g. in a forked process where it does not survive; log_file switches the file."""
+    global listener
+    if listener is not None and listener._thread is not None and listener._thread.is_alive():
+        stop_logging()
+    if log_file is not None:
+        global file_handler
+        file_handler.close()
+        level = file_handler.level
+        file_handler = _create_file_handler(log_file)
+        file_handler.setLevel(level)
+        file_handler.setFormatter(formatter)
+    queue_handler.queue = queue.SimpleQueue()  # a forked copy may hold records the parent writes itself
+    listener = logging.handlers.QueueListener(queue_handler.queue, file_handler, stream_handler, respect_handler_level=True)
+    listener.start()
+
+start_logging()
+atexit.register(stop_logging)
+
+def format_symbols(symbols, limit=10):
+    """"A, B, C (+7 more)": keeps per-symbol messages to one line."""
+    symbols = list(symbols)
+    text = ", ".join(symbols[:limit])
+    return text + f" (+{len(symbols) - limit} more)" if len(symbols) > limit else text
+
+class SymbolLog:
+    """Collects per-symbol messages of one cycle and logs each message once, with the symbols it concerns.
+
+    add(logging.INFO, "No historical data found", "BTCUSDT") for every symbol,
+    then flush() at the end of the cycle logs
+    "No historical data found for 3 assets: BTCUSDT, ETHUSDT, XRPUSDT".
+    """
+
+    def __init__(self):
+        self.entries = {}  # (level, message) -> [symbols, first detail]
+
+    def add(self, level, message, symbol, detail=None):
+        entry = self.entries.setdefault((level, message), [[], detail])
+        entry[0].append(symbol)
+
+    def flush(self):
+        for (level, message), (symbols, detail) in self.entries.items():
+            suffix = f" (first: {detail})" if detail else ""
+            logger.log(level, f"{message} for {len(symbols)} assets: {format_symbols(symbols)}{suffix}")
+        self.entries = {}
@@ -0,0 +1,202 @@
+import bisect
+import threading
+from core.logger import logger
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labelnames, key, extra=()):
+    pairs = list(zip(labelnames, key)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    """A named metric with optional labels; every label combination holds its own value. Thread safe."""
+    type = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}  # tuple of label values -> value
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def get(self, **labels):
+        with self.lock:
+            return self.values.get(self._key(labels), 0)
+
+    def total(self, **labels):
+        """Sum over all label combinations, or only over those matching the given labels."""
+        match = [(self.labelnames.index(name), str(value)) for name, value in labels.items()]
+        with self.lock:
+            return sum(value for key, value in self.values.items() if all(key[i] == expected for i, expected in match))
+
+    def samples(self):
+        with self.lock:
+            return [(self.name + _format_labels(self.labelnames, key), value) for key, value in sorted(self.values.items())]
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.values.get(key)
+            if series is None:
+                series = self.values[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            series["counts"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def count(self):
+        with self.lock:
+            return sum(series["count"] for series in self.values.values())
+
+    def sum(self):
+        with self.lock:
+            return sum(series["sum"] for series in self.values.values())
+
+    def quantile(self, q):
+        """Approximate quantile over all label combinations: the upper bound of the bucket it falls in."""
+        with self.lock:
+            counts = [sum(column) for column in zip(*(series["counts"] for series in self.values.values()))]
+        total = sum(counts)
+        if not total:
+            return None
+        running = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            running += count
+            if running >= q * total:
+                return bound
+        return float("inf")
+
+    def samples(self):
+        samples = []
+        with self.lock:
+            for key, series in sorted(self.values.items()):
+                running = 0
+                for bound, count in zip(self.buckets + (float("inf"),), series["counts"]):
+                    running += count
+                    le = "+Inf" if bound == float("inf") else repr(float(bound))
+                    samples.append((f"{self.name}_bucket" + _format_labels(self.labelnames, key, [("le", le)]), running))
+                samples.append((f"{self.name}_sum" + _format_labels(self.labelnames, key), series["sum"]))
+                samples.append((f"{self.name}_count" + _format_labels(self.labelnames, key), series["count"]))
+        return samples
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+
+    def _register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(f"{name} {_format_value(value)}" for name, value in metric.samples())
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+
+# Exchange
+exchange_request_seconds = metrics.histogram("scanner_exchange_request_seconds", "Latency of each exchange HTTP request (every attempt).", ["endpoint"])
+exchange_requests = metrics.counter("scanner_exchange_requests_total", "Exchange HTTP requests by endpoint and status code.", ["endpoint", "status"])
+exchange_in_flight = metrics.gauge("scanner_exchange_in_flight_requests", "Exchange HTTP requests currently in flight.")
+exchange_used_weight = metrics.gauge("scanner_exchange_used_weight", "Request weight used in the current minute, as reported by the exchange (X-MBX-USED-WEIGHT-1M).")
+rate_limit_concurrency = metrics.gauge("scanner_rate_limit_concurrency", "Exchange requests the rate limiter currently lets run at once.")
+rate_limit_wait_seconds = metrics.histogram("scanner_rate_limit_wait_seconds", "Time requests waited for the rate limiter.")
+rate_limit_pauses = metrics.counter("scanner_rate_limit_pauses_total", "Global request pauses after a 429/418.", ["status"])
+
+# Scans
+scan_queue_depth = metrics.gauge("scanner_scan_queue_depth", "Symbols of the running scan still waiting for a fetch slot.")
+symbol_fetch_seconds = metrics.histogram("scanner_symbol_fetch_seconds", "Time to bring one symbol's kline history up to date.")
+scan_stage_seconds = metrics.gauge("scanner_scan_stage_seconds", "Time the last scan spent per stage.", ["stage"])
+scan_cycle_seconds = metrics.histogram("scanner_scan_cycle_seconds", "Duration of each scan cycle.")
+scan_interval_seconds = metrics.gauge("scanner_scan_interval_seconds", "Configured time between scan cycles.")
+scan_lag_seconds = metrics.gauge("scanner_scan_lag_seconds", "How late the last scan cycle started.")
+scan_missed_ticks = metrics.gauge("scanner_scan_missed_ticks", "Scan ticks skipped because a cycle overran.")
+symbols_by_state = metrics.gauge("scanner_symbols", "Symbols by data state after the last scan.", ["state"])
+
+# Caches and display
+kline_store_size = metrics.gauge("scanner_kline_store_klines", "Klines held in memory.")
+price_history_bytes = metrics.gauge("scanner_price_history_bytes", "Memory held by the price history ring buffers.")
+asset_data_rows = metrics.gauge("scanner_asset_data_rows", "Rows in the results cache.")
+render_seconds = metrics.histogram("scanner_render_seconds", "Time to build one display frame.", buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1))
+
+# Alerts
+alerts_total = metrics.counter("scanner_alerts_total", "Threshold crossing alerts raised, by level.", ["level"])
+alerts_dropped = metrics.counter("scanner_alerts_dropped_total", "Alerts dropped because a sink's queue was full.", ["sink"])
+alert_sink_errors = metrics.counter("scanner_alert_sink_errors_total", "Alerts a sink failed to deliver.", ["sink"])
+alert_delivery_seconds = metrics.histogram("scanner_alert_delivery_seconds", "Time from the price update behind a crossing to its delivery by a sink.", ["sink"],
+                                           buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300))
+
+def _format_seconds(value):
+    return "-" if value is None else f"{value * 1000:.0f}ms" if value < 1 else f"{value:.1f}s"
+
+def log_summary():
+    """One line with the numbers needed to size concurrency and spot slow or throttled cycles."""
+    cycles = scan_cycle_seconds.count()
+    average_cycle = scan_cycle_seconds.sum() / cycles if cycles else None
+    throttled = exchange_requests.total(status=429) + exchange_requests.total(status=418)
+    logger.info(
+        f"Metrics: cycles {cycles}, avg cycle {_format_seconds(average_cycle)} of {scan_interval_seconds.get():g}s, "
+        f"lag {scan_lag_seconds.get():.2f}s, missed ticks {scan_missed_ticks.get()}, "
+        f"requests {exchange_requests.total()} (p50 {_format_seconds(exchange_request_seconds.quantile(0.5))}, "
+        f"p99 {_format_seconds(exchange_request_seconds.quantile(0.99))}), throttled {throttled}, "
+        f"used weight {exchange_used_weight.get()}, in flight {exchange_in_flight.get()}/{rate_limit_concurrency.get():.0f}, "
+        f"stale {symbols_by_state.get(state='stale')}, deferred {symbols_by_state.get(state='deferred')}, missing price {symbols_by_state.get(state='missing_price')}, "
+        f"missing klines {symbols_by_state.get(state='missing_klines')}, klines {kline_store_size.get()}, "
+        f"render p99 {_format_seconds(render_seconds.quantile(0.99))}, alerts {alerts_total.total()} "
+        f"(delivery p99 {_format_seconds(alert_delivery_seconds.quantile(0.99))}, dropped {alerts_dropped.total()})"
+    )
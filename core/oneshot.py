@@ -0,0 +1,78 @@
+import csv
+import json
+import logging
+import sys
+import time
+from core.config_loader import assets_config, scanner_config
+from core.logger import logger, stream_handler
+from core.scanner import VolatilityScanner
+from utils import get_current_utc_timestamp_ms
+
+CSV_FIELDS = ["asset", "column", "percentage", "volatility", "old_price", "old_timestamp", "value", "rating"]
+
+def write_json(output, results, meta):
+    json.dump({"meta": meta, "assets": results}, output, separators=(",", ":"))
+    output.write("\n")
+
+def write_csv(output, results, meta):
+    """One line per asset and column."""
+    writer = csv.writer(output)
+    writer.writerow(CSV_FIELDS)
+    for asset, asset_data in results.items():
+        for column_name, data in asset_data.items():
+            writer.writerow([asset, column_name] + [data.get(field) for field in CSV_FIELDS[2:]])
+
+WRITERS = {"json": write_json, "csv": write_csv}
+
+async def run_once(output_format="json", output_path=None, deadline=None, started=None):
+    """One price update and one concurrent scan, results written to output_path or stdout.
+
+    Made for cron and job runners: no display, streams or API are imported or
+    started. Returns the exit code, 1 when there were no prices or no results.
+    started is the perf_counter value the process started at, for the startup time.
+    """
+    # stdout carries the results, the console log only gets problems; the log file keeps everything.
+    stream_handler.setLevel(logging.WARNING)
+    started = started if started is not None else time.perf_counter()
+    timings = {"startup": time.perf_counter() - started}
+
+    scanner = VolatilityScanner(assets_config)
+    stage_start = time.perf_counter()
+    await scanner._update_current_prices()
+    timings["prices"] = time.perf_counter() - stage_start
+
+    stage_start = time.perf_counter()
+    await scanner.scan(deadline=deadline)
+    timings["scan"] = time.perf_counter() - stage_start
+
+    ta_config = scanner_config.get("ta", {})
+    if ta_config.get("enabled"):
+        from core.ta_columns import TAColumns
+        stage_start = time.perf_counter()
+        VolatilityScanner.ta_columns = TAColumns(assets_config, ta_config)
+        await VolatilityScanner.ta_columns.refresh()
+        timings["ta"] = time.perf_counter() - stage_start
+    scanner.exchange.executor.shutdown(wait=False)
+
+    async with VolatilityScanner.cache_lock:
+        results = VolatilityScanner.asset_data_cache.copy()
+        timestamp = VolatilityScanner.current_prices_cache.get("timestamp")
+    if not results:
+        logger.error("One-shot scan produced no results")
+        return 1
+
+    stage_start = time.perf_counter()
+    meta = {"timestamp": timestamp or get_current_utc_timestamp_ms(), "assets": len(results), "kline_requests": scanner.kline_requests,
+            "timings": {name: round(seconds, 4) for name, seconds in timings.items()}}
+    if output_path:
+        with open(output_path, "w", newline="") as f:
+            WRITERS[output_format](f, results, meta)
+    else:
+        WRITERS[output_format](sys.stdout, results, meta)
+        sys.stdout.flush()
+    timings["write"] = time.perf_counter() - stage_start
+    timings["total"] = time.perf_counter() - started
+
+    logger.info(f"One-shot scan: {len(results)} assets, kline requests {scanner.kline_requests}, "
+                + ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in timings.items()))
+    return 0
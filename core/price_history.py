@@ -0,0 +1,73 @@
+import numpy as np
+
+class PriceHistory:
+    """Bounded per-symbol price history: one float64 price / int64 timestamp ring buffer per symbol.
+
+    Symbols are rows of two preallocated 2-D arrays, so memory is fixed by
+    the number of symbols and `capacity`. Entries older than `max_age_ms`
+    (relative to the newest write) are evicted; the latest price is always
+    kept, and latest_prices() reads it for many symbols at once.
+    """
+
+    def __init__(self, capacity=512, max_age_ms=60 * 60 * 1000):
+        self.capacity = capacity
+        self.max_age_ms = max_age_ms
+        self.index = {}  # symbol -> row
+        self.prices = np.empty((0, capacity), dtype=np.float64)
+        self.timestamps = np.empty((0, capacity), dtype=np.int64)
+        self.heads = np.empty(0, dtype=np.int64)   # next slot to write per row
+        self.counts = np.empty(0, dtype=np.int64)  # valid entries per row
+
+    def __len__(self):
+        return len(self.index)
+
+    def _rows(self, symbols):
+        """Row of each symbol, adding rows (doubling the arrays when full) for new symbols."""
+        new_symbols = [symbol for symbol in dict.fromkeys(symbols) if symbol not in self.index]
+        if new_symbols:
+            needed = len(self.index) + len(new_symbols)
+            if needed > len(self.heads):
+                size = max(needed, 2 * len(self.heads), 16)
+                grow = size - len(self.heads)
+                self.prices = np.vstack((self.prices, np.full((grow, self.capacity), np.nan)))
+                self.timestamps = np.vstack((self.timestamps, np.zeros((grow, self.capacity), dtype=np.int64)))
+                self.heads = np.concatenate((self.heads, np.zeros(grow, dtype=np.int64)))
+                self.counts = np.concatenate((self.counts, np.zeros(grow, dtype=np.int64)))
+            for symbol in new_symbols:
+                self.index[symbol] = len(self.index)
+        return np.fromiter((self.index[symbol] for symbol in symbols), dtype=np.int64, count=len(symbols))
+
+    def append_many(self, symbols, prices, timestamp_ms):
+        """Records one price per symbol, all at timestamp_ms."""
+        if not symbols:
+            return
+        rows = self._rows(symbols)
+        heads = self.heads[rows]
+        self.prices[rows, heads] = prices
+        self.timestamps[rows, heads] = timestamp_ms
+        self.heads[rows] = (heads + 1) % self.capacity
+        self.counts[rows] = np.minimum(self.counts[rows] + 1, self.capacity)
+
+        # Time-window eviction: shrink only the rows whose oldest entry fell out of the window.
+        oldest = (self.heads[rows] - self.counts[rows]) % self.capacity
+        expired = rows[self.timestamps[rows, oldest] < timestamp_ms - self.max_age_ms]
+        for row in expired:
+            count = self.counts[row]
+            start = (self.heads[row] - count) % self.capacity
+            slots = (start + np.arange(count)) % self.capacity
+            keep = np.count_nonzero(self.timestamps[row, slots] >= timestamp_ms - self.max_age_ms)
+            self.counts[row] = max(keep, 1)
+
+    def latest_prices(self, symbols):
+        """Vector of the newest price per symbol, NaN for symbols with no history."""
+        rows = np.fromiter((self.index.get(symbol, -1) for symbol in symbols), dtype=np.int64, count=len(symbols))
+        latest = np.full(len(symbols), np.nan)
+        known = rows >= 0
+        known[known] = self.counts[rows[known]] > 0
+        slots = (self.heads[rows[known]] - 1) % self.capacity
+        latest[known] = self.prices[rows[known], slots]
+        return latest
+
+    def memory_usage(self):
+        """Bytes held by the buffers; fixed once every symbol has a row."""
+        return self.prices.nbytes + self.timestamps.nbytes + self.heads.nbytes + self.counts.nbytes
@@ -0,0 +1,108 @@
+import asyncio
+import json
+from core.logger import logger
+from utils import get_current_utc_timestamp_ms
+
+DEFAULT_STREAM_URL = "wss://fstream.binance.com/ws"
+DEFAULT_STREAM_NAME = "!miniTicker@arr"
+
+class PriceStream:
+    """Keeps the scanner's current prices updated from Binance's all-market mini-ticker stream.
+
+    Subscribes again on every reconnect, backs off exponentially between
+    attempts, and polls the REST ticker while the stream is down (or when the
+    websockets package is not installed).
+    """
+
+    def __init__(self, scanner, stream_config=None):
+        stream_config = stream_config or {}
+        self.scanner = scanner
+        self.url = stream_config.get("url", DEFAULT_STREAM_URL)
+        self.stream_name = stream_config.get("stream", DEFAULT_STREAM_NAME)
+        self.reconnect_delay = stream_config.get("reconnect_delay", 1)
+        self.max_reconnect_delay = stream_config.get("max_reconnect_delay", 60)
+        self.rest_poll_interval = stream_config.get("rest_poll_interval", 10)
+        self.running = True
+        self.connected = False
+        self.messages_received = 0
+
+    def stop(self):
+        self.running = False
+
+    def _parse_message(self, message):
+        """Returns ({symbol: price}, event time ms) from a mini-ticker or mark-price frame, or None for other frames."""
+        data = json.loads(message)
+        if isinstance(data, dict) and "data" in data:
+            data = data["data"]  # combined stream envelope
+        if isinstance(data, dict):
+            data = [data]
+        if not isinstance(data, list):
+            return None
+
+        prices = {}
+        event_time_ms = None
+        for ticker in data:
+            if not isinstance(ticker, dict) or "s" not in ticker:
+                continue
+            price = ticker.get("c", ticker.get("p"))  # mini-ticker close, or mark price
+            if price is None:
+                continue
+            prices[ticker["s"]] = float(price)
+            event_time_ms = max(event_time_ms or 0, ticker.get("E", 0))
+        if not prices:
+            return None
+        return prices, event_time_ms or get_current_utc_timestamp_ms()
+
+    async def _handle_message(self, message):
+        try:
+            parsed = self._parse_message(message)
+        except (ValueError, TypeError) as e:
+            logger.warning(f"Ignoring malformed price stream frame: {e}")
+            return
+        if parsed is None:
+            return
+        prices, event_time_ms = parsed
+        self.messages_received += 1
+        await self.scanner.apply_price_updates(prices, event_time_ms)
+
+    async def _poll_rest(self, duration):
+        """REST fallback: polls the ticker for `duration` seconds (forever if None)."""
+        loop = asyncio.get_running_loop()
+        deadline = None if duration is None else loop.time() + duration
+        while self.running:
+            await self.scanner._update_current_prices()
+            if deadline is not None and deadline - loop.time() <= self.rest_poll_interval:
+                await asyncio.sleep(max(0, deadline - loop.time()))
+                return
+            await asyncio.sleep(self.rest_poll_interval)
+
+    async def run(self):
+        try:
+            import websockets
+        except ImportError:
+            logger.warning("websockets is not installed, falling back to REST price polling")
+            await self._poll_rest(None)
+            return
+
+        delay = self.reconnect_delay
+        while self.running:
+            try:
+                async with websockets.connect(self.url, ping_interval=20, ping_timeout=20, max_size=None) as websocket:
+                    await websocket.send(json.dumps({"method": "SUBSCRIBE", "params": [self.stream_name], "id": 1}))
+                    self.connected = True
+                    delay = self.reconnect_delay
+                    logger.info(f"Price stream connected to {self.url} ({self.stream_name})")
+                    async for message in websocket:
+                        if not self.running:
+                            break
+                        await self._handle_message(message)
+            except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException) as e:
+                logger.warning(f"Price stream disconnected: {e}")
+            finally:
+                self.connected = False
+
+            if not self.running:
+                break
+            logger.info(f"Price stream reconnecting in {delay}s, polling REST prices meanwhile")
+            await self._poll_rest(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
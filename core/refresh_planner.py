@@ -0,0 +1,115 @@
+import heapq
+
+class RefreshPlanner:
+    """Picks which symbols a scan refreshes, so requests go to the rows that matter.
+
+    Every symbol has a due time in a heap. A symbol is "hot" and refreshed
+    every scan when a column's % change is within hot_ratio of its
+    threshold2 (threshold if there is none), when it crossed a threshold
+    level in the last crossing_hold seconds, or when its volatility rose by
+    more than volatility_rise since its last refresh. Colder symbols wait
+    longer, up to max_staleness seconds. The scanner still recomputes the
+    rows of waiting symbols from their stored history in the meantime.
+    """
+
+    def __init__(self, columns_config, refresh_config=None):
+        refresh_config = refresh_config or {}
+        self.columns = [(col["name"], col.get("threshold"), col.get("threshold2")) for col in columns_config if col.get("threshold") is not None]
+        self.max_staleness_ms = refresh_config.get("max_staleness", 900) * 1000
+        self.hot_ratio = refresh_config.get("hot_ratio", 0.8)
+        self.crossing_hold_ms = refresh_config.get("crossing_hold", 900) * 1000
+        self.volatility_rise = refresh_config.get("volatility_rise", 0.2)
+        self.max_symbols_per_scan = refresh_config.get("max_symbols_per_scan")
+        self.heap = []              # (due_ms, asset); entries whose due_ms no longer matches self.due are skipped
+        self.due = {}               # asset -> due_ms
+        self.priority = {}          # asset -> latest priority, see _score
+        self.last_refreshed = {}    # asset -> ms
+        self.last_levels = {}       # asset -> threshold level per column
+        self.last_volatility = {}   # asset -> highest column volatility at the last refresh
+        self.hot_until = {}         # asset -> ms, set when a level is crossed
+        self.planned = set()        # assets handed out by plan() and not scheduled again since
+
+    def _score(self, asset_data):
+        """Returns (priority, levels, volatility) of a row; priority 1.0 means a column sits at its threshold2."""
+        priority = 0.0
+        levels = []
+        volatility = 0.0
+        for name, threshold, threshold2 in self.columns:
+            data = (asset_data or {}).get(name) or {}
+            try:
+                percentage = abs(float(data.get("percentage")))
+            except (TypeError, ValueError):
+                levels.append(0)
+                continue
+            priority = max(priority, percentage / (threshold2 or threshold))
+            levels.append(2 if percentage >= threshold else 1 if threshold2 is not None and percentage >= threshold2 else 0)
+            try:
+                volatility = max(volatility, float(data.get("volatility")))
+            except (TypeError, ValueError):
+                pass
+        return priority, tuple(levels), volatility
+
+    def _refresh_interval_ms(self, asset, priority, volatility, now_ms):
+        """0 for hot symbols; otherwise scales linearly up to max_staleness as the row gets quieter."""
+        previous_volatility = self.last_volatility.get(asset)
+        rising = previous_volatility and volatility > previous_volatility * (1 + self.volatility_rise)
+        if priority >= self.hot_ratio or rising or self.hot_until.get(asset, 0) > now_ms:
+            return 0
+        return int(self.max_staleness_ms * (1 - priority / self.hot_ratio))
+
+    def _schedule(self, asset, due_ms):
+        self.planned.discard(asset)
+        self.due[asset] = due_ms
+        heapq.heappush(self.heap, (due_ms, asset))
+
+    def plan(self, assets, asset_data, now_ms):
+        """Returns the symbols to refresh this scan, rescoring every row from its latest (repriced) values."""
+        # Symbols of a scan that failed before mark_refreshed()/release() have no heap entry left; they are due now.
+        for asset in list(self.planned):
+            self._schedule(asset, now_ms)
+
+        for asset in assets:
+            if asset not in self.last_refreshed:
+                if asset not in self.due:
+                    self._schedule(asset, now_ms)
+                continue
+            priority, levels, volatility = self._score(asset_data.get(asset))
+            self.priority[asset] = priority
+            if levels != self.last_levels.get(asset, levels):
+                self.hot_until[asset] = now_ms + self.crossing_hold_ms
+            self.last_levels[asset] = levels
+            due_ms = self.last_refreshed[asset] + self._refresh_interval_ms(asset, priority, volatility, now_ms)
+            if due_ms < self.due[asset]:
+                self._schedule(asset, due_ms)  # moved up by the price; the older heap entry is skipped later
+
+        candidates = []
+        while self.heap and self.heap[0][0] <= now_ms:
+            due_ms, asset = heapq.heappop(self.heap)
+            if self.due.get(asset) == due_ms:
+                candidates.append(asset)
+        self.planned.update(candidates)
+
+        if self.max_symbols_per_scan and len(candidates) > self.max_symbols_per_scan:
+            # Symbols at their staleness bound go first, then the hottest.
+            stale_before_ms = now_ms - self.max_staleness_ms
+            candidates.sort(key=lambda asset: (self.last_refreshed.get(asset, 0) > stale_before_ms, -self.priority.get(asset, float("inf"))))
+            for asset in candidates[self.max_symbols_per_scan:]:
+                self._schedule(asset, self.due[asset])
+            candidates = candidates[:self.max_symbols_per_scan]
+        return candidates
+
+    def mark_refreshed(self, assets, asset_data, now_ms):
+        """Schedules the next refresh of symbols whose history was just brought up to date."""
+        for asset in assets:
+            priority, levels, volatility = self._score(asset_data.get(asset))
+            interval_ms = self._refresh_interval_ms(asset, priority, volatility, now_ms)
+            self.priority[asset] = priority
+            self.last_levels[asset] = levels
+            self.last_volatility[asset] = volatility
+            self.last_refreshed[asset] = now_ms
+            self._schedule(asset, now_ms + interval_ms)
+
+    def release(self, assets, now_ms):
+        """Puts planned symbols that were not refreshed (failed or past the scan deadline) back as due."""
+        for asset in assets:
+            self._schedule(asset, now_ms)
@@ -0,0 +1,143 @@
+import numpy as np
+
+class RollingVolatility:
+    """Volatility of every asset for the column windows of one kline interval, kept up to date in O(1) per candle.
+
+    Per asset it keeps a ring of the step % changes of closed candles and, per
+    window, their sum, sum of squares and count. The sums are taken relative
+    to an anchor (the mean when the row was built), so the variance does not
+    lose its digits to cancellation. A candle that closes adds its change and
+    evicts the change that dropped out of each window; volatility() then adds
+    the forming candle's change at any price, cheap enough for every price tick.
+
+    A window of a duration holds its last duration // interval - 1 changes (the
+    newest one being the forming candle's), like compute_change_columns. It has
+    a volatility when at least min_coverage of those changes are known, and at
+    least 2. A row is rebuilt from the closes (re-anchored) every reanchor
+    candles, when it fell behind and when the close it ended on was revised.
+    """
+
+    def __init__(self, assets, durations, interval_ms, std_dev_multiplier, min_coverage=1.0, reanchor=288):
+        self.index = {asset: i for i, asset in enumerate(assets)}
+        self.interval_ms = interval_ms
+        self.std_dev_multiplier = std_dev_multiplier
+        self.reanchor = reanchor
+        window_changes = np.asarray(durations, dtype=np.int64) * 1000 // interval_ms - 1
+        self.closed_changes = np.maximum(window_changes - 1, 0)  # changes of closed candles per window
+        self.min_counts = np.maximum(2, np.ceil(min_coverage * window_changes - 1e-9)).astype(np.int64)
+        self.min_counts[window_changes < 2] = np.iinfo(np.int64).max  # too short for a std-dev
+        self.capacity = max(int(self.closed_changes.max()), 1)
+
+        num_assets, num_windows = len(assets), len(durations)
+        self.ring = np.full((num_assets, self.capacity), np.nan)
+        self.heads = np.zeros(num_assets, dtype=np.int64)  # changes pushed, the newest is at (heads - 1) % capacity
+        self.anchors = np.zeros(num_assets)
+        self.sums = np.zeros((num_assets, num_windows))
+        self.squares = np.zeros((num_assets, num_windows))
+        self.counts = np.zeros((num_assets, num_windows), dtype=np.int64)
+        self.last_open_times = np.full(num_assets, -1, dtype=np.int64)  # newest closed candle the row holds
+        self.last_closes = np.full(num_assets, np.nan)                 # and its close
+        self.since_rebuild = np.zeros(num_assets, dtype=np.int64)
+
+    def rows(self, assets):
+        return np.fromiter((self.index[asset] for asset in assets), dtype=np.int64, count=len(assets))
+
+    def _rebuild(self, rows, open_times, closes):
+        """Fills rows from their aligned closes (the last column being the forming candle)."""
+        num_steps = closes.shape[1]
+        steps = num_steps - 2 - np.arange(self.capacity)[::-1]  # the closed candles' changes, oldest first
+        previous = steps - 1
+        with np.errstate(divide="ignore", invalid="ignore"):
+            changes = (closes[:, np.clip(steps, 0, None)] - closes[:, np.clip(previous, 0, None)]) / closes[:, np.clip(previous, 0, None)] * 100
+        changes[:, previous < 0] = np.nan
+        changes[~np.isfinite(changes)] = np.nan
+
+        valid = ~np.isnan(changes)
+        counts = valid.sum(axis=1)
+        anchors = np.divide(np.where(valid, changes, 0.0).sum(axis=1), counts, out=np.zeros(len(rows)), where=counts > 0)
+        shifted = np.where(valid, changes - anchors[:, None], 0.0)
+        # Sums over the last m changes of every window, from the suffix sums of the ring.
+        suffix_sums = np.concatenate((np.cumsum(shifted[:, ::-1], axis=1), np.zeros((len(rows), 1))), axis=1)
+        suffix_squares = np.concatenate((np.cumsum(shifted[:, ::-1] ** 2, axis=1), np.zeros((len(rows), 1))), axis=1)
+        suffix_counts = np.concatenate((np.cumsum(valid[:, ::-1], axis=1), np.zeros((len(rows), 1), dtype=np.int64)), axis=1)
+        ends = self.closed_changes - 1  # index m - 1 is the sum of the last m; m = 0 reads the zero column
+        self.sums[rows] = suffix_sums[:, ends]
+        self.squares[rows] = suffix_squares[:, ends]
+        self.counts[rows] = suffix_counts[:, ends]
+
+        self.ring[rows] = changes
+        self.heads[rows] = self.capacity
+        self.anchors[rows] = anchors
+        self.last_open_times[rows] = open_times[-1] - self.interval_ms
+        self.last_closes[rows] = closes[:, -2] if num_steps >= 2 else np.nan
+        self.since_rebuild[rows] = 0
+
+    def _push(self, rows, changes):
+        """Appends one closed candle's change to each row, evicting the change that leaves each window."""
+        valid = np.isfinite(changes)
+        anchors = self.anchors[rows]
+        added = np.where(valid, changes - anchors, 0.0)
+        has_window = self.closed_changes > 0
+        evicted = self.ring[rows[:, None], (self.heads[rows][:, None] - self.closed_changes) % self.capacity]
+        evicted_valid = ~np.isnan(evicted) & has_window
+        removed = np.where(evicted_valid, evicted - anchors[:, None], 0.0)
+        added_to = added[:, None] * has_window
+
+        self.sums[rows] += added_to - removed
+        self.squares[rows] += added_to ** 2 - removed ** 2
+        self.counts[rows] += (valid[:, None] & has_window).astype(np.int64) - evicted_valid
+        self.ring[rows, self.heads[rows] % self.capacity] = np.where(valid, changes, np.nan)
+        self.heads[rows] += 1
+        self.since_rebuild[rows] += 1
+
+    def update(self, assets, open_times, closes):
+        """Brings the assets' rows up to the aligned closes (assets x open_times, last column forming):
+        pushes the candles that closed since the last update, rebuilds rows that cannot be pushed to."""
+        num_steps = len(open_times)
+        if num_steps == 0:
+            return
+        rows = self.rows(assets)
+        newest_closed = open_times[-1] - self.interval_ms
+        behind = (newest_closed - self.last_open_times[rows]) // self.interval_ms
+        last_steps = (self.last_open_times[rows] - open_times[0]) // self.interval_ms
+        in_grid = (self.last_open_times[rows] >= 0) & (last_steps >= 0) & (last_steps <= num_steps - 2)
+        known = closes[np.arange(len(rows)), np.clip(last_steps, 0, num_steps - 1)]
+        revised = ~((known == self.last_closes[rows]) | (np.isnan(known) & np.isnan(self.last_closes[rows])))
+        rebuild = ~in_grid | revised | (behind < 0) | (behind > self.capacity) | (self.since_rebuild[rows] + behind >= self.reanchor)
+
+        if rebuild.any():
+            self._rebuild(rows[rebuild], open_times, closes[rebuild])
+        pushed = ~rebuild & (behind > 0)
+        for j in range(int(behind[pushed].max()) if pushed.any() else 0):
+            selected = pushed & (behind > j)
+            steps = last_steps[selected] + 1 + j
+            row_closes = closes[selected]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                changes = (row_closes[np.arange(len(steps)), steps] - row_closes[np.arange(len(steps)), steps - 1]) / row_closes[np.arange(len(steps)), steps - 1] * 100
+            self._push(rows[selected], changes)
+        if pushed.any():
+            self.last_open_times[rows[pushed]] = newest_closed
+            self.last_closes[rows[pushed]] = closes[pushed, -2]
+
+    def volatility(self, assets, prices, now_ms):
+        """assets x windows volatilities with the forming candle closing at prices; NaN where a window is not
+        covered enough, is flat, or the row misses a candle that closed since its last update."""
+        rows = self.rows(assets)
+        current = self.last_open_times[rows] == now_ms // self.interval_ms * self.interval_ms - self.interval_ms
+        with np.errstate(divide="ignore", invalid="ignore"):
+            changes = (np.asarray(prices, dtype=np.float64) - self.last_closes[rows]) / self.last_closes[rows] * 100
+        valid = np.isfinite(changes) & current
+        added = np.where(valid, changes - self.anchors[rows], 0.0)[:, None]
+        sums = self.sums[rows] + added
+        squares = self.squares[rows] + added ** 2
+        counts = self.counts[rows] + valid[:, None]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            means = sums / counts
+            std_devs = np.sqrt(np.maximum(squares / counts - means ** 2, 0.0))
+        volatilities = std_devs * self.std_dev_multiplier
+        volatilities[(counts < self.min_counts) | ~current[:, None] | np.isclose(std_devs, 0.0)] = np.nan
+        return volatilities
+
+    def is_current(self, assets, now_ms):
+        """Whether each asset's row holds every candle closed by now_ms, i.e. volatility() can price it."""
+        return self.last_open_times[self.rows(assets)] == now_ms // self.interval_ms * self.interval_ms - self.interval_ms
@@ -1,8 +1,21 @@
 import asyncio
+import logging
+import math
+import time
+import numpy as np
 from datetime import datetime
-from utils import prettify, rsi_data_to_json, calculate_percentage_change, calculate_volatility, get_current_utc_timestamp_ms, convert_ms_timestamp_to_datetime_utc
+from utils import prettify, rsi_data_to_json, calculate_percentage_change, get_interval_seconds, get_current_utc_timestamp_ms, convert_ms_timestamp_to_datetime_utc
 from core.config_loader import scanner_config
-from core.logger import logger
+from core.logger import logger, format_symbols, SymbolLog
+from core.kline_store import KlineStore
+from core.price_history import PriceHistory
+from core.kline_cache import KlineCache
+from core.klines import rollup_klines
+from core.column_engine import align_klines, compute_change_columns
+from core.flow_columns import is_flow_column, flow_fields, history_seconds, compute_flow_columns, column_decimals
+from core.refresh_planner import RefreshPlanner
+from core.rolling_stats import RollingVolatility
+from core import metrics
 from exchanges.binance import BinanceExchange
 #from core.ta import calculate_rsi
 
@@ -10,228 +23,437 @@ class VolatilityScanner:
     cache_lock = asyncio.Lock()
     current_prices_cache = {}  # Class-level cache
     asset_data_cache = {}      # Class-level cache
+    data_version = 0           # bumped whenever an asset row in asset_data_cache changes
+    asset_data_versions = {}   # asset -> data_version of its last change
+    alert_engine = None        # set to an AlertEngine to check every changed row for threshold crossings
+    ta_columns = None          # set to a TAColumns to merge its TA cells into every stored row
 
     def __init__(self, assets):
         self.assets = assets
-        self.exchange = BinanceExchange()
         self.columns_config = scanner_config["columns"]
+        # % change columns, and volume/flow columns computed from the other kline fields
+        self.change_columns = [column for column in self.columns_config if not is_flow_column(column)]
+        self.flow_columns = [column for column in self.columns_config if is_flow_column(column)]
         self.config = scanner_config
+        price_history_config = self.config.get("price_history", {})
+        self.price_history = VolatilityScanner.current_prices_cache.setdefault("prices", PriceHistory(
+            capacity=price_history_config.get("capacity", 512),
+            max_age_ms=price_history_config.get("max_age", 3600) * 1000,
+        ))
         self.intervals = scanner_config["intervals"]
         self.volatility_config = self.config["volatility_calculation"]
+        self.exchange_config = self.config.get("exchange", {})
+        self.max_concurrency = self.exchange_config.get("max_concurrency", 16)
+        self.base_interval = self.config.get("base_interval", "5m")
+        self.base_interval_ms = get_interval_seconds(self.base_interval) * 1000
+        # Only base_interval klines are fetched; coarser column intervals are rolled up from them locally.
+        self.column_intervals = {column["name"]: self._resolve_column_interval(column) for column in self.columns_config}
+        self.kline_cache_config = self.config.get("kline_cache", {})
+        self.kline_store = KlineStore(cache=self._create_kline_cache())
+        self.kline_cache_loaded = False
+        self.kline_stream = None  # set to a KlineStream to keep the store current from websocket klines
+        self.refresh_config = self.config.get("refresh_planner", {})
+        self.refresh_planner = RefreshPlanner(self.columns_config, self.refresh_config) if self.refresh_config.get("enabled", False) else None
+        self.rolling_volatility = {}  # interval -> RollingVolatility of its columns, for scans and price ticks
+        self.kline_requests = 0
+        self.symbol_log = SymbolLog()  # per-symbol messages, logged once per scan
+        self.scan_stats = {}  # seconds spent per stage of the last scan
+        self.exchange = BinanceExchange(
+            base_url=self.exchange_config.get("base_url"),
+            future_base_url=self.exchange_config.get("future_base_url"),
+            max_workers=self.max_concurrency,
+            pool_size=self.exchange_config.get("pool_size"),
+            timeout=self.exchange_config.get("timeout", 10),
+            max_retries=self.exchange_config.get("max_retries", 3),
+            backoff_base=self.exchange_config.get("backoff_base", 0.5),
+            backoff_max=self.exchange_config.get("backoff_max", 30),
+            weight_limit=self.exchange_config.get("weight_limit", 2400),
+            weight_share=self.exchange_config.get("weight_share", 0.8),
+            min_concurrency=self.exchange_config.get("min_concurrency", 1),
+            rate_share=self.exchange_config.get("rate_share"),
+        )
 
     async def _update_current_prices(self):
-        prices = self.exchange.get_current_prices()
+        prices = await self.exchange.get_current_prices_async()
         if prices:
-            current_timestamp_ms = get_current_utc_timestamp_ms()
-            async with VolatilityScanner.cache_lock:
-                if "prices" not in VolatilityScanner.current_prices_cache:
-                    VolatilityScanner.current_prices_cache["prices"] = {}
-
-                for asset in self.assets:
-                    binance_asset = asset.replace("BINANCE:", "")
-                    if binance_asset in prices:
-                        if binance_asset not in VolatilityScanner.current_prices_cache["prices"]:
-                            VolatilityScanner.current_prices_cache["prices"][binance_asset] = []
-
-                        VolatilityScanner.current_prices_cache["prices"][binance_asset].append({"price": prices[binance_asset], "timestamp": current_timestamp_ms})
-
-                VolatilityScanner.current_prices_cache["timestamp"] = current_timestamp_ms
+            await self.apply_price_updates(prices, get_current_utc_timestamp_ms())
             logger.debug(f"Current prices cache updated")
             #logger.debug(f"Current prices cache updated: {VolatilityScanner.current_prices_cache}")
         else:
             logger.error("Failed to update current prices cache.")
-    
-    
-    async def _get_current_price(self, asset):
-        """Retrieves the current price for an asset from the cache."""
-        async with VolatilityScanner.cache_lock:
-            current_prices_data = VolatilityScanner.current_prices_cache.copy()
-            prices = current_prices_data.get("prices", {})
-
-        if asset not in prices or not prices[asset]:
-            logger.info(f"No price data found for {asset}")
-            return None
-
-        current_price_data = prices[asset][-1]
-        current_price = current_price_data.get("price")
-        if current_price is None:
-            logger.error(f"current_price is None for {asset}")
-            return None
-        return current_price
-    
-    async def _calculate_volatility_for_kline(self, historical_data, interval_in_seconds, duration):
-        """Calculates volatility for a given duration."""
-        num_data_points = duration // interval_in_seconds
-        if num_data_points > len(historical_data):
-            return None
-
-        close_prices = [float(kline['close']) for kline in historical_data[-num_data_points:]]
-        
-        price_changes = []
-        for i in range(len(close_prices) - 1):
-            change = calculate_percentage_change(close_prices[i], close_prices[i+1])
-            if change is not None:
-                price_changes.append(change)
-
-        volatility = calculate_volatility(price_changes, self.volatility_config["std_dev_multiplier"])
-        return volatility
-
-    async def _get_historical_data_from_exchange(self, asset, durations, current_timestamp_ms):
-        if not durations:
-            return None
-
-        longest_duration = max(durations)
-        interval = "5m" if longest_duration < 24 * 60 * 60 else "30m"
-        end_timestamp_ms = current_timestamp_ms
-        interval_in_seconds = 5 * 60 if interval == "5m" else 30 * 60
-        start_timestamp_ms = end_timestamp_ms - ((longest_duration + interval_in_seconds) * 1000)
-
-        historical_data = self.exchange.get_historical_data(asset, start_timestamp_ms, end_timestamp_ms, interval=interval)
-
-        if historical_data is None or len(historical_data) == 0:
-            logger.info(f"No historical data found for {asset}, interval: {interval}")
-            return None
-
-        historical_data_for_durations = {}
-        for duration in durations:
-            try:
-                volatility = await self._calculate_volatility_for_kline(historical_data, interval_in_seconds, duration)
-                index_diff = (longest_duration - duration) // interval_in_seconds
-                kline = historical_data[index_diff]
-                historical_data_for_durations[duration] = {**kline, "volatility": volatility}
-            except IndexError:
-                logger.info(f"Not enough historical data for {asset}, duration: {duration}")
-                historical_data_for_durations[duration] = None
-
-        return historical_data_for_durations
-    
-    async def _get_historical_data_from_exchange1(self, asset, durations, current_timestamp_ms):
-        """Fetches historical data from the exchange for a given list of durations and calculates volatility."""
-        if not durations:
-            return None
-
-        longest_duration = max(durations)
-        interval = "5m" if longest_duration < 24 * 60 * 60 else "30m"
-        end_timestamp_ms = current_timestamp_ms
-    
-        interval_in_seconds = 5 * 60 if interval == "5m" else 30 * 60
-        start_timestamp_ms = end_timestamp_ms - ((longest_duration + interval_in_seconds) * 1000)
-
-        historical_data = self.exchange.get_historical_data(asset, start_timestamp_ms, end_timestamp_ms, interval=interval)
-
-        if historical_data is None or len(historical_data) == 0:
-            logger.info(f"No historical data found for {asset}, interval: {interval}")
-            return None
-        #rsi_data = calculate_rsi(historical_data, interval)
-        #print(asset, historical_data)
-        historical_data_for_durations = {}
-        for duration in durations:
-            index_diff = (longest_duration - duration) // interval_in_seconds
-            #print(duration, longest_duration, interval_in_seconds, '--', index_diff)
-            try:
-                kline = historical_data[index_diff]
-                close_prices_for_volatility = []
-                for i in range(index_diff, len(historical_data)):
-                  close_prices_for_volatility.append(float(historical_data[i]['close']))
-
-                volatility = None
-                if len(close_prices_for_volatility) > 1:
-                    price_changes = [calculate_percentage_change(close_prices_for_volatility[i], float(kline['close'])) for i in range(len(close_prices_for_volatility))]
-                    volatility = calculate_volatility(price_changes, duration, self.volatility_config["std_dev_multiplier"])
-                else:
-                    logger.info(f"Not enough historical data for volatility calculation for {asset}, duration: {duration}")
-
-                historical_data_for_durations[duration] = {**kline, "volatility": volatility}
-
-            except IndexError:
-                logger.info(f"Not enough historical data for {asset}, duration: {duration}")
-                historical_data_for_durations[duration] = None
-
-        return historical_data_for_durations
-
-    async def _get_historical_data_for_durations(self, asset, current_timestamp_ms, durations):
-        """Retrieves historical data for multiple durations."""
-        short_durations = [d for d in durations if d < 24 * 60 * 60]
-        long_durations = [d for d in durations if d >= 24 * 60 * 60]
-
-        all_historical_data = {}
-
-        short_data = await self._get_historical_data_from_exchange(asset, short_durations, current_timestamp_ms)
-        long_data = await self._get_historical_data_from_exchange(asset, long_durations, current_timestamp_ms)
-
-        if short_data is None and long_data is None:
-            return None
-
-        if short_data:
-            all_historical_data.update(short_data)
-        if long_data:
-            all_historical_data.update(long_data)
-
-        return all_historical_data
-
-    async def scan_asset(self, asset, current_timestamp_ms):
-        asset_data = {}
-
-        current_price = await self._get_current_price(asset)
-        if current_price is None:
-            for column in self.columns_config:
-                asset_data[column["name"]] = {"percentage": None, "volatility": None, "old_price": None, "old_timestamp": None, "old_datetime": None}
-            return {asset: asset_data}
-
-        durations = [int(column["duration"]) for column in self.columns_config]
-        historical_data_for_durations = await self._get_historical_data_for_durations(asset, current_timestamp_ms, durations)
-
-        if historical_data_for_durations is None:
-            for column in self.columns_config:
-                asset_data[column["name"]] = {"percentage": None, "volatility": None, "old_price": None, "old_timestamp": None, "old_datetime": None}
-            return {asset: asset_data}
 
+    async def apply_price_updates(self, prices, current_timestamp_ms):
+        """Stores new prices and re-derives the change columns of the affected assets."""
+        async with VolatilityScanner.cache_lock:
+            updated_assets = [asset for asset in self.assets if asset.replace("BINANCE:", "") in prices]
+            binance_assets = [asset.replace("BINANCE:", "") for asset in updated_assets]
+            self.price_history.append_many(binance_assets, [prices[asset] for asset in binance_assets], current_timestamp_ms)
+
+            volatilities = self._get_tick_volatilities(updated_assets, binance_assets, prices, current_timestamp_ms)
+            for binance_asset in binance_assets:
+                if binance_asset in VolatilityScanner.asset_data_cache:
+                    self._set_asset_data(binance_asset, self._reprice_asset_data(VolatilityScanner.asset_data_cache[binance_asset], prices[binance_asset],
+                                                                                 volatilities.get(binance_asset)), current_timestamp_ms)
+
+            VolatilityScanner.current_prices_cache["timestamp"] = current_timestamp_ms
+
+    @classmethod
+    def _set_asset_data(cls, asset, asset_data, event_time_ms=None):
+        """Stores an asset's row, bumping its version only if a value changed. Call with cache_lock held.
+        event_time_ms is when the price behind the change was seen, for alert latency."""
+        if VolatilityScanner.ta_columns:
+            asset_data = {**asset_data, **VolatilityScanner.ta_columns.rows.get(asset, {})}
+        if VolatilityScanner.asset_data_cache.get(asset) == asset_data:
+            return
+        VolatilityScanner.data_version += 1
+        VolatilityScanner.asset_data_cache[asset] = asset_data
+        VolatilityScanner.asset_data_versions[asset] = VolatilityScanner.data_version
+        if VolatilityScanner.alert_engine:
+            VolatilityScanner.alert_engine.check(asset, asset_data, event_time_ms)
+
+    def _get_tick_volatilities(self, assets, binance_assets, prices, current_timestamp_ms):
+        """{asset: {column: volatility}} at the new prices, for the assets whose rolling stats hold every closed candle."""
+        tick_volatilities = {}
+        if not self.rolling_volatility or not assets:
+            return tick_volatilities
+        price_vector = np.array([prices[asset] for asset in binance_assets], dtype=np.float64)
+        for interval, durations in self._get_interval_groups().items():
+            rolling = self.rolling_volatility.get(interval)
+            if rolling is None:
+                continue
+            volatilities = rolling.volatility(assets, price_vector, current_timestamp_ms)
+            current_rows = np.flatnonzero(rolling.is_current(assets, current_timestamp_ms))
+            for column in self.change_columns:
+                if self.column_intervals[column["name"]] != interval:
+                    continue
+                i = durations.index(int(column["duration"]))
+                for row, volatility in zip(current_rows.tolist(), volatilities[current_rows, i].tolist()):
+                    tick_volatilities.setdefault(binance_assets[row], {})[column["name"]] = None if math.isnan(volatility) else f"{volatility:.2f}"
+        return tick_volatilities
+
+    def _reprice_asset_data(self, asset_data, current_price, volatilities=None):
+        """Recomputes the % change of each column against a new price; reference prices are unchanged, and so is
+        volatility unless volatilities ({column: volatility} at the new price) has the column."""
+        repriced = {}
+        for column_name, data in asset_data.items():
+            old_price = data.get("old_price")
+            percentage_change = calculate_percentage_change(old_price, current_price)
+            if percentage_change is None:
+                repriced[column_name] = data
+            else:
+                repriced[column_name] = {**data, "percentage": f"{percentage_change:.1f}"}
+                if volatilities and column_name in volatilities:
+                    repriced[column_name]["volatility"] = volatilities[column_name]
+        return repriced
+
+    async def _get_current_prices(self, assets):
+        """Retrieves the latest cached price for each asset as a vector, NaN where there is none."""
+        async with VolatilityScanner.cache_lock:
+            current_prices = self.price_history.latest_prices(assets)
+
+        missing = np.asarray(assets)[np.isnan(current_prices)]
+        if len(missing):
+            logger.info(f"No price data found for {len(missing)} assets: {format_symbols(missing)}")
+        return current_prices
+
+    def _resolve_column_interval(self, column):
+        """Kline interval a column is computed on: its "interval" setting, else the base interval below 24h and 30m above."""
+        duration = int(column["duration"])
+        interval = column.get("interval") or (self.base_interval if duration < 24 * 60 * 60 else "30m")
+        interval_ms = get_interval_seconds(interval) * 1000
+        if interval_ms < self.base_interval_ms or interval_ms % self.base_interval_ms:
+            logger.error(f"Column {column['name']}: interval {interval} is not a multiple of {self.base_interval}, using {self.base_interval}")
+            return self.base_interval
+        return interval
+
+    def _get_interval_groups(self):
+        """Groups the % change column durations by the kline interval used to compute them."""
+        interval_groups = {}
+        for column in self.change_columns:
+            interval_groups.setdefault(self.column_intervals[column["name"]], []).append(int(column["duration"]))
+        return interval_groups
+
+    def _get_history_spans(self):
+        """Seconds of history every column needs, by kline interval: flow columns also look back before their duration."""
+        spans = {}
         for column in self.columns_config:
-            duration = int(column["duration"])
-            kline_data = historical_data_for_durations.get(duration)
-
-            if kline_data is None:
-                asset_data[column["name"]] = {"percentage": None, "volatility": None, "old_price": None, "old_timestamp": None, "old_datetime": None}
+            spans.setdefault(self.column_intervals[column["name"]], []).append(history_seconds(column))
+        return spans
+
+    def _get_window_start(self, interval, durations, current_timestamp_ms):
+        return current_timestamp_ms - ((max(durations) + get_interval_seconds(interval)) * 1000)
+
+    def _get_base_window_start(self, current_timestamp_ms):
+        """Oldest base candle needed: the start of the first coarse bar of the longest window of every interval."""
+        window_starts = []
+        for interval, durations in self._get_history_spans().items():
+            interval_ms = get_interval_seconds(interval) * 1000
+            window_starts.append(self._get_window_start(interval, durations, current_timestamp_ms) // interval_ms * interval_ms)
+        return min(window_starts)
+
+    def _create_kline_cache(self):
+        if not self.kline_cache_config.get("enabled"):
+            return None
+        # One extra bar per interval so the window start, floored to a whole coarse bar, is always on disk.
+        retention_ms = {self.base_interval: max((max(durations) + 2 * get_interval_seconds(interval)) * 1000
+                                                for interval, durations in self._get_history_spans().items())}
+        return KlineCache(retention_ms, self.kline_cache_config)
+
+    def _load_kline_cache(self, current_timestamp_ms):
+        """Warm start: loads the on-disk history so the first scan only fetches the missing tail."""
+        cache = self.kline_store.cache
+        cache_size = cache.enforce_size_cap(set(self.assets))
+        window_start_ms = self._get_base_window_start(current_timestamp_ms)
+        loaded = 0
+        for asset in self.assets:
+            klines = cache.load(asset, self.base_interval, current_timestamp_ms)
+            # History that no longer reaches back to the window start would never be backfilled, fetch it fresh.
+            if len(klines) == 0 or klines["open_time"][0] > window_start_ms + self.base_interval_ms:
                 continue
-
-            try:
-                oldest_timestamp_ms = kline_data.get('close_time')
-                #oldest_datetime = convert_ms_timestamp_to_datetime_utc(oldest_timestamp_ms)
-                oldest_price = float(kline_data['close'])
-                oldest_timestamp = oldest_timestamp_ms / 1000
-                volatility = kline_data.get("volatility")
-
-                percentage_change = calculate_percentage_change(oldest_price, current_price)
-
+            self.store_klines(asset, self.base_interval, klines, current_timestamp_ms)
+            loaded += len(klines)
+        logger.info(f"Loaded {loaded} klines from the on-disk cache ({cache_size / 1024 / 1024:.1f}MB)")
+
+    def _update_rollups(self, asset, since_open_time_ms, current_timestamp_ms):
+        """Re-derives the coarser interval bars touched by base candles from since_open_time_ms onwards.
+
+        Rolled-up bars are kept in the store per symbol, so only the bars
+        covering new candles are recomputed.
+        """
+        for interval, durations in self._get_history_spans().items():
+            if interval == self.base_interval:
+                continue
+            interval_ms = get_interval_seconds(interval) * 1000
+            base_klines = self.kline_store.get_window(asset, self.base_interval, since_open_time_ms // interval_ms * interval_ms)
+            if len(base_klines) == 0:
+                continue
+            window_start_ms = self._get_window_start(interval, durations, current_timestamp_ms)
+            self.kline_store.merge(asset, interval, rollup_klines(base_klines, interval_ms), current_timestamp_ms, window_start_ms, persist=False)
+
+    def store_klines(self, asset, interval, klines, current_timestamp_ms):
+        """Merges base-interval klines into the store and updates the rolled-up intervals from them."""
+        if interval != self.base_interval or len(klines) == 0:
+            return
+        self.kline_store.merge(asset, interval, klines, current_timestamp_ms, self._get_base_window_start(current_timestamp_ms))
+        self._update_rollups(asset, int(klines["open_time"][0]), current_timestamp_ms)
+
+    async def _update_kline_store(self, asset, current_timestamp_ms):
+        """Fetches only the base candles that closed since the last scan. Returns False if a fetch failed."""
+        start_timestamp_ms = self._get_base_window_start(current_timestamp_ms)
+        fetch_start_ms = self.kline_store.get_fetch_start(asset, self.base_interval, start_timestamp_ms, current_timestamp_ms)
+        updated = True
+        while fetch_start_ms is not None:
+            limit = self.kline_store.get_fetch_limit(self.base_interval, fetch_start_ms, current_timestamp_ms)
+            self.kline_requests += 1
+            klines = await self.exchange.get_historical_data_async(asset, fetch_start_ms, current_timestamp_ms, interval=self.base_interval, limit=limit)
+            if klines is None:
+                self.symbol_log.add(logging.WARNING, f"Kline update failed ({self.base_interval}), using stored history", asset)
+                updated = False
+                break
+            self.store_klines(asset, self.base_interval, klines, current_timestamp_ms)
+            # Windows longer than one page (1000 candles) are backfilled page by page.
+            fetch_start_ms = int(klines["close_time"][-1]) + 1 if len(klines) == limit == 1000 else None
+
+        if len(self.kline_store.get_window(asset, self.base_interval, start_timestamp_ms)) == 0:
+            self.symbol_log.add(logging.INFO, f"No historical data found ({self.base_interval})", asset)
+        return updated
+
+    async def _fetch_asset_history(self, asset, current_timestamp_ms):
+        """Brings the asset's stored history up to date; every column interval is derived from the base interval."""
+        if self.kline_stream and self.kline_stream.is_live(asset):
+            return True  # the kline stream keeps this asset current, no REST needed
+
+        updated = await self._update_kline_store(asset, current_timestamp_ms)
+        if self.kline_stream and updated:
+            self.kline_stream.mark_backfilled(asset)
+        return updated
+
+    def _get_rolling_volatility(self, interval, durations, interval_ms):
+        if interval not in self.rolling_volatility:
+            self.rolling_volatility[interval] = RollingVolatility(
+                self.assets, durations, interval_ms, self.volatility_config["std_dev_multiplier"],
+                min_coverage=self.volatility_config.get("min_coverage", 1.0),
+                reanchor=self.volatility_config.get("reanchor", 288),
+            )
+        return self.rolling_volatility[interval]
+
+    def _compute_asset_data(self, assets, current_prices, current_timestamp_ms, stale_assets=()):
+        """Computes every configured column for all assets at once from the stored history.
+        stale_assets were not brought up to date; their rolling volatility is left as it is (NaN in the result)."""
+        stale_assets = set(stale_assets)
+        current = np.array([asset not in stale_assets for asset in assets], dtype=bool)
+        column_values = {}
+        flow_values = {}
+        interval_groups = self._get_interval_groups()
+        for interval, spans in self._get_history_spans().items():
+            interval_ms = get_interval_seconds(interval) * 1000
+            window_start_ms = self._get_window_start(interval, spans, current_timestamp_ms)
+            flow_columns = [column for column in self.flow_columns if self.column_intervals[column["name"]] == interval]
+            # One pass over the stored history per interval aligns the fields of every column on it.
+            open_times, fields, close_times = align_klines(self.kline_store, assets, interval, interval_ms, window_start_ms, current_timestamp_ms,
+                                                           ["close"] + flow_fields(flow_columns))
+            closes = fields["close"]
+            durations = interval_groups.get(interval)
+            if durations:
+                values = compute_change_columns(open_times, closes, close_times, current_prices, durations, interval_ms, current_timestamp_ms, None)
+                if len(open_times):
+                    # Volatility comes from the rolling stats, which only take in the candles closed since the last scan.
+                    # The forming candle closes at its stored close here, as in compute_change_columns; price ticks reprice it.
+                    rolling = self._get_rolling_volatility(interval, durations, interval_ms)
+                    rolling.update([asset for asset, is_current in zip(assets, current) if is_current], open_times, closes[current])
+                    values["volatility"] = rolling.volatility(assets, closes[:, -1], current_timestamp_ms)
+                for i, duration in enumerate(durations):
+                    column_values[(interval, duration)] = {name: matrix[:, i] for name, matrix in values.items()}
+            if flow_columns:
+                for column, column_flow in zip(flow_columns, compute_flow_columns(fields, flow_columns, interval_ms)):
+                    flow_values[column["name"]] = column_flow
+
+        results = {}
+        for row, asset in enumerate(assets):
+            asset_data = {}
+            for column in self.columns_config:
+                if column["name"] in flow_values:
+                    # In the percentage slot, so thresholds, colours, alerts and shards treat them like change columns.
+                    # Without a reference price they are left alone by price updates.
+                    value = flow_values[column["name"]][row]
+                    asset_data[column["name"]] = {"percentage": None if np.isnan(value) else f"{value:.{column_decimals(column)}f}",
+                                                  "volatility": None, "old_price": None, "old_timestamp": None}
+                    continue
+                values = column_values[(self.column_intervals[column["name"]], int(column["duration"]))]
+                percentage = values["percentage"][row]
+                if np.isnan(percentage):
+                    asset_data[column["name"]] = {"percentage": None, "volatility": None, "old_price": None, "old_timestamp": None, "old_datetime": None}
+                    continue
+
+                volatility = values["volatility"][row]
                 asset_data[column["name"]] = {
-                    "percentage": f"{percentage_change:.1f}",
-                    "volatility": f"{volatility:.2f}" if volatility is not None else None,
-                    "old_price": oldest_price,
-                    "old_timestamp": oldest_timestamp,
-                    #"old_datetime": oldest_datetime
+                    "percentage": f"{percentage:.1f}",
+                    "volatility": f"{volatility:.2f}" if not np.isnan(volatility) else None,
+                    "old_price": float(values["old_price"][row]),
+                    "old_timestamp": float(values["old_timestamp"][row]) / 1000,
                 }
-               
-            except (IndexError, KeyError, TypeError, ValueError) as e:
-                logger.error(f"Error processing historical data: {e}, Data: {kline_data} for {asset}, {column['name']}")
-                continue
-
-        #print(asset, '==', current_price)
-        #pretty_json(historical_data_for_durations)
-        #pretty_json(asset_data)
-
-        return {asset: asset_data}
+            results[asset] = asset_data
+        return results
+
+    def _merge_stale_row(self, asset_data, previous):
+        """Row of an asset whose history was not refreshed: cells the stored history can no longer give (reference
+        candle or flow window past its end, volatility) are kept from its previous row."""
+        if not previous:
+            return asset_data
+        merged = {}
+        for column_name, data in asset_data.items():
+            old = previous.get(column_name)
+            if not old or old.get("percentage") is None:
+                merged[column_name] = data
+            elif data["percentage"] is None:
+                merged[column_name] = old
+            else:
+                merged[column_name] = {**data, "volatility": data["volatility"] if data["volatility"] is not None else old.get("volatility")}
+        return merged
+
+    def _update_metrics(self, current_timestamp_ms):
+        """Stage times, cache sizes and how many symbols have stale or missing data after a scan."""
+        for stage, seconds in self.scan_stats.items():
+            metrics.scan_stage_seconds.set(seconds, stage=stage)
+        metrics.kline_store_size.set(self.kline_store.size())
+        metrics.price_history_bytes.set(self.price_history.memory_usage())
+        metrics.asset_data_rows.set(len(VolatilityScanner.asset_data_cache))
+
+        # Stale: the newest stored candle is more than one candle older than it should be
+        # (than the refresh planner lets a quiet symbol get).
+        stale_before_ms = current_timestamp_ms - 2 * self.base_interval_ms
+        if self.refresh_planner and not self.kline_stream:
+            stale_before_ms -= self.refresh_planner.max_staleness_ms
+        missing_klines = stale = 0
+        for asset in self.assets:
+            klines = self.kline_store.klines.get((asset, self.base_interval))
+            if klines is None or len(klines) == 0:
+                missing_klines += 1
+            elif klines["close_time"][-1] < stale_before_ms:
+                stale += 1
+        metrics.symbols_by_state.set(int(np.isnan(self.price_history.latest_prices(self.assets)).sum()), state="missing_price")
+        metrics.symbols_by_state.set(missing_klines, state="missing_klines")
+        metrics.symbols_by_state.set(stale, state="stale")
 
-    async def scan(self):
+    async def scan_asset(self, asset, current_timestamp_ms):
+        await self._fetch_asset_history(asset, current_timestamp_ms)
+        self.symbol_log.flush()
+        current_prices = await self._get_current_prices([asset])
+        return self._compute_asset_data([asset], current_prices, current_timestamp_ms)
+
+    async def scan(self, deadline=None):
+        """Fetches and recomputes every asset, or only the assets the refresh planner picks. With a deadline
+        (seconds), fetches still running when it expires are abandoned and the columns are computed from
+        whatever history is stored."""
         logger.info("Starting scan...")
+        self.kline_requests = 0
         async with VolatilityScanner.cache_lock:
-            current_prices_data = VolatilityScanner.current_prices_cache.copy()
-            current_timestamp_ms = current_prices_data.get("timestamp")
+            current_timestamp_ms = VolatilityScanner.current_prices_cache.get("timestamp")
+            asset_data = VolatilityScanner.asset_data_cache.copy() if self.refresh_planner else None
+        if current_timestamp_ms is None:
+            logger.info("No prices yet, skipping scan")
+            return
+
+        if self.kline_store.cache is not None and not self.kline_cache_loaded:
+            self._load_kline_cache(current_timestamp_ms)
+            self.kline_cache_loaded = True
+
+        # Symbols the planner leaves out are not fetched, but their columns are still recomputed from the stored
+        # history, so the reference price slides with the window. With the kline stream refreshing costs no requests, so every symbol is refreshed.
+        planner = self.refresh_planner if not self.kline_stream else None
+        assets = planner.plan(self.assets, asset_data, current_timestamp_ms) if planner else self.assets
+
+        # Bound the number of symbols in flight; each symbol issues one kline request (more pages on a cold start).
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def fetch_asset_limited(asset):
+            async with semaphore:
+                metrics.scan_queue_depth.dec()
+                asset_start = time.perf_counter()
+                try:
+                    return await self._fetch_asset_history(asset, current_timestamp_ms)
+                except Exception as e:
+                    self.symbol_log.add(logging.ERROR, "Error fetching history", asset, detail=e)
+                    return False
+                finally:
+                    metrics.symbol_fetch_seconds.observe(time.perf_counter() - asset_start)
+
+        fetch_start = time.perf_counter()
+        metrics.scan_queue_depth.set(len(assets))
+        tasks = {asyncio.create_task(fetch_asset_limited(asset)): asset for asset in assets}
+        _, pending = await asyncio.wait(tasks, timeout=deadline) if tasks else (set(), set())
+        metrics.scan_queue_depth.set(0)
+        if pending:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            logger.warning(f"Scan deadline of {deadline:.1f}s reached, {len(pending)} assets not refreshed this cycle: {format_symbols(tasks[task] for task in pending)}")
+        self.symbol_log.flush()
+        refreshed = [asset for task, asset in tasks.items() if task not in pending and task.result()]
+
+        # All columns of every asset are computed in one vectorized pass once the store is current.
+        compute_start = time.perf_counter()
+        refreshed_assets = set(refreshed)
+        stale = [asset for asset in self.assets if asset not in refreshed_assets]
+        current_prices = await self._get_current_prices(self.assets)
+        results = self._compute_asset_data(self.assets, current_prices, current_timestamp_ms, stale_assets=stale)
+        publish_start = time.perf_counter()
 
-        for asset in self.assets:
-            asset_data = await self.scan_asset(asset, current_timestamp_ms)
-            if asset_data:
-                async with VolatilityScanner.cache_lock:
-                    VolatilityScanner.asset_data_cache.update(asset_data) #Update cache incrementally
-                #logger.info(f"Updated cache for {asset}")
-                #logger.info(f"Updated cache for {asset}: {asset_data}") #Log each update
-        logger.info("Scan finished.")
\ No newline at end of file
+        async with VolatilityScanner.cache_lock:
+            for asset in stale:
+                results[asset] = self._merge_stale_row(results[asset], VolatilityScanner.asset_data_cache.get(asset))
+            for asset, asset_data in results.items():
+                self._set_asset_data(asset, asset_data, current_timestamp_ms)
+        self.scan_stats = {
+            "fetch": compute_start - fetch_start,
+            "compute": publish_start - compute_start,
+            "publish": time.perf_counter() - publish_start,
+        }
+        if planner:
+            planner.mark_refreshed(refreshed, results, current_timestamp_ms)
+            planner.release(set(assets) - set(refreshed), current_timestamp_ms)
+        metrics.symbols_by_state.set(len(self.assets) - len(assets), state="deferred")
+        self._update_metrics(current_timestamp_ms)
+        logger.info(f"Scan finished. Refreshed {len(refreshed)} of {len(self.assets)} assets, kline requests: {self.kline_requests}, stored klines: {self.kline_store.size()}, compute: {self.scan_stats['compute'] * 1000:.1f}ms")
+        logger.debug(f"Exchange connection stats: {self.exchange.get_connection_stats()}")
+        logger.debug(f"Price history: {len(self.price_history)} symbols, {self.price_history.memory_usage() / 1024:.0f}KB")
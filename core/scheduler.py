@@ -0,0 +1,110 @@
+import asyncio
+from core.logger import logger
+from core import metrics
+
+class JobStats:
+    """Timing of one periodic job: how late each tick started and how long it ran."""
+
+    def __init__(self):
+        self.runs = 0
+        self.missed_ticks = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.last_duration = 0.0
+        self.max_duration = 0.0
+
+    def as_dict(self):
+        return dict(self.__dict__)
+
+class Scheduler:
+    """Runs price refresh, scan cycles and display refresh on one event loop.
+
+    Each periodic job runs in a single task, so a job never overlaps itself:
+    a slow scan delays the next one instead of piling up. Ticks missed while a
+    job was running are coalesced into one run. Scans get a per-cycle deadline
+    after which unfinished fetches are abandoned and partial results published.
+    """
+
+    def __init__(self, scanner, scan_interval, price_interval=None, display_interval=None, scan_deadline=None, summary_interval=None):
+        self.scanner = scanner
+        self.scan_interval = scan_interval
+        self.price_interval = price_interval
+        self.display_interval = display_interval
+        self.summary_interval = summary_interval  # seconds between metrics summary log lines
+        self.scan_deadline = scan_deadline if scan_deadline is not None else scan_interval * 0.9
+        self.running = True
+        self.stats = {}
+        self.tasks = []
+
+    def stop(self):
+        self.running = False
+        for task in self.tasks:
+            task.cancel()
+
+    async def _run_periodic(self, name, interval, job):
+        loop = asyncio.get_running_loop()
+        stats = self.stats.setdefault(name, JobStats())
+        next_run = due = loop.time()
+        while self.running:
+            started = loop.time()
+            stats.last_lag = started - due  # includes any ticks coalesced while the previous run overran
+            stats.max_lag = max(stats.max_lag, stats.last_lag)
+            try:
+                await job()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error during {name}: {e}")
+            stats.runs += 1
+            stats.last_duration = loop.time() - started
+            stats.max_duration = max(stats.max_duration, stats.last_duration)
+
+            # Stay on the interval grid; if the run overran, all ticks that passed collapse into one immediate run.
+            next_run += interval
+            due = next_run
+            if next_run < loop.time():
+                missed = int((loop.time() - next_run) // interval)
+                stats.missed_ticks += missed
+                next_run += missed * interval
+            await asyncio.sleep(max(0, next_run - loop.time()))
+
+    async def _scan_cycle(self):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await self.scanner.scan(deadline=self.scan_deadline)
+        stats = self.stats["scan"]
+        metrics.scan_cycle_seconds.observe(loop.time() - started)
+        metrics.scan_lag_seconds.set(stats.last_lag)
+        metrics.scan_missed_ticks.set(stats.missed_ticks)
+        logger.info(f"Scan cycle {stats.runs + 1}: lag {stats.last_lag:.2f}s, missed ticks {stats.missed_ticks}")
+
+    async def _log_summary(self):
+        metrics.log_summary()
+
+    def start(self, display_job=None, background=(), jobs=()):
+        """Starts the periodic jobs, extra (name, interval, job) periodic jobs and any long-running coroutines
+        (e.g. streams) as tasks on the running loop. Without a scanner (a process that only aggregates shard
+        results) there are no scan and price jobs."""
+        if self.scanner:
+            metrics.scan_interval_seconds.set(self.scan_interval)
+            self.tasks.append(asyncio.create_task(self._run_periodic("scan", self.scan_interval, self._scan_cycle)))
+            if self.price_interval:
+                self.tasks.append(asyncio.create_task(self._run_periodic("prices", self.price_interval, self.scanner._update_current_prices)))
+        for name, interval, job in jobs:
+            self.tasks.append(asyncio.create_task(self._run_periodic(name, interval, job)))
+        if display_job and self.display_interval:
+            self.tasks.append(asyncio.create_task(self._run_periodic("display", self.display_interval, display_job)))
+        if self.summary_interval:
+            self.tasks.append(asyncio.create_task(self._run_periodic("summary", self.summary_interval, self._log_summary)))
+        for coroutine in background:
+            self.tasks.append(asyncio.create_task(coroutine))
+
+    async def run(self, display_job=None, background=(), jobs=()):
+        self.start(display_job, background, jobs)
+        try:
+            await asyncio.gather(*self.tasks)
+        except asyncio.CancelledError:
+            pass
+
+    def get_stats(self):
+        return {name: stats.as_dict() for name, stats in self.stats.items()}
@@ -0,0 +1,98 @@
+import asyncio
+import json
+import os
+import requests
+from core.logger import logger
+from core.scanner import VolatilityScanner
+from utils import get_current_utc_timestamp_ms
+
+def split_assets(assets, shard_index, shard_count):
+    """Every shard_count-th asset from shard_index, so each shard gets a similar mix of the list."""
+    return assets[shard_index::shard_count]
+
+def parse_shard(value):
+    """"2/4" -> (1, 4): shards are numbered from 1 on the command line."""
+    number, _, count = value.partition("/")
+    shard_index, shard_count = int(number) - 1, int(count)
+    if not 0 <= shard_index < shard_count:
+        raise ValueError(f"shard {value} is not between 1/{count} and {count}/{count}")
+    return shard_index, shard_count
+
+def configure_shard(config, shard_index, shard_count, local=True):
+    """Adjusts the loaded config of a shard process so shards do not step on each other.
+
+    Each shard keeps its own kline cache directory, since the cache prunes
+    files of assets it does not scan. Shards on one host share its IP and so
+    Binance's request weight budget (and the disk). The used weight Binance
+    reports per IP already counts every shard, so each keeps the full
+    weight_share for that check and only the pace of its own requests
+    (rate_share) and the disk are split between them.
+    """
+    kline_cache_config = config.setdefault("kline_cache", {})
+    kline_cache_config["directory"] = os.path.join(kline_cache_config.get("directory", "cache/klines"), f"shard{shard_index + 1}of{shard_count}")
+    if local:
+        exchange_config = config.setdefault("exchange", {})
+        exchange_config["rate_share"] = exchange_config.get("weight_share", 0.8) / shard_count
+        kline_cache_config["max_size_mb"] = kline_cache_config.get("max_size_mb", 200) / shard_count
+
+async def apply_rows(rows, timestamp_ms=None):
+    """Merges rows produced by shards into the results cache the display and API read."""
+    async with VolatilityScanner.cache_lock:
+        for asset, asset_data in rows.items():
+            VolatilityScanner._set_asset_data(asset, asset_data, timestamp_ms)
+        if timestamp_ms is not None:
+            VolatilityScanner.current_prices_cache["timestamp"] = max(timestamp_ms, VolatilityScanner.current_prices_cache.get("timestamp") or 0)
+
+class RemoteResultSink:
+    """Posts shard rows to the aggregating scanner's POST /ingest endpoint."""
+
+    def __init__(self, url, token=None, timeout=10):
+        self.url = url.rstrip("/") + "/ingest"
+        self.headers = {"Content-Type": "application/json"}
+        if token:
+            self.headers["Authorization"] = f"Bearer {token}"
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def write_rows(self, rows, timestamp_ms, shard):
+        body = json.dumps({"shard": shard, "timestamp": timestamp_ms, "assets": rows}, separators=(",", ":"))
+        response = self.session.post(self.url, data=body, headers=self.headers, timeout=self.timeout)
+        response.raise_for_status()
+
+class ShardPublisher:
+    """Runs in a shard process: hands the rows that changed since the last publish to a result table or sink."""
+
+    def __init__(self, sink, shard):
+        self.sink = sink
+        self.shard = shard  # "2/4", for logs and the aggregator
+        self.published_version = 0
+
+    async def publish(self):
+        async with VolatilityScanner.cache_lock:
+            version = VolatilityScanner.data_version
+            if version == self.published_version:
+                return
+            rows = {asset: VolatilityScanner.asset_data_cache[asset] for asset, asset_version in VolatilityScanner.asset_data_versions.items()
+                    if asset_version > self.published_version}
+            timestamp_ms = VolatilityScanner.current_prices_cache.get("timestamp")
+
+        if isinstance(self.sink, RemoteResultSink):
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self.sink.write_rows, rows, timestamp_ms, self.shard)
+            except (requests.RequestException, OSError) as e:
+                logger.error(f"Shard {self.shard}: publishing {len(rows)} rows failed, retrying with the next publish: {e}")
+                return
+        else:
+            self.sink.write_rows(rows)
+        self.published_version = version
+
+class SharedTableReader:
+    """Runs in the aggregating process: pulls the rows local shards wrote to the shared table into the results cache."""
+
+    def __init__(self, table):
+        self.table = table
+
+    async def pull(self):
+        rows = self.table.read_changed()
+        if rows:
+            await apply_rows(rows, get_current_utc_timestamp_ms())
@@ -0,0 +1,86 @@
+import numpy as np
+from multiprocessing import shared_memory
+
+FIELDS = ("percentage", "volatility", "old_price", "old_timestamp")
+
+class SharedResultTable:
+    """Scanner rows of every asset as fixed-width records in shared memory.
+
+    One record per asset holds, per column, percentage, volatility,
+    old_price and old_timestamp as float64 (NaN for None), so shard
+    processes write and the display/API process reads without pickling.
+    Each asset is written by one process only. `seq` is a per-record
+    seqlock: odd while the writer is in the middle of the record, bumped
+    again when done, so a reader never takes a torn record and can tell
+    which records changed since it last looked.
+    """
+
+    def __init__(self, assets, column_names, name=None, decimals=None):
+        self.assets = list(assets)
+        self.column_names = list(column_names)
+        self.decimals = list(decimals) if decimals is not None else [1] * len(self.column_names)
+        self.index = {asset: i for i, asset in enumerate(self.assets)}
+        self.dtype = np.dtype([("seq", "u8"), ("values", "f8", (len(self.column_names), len(FIELDS)))])
+        size = self.dtype.itemsize * max(len(self.assets), 1)
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(create=True, size=size) if self.owner else shared_memory.SharedMemory(name=name)
+        self.records = np.ndarray((len(self.assets),), dtype=self.dtype, buffer=self.shm.buf)
+        if self.owner:
+            self.records["seq"] = 0
+            self.records["values"] = np.nan
+        self.seen = np.zeros(len(self.assets), dtype="u8")  # reader side: seq of each record when last read
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def close(self):
+        """Detaches; the creating process also frees the memory."""
+        del self.records
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def write_rows(self, rows):
+        """Writes {asset: row} in the scanner's asset_data format."""
+        for asset, asset_data in rows.items():
+            i = self.index.get(asset)
+            if i is None:
+                continue
+            values = np.full((len(self.column_names), len(FIELDS)), np.nan)
+            for c, column_name in enumerate(self.column_names):
+                data = asset_data.get(column_name) or {}
+                for f, field in enumerate(FIELDS):
+                    if data.get(field) is not None:
+                        values[c, f] = float(data[field])
+            record = self.records[i:i + 1]
+            record["seq"] += 1
+            record["values"] = values
+            record["seq"] += 1
+
+    def _to_row(self, values):
+        asset_data = {}
+        for c, column_name in enumerate(self.column_names):
+            percentage, volatility, old_price, old_timestamp = values[c]
+            if np.isnan(percentage):
+                asset_data[column_name] = {"percentage": None, "volatility": None, "old_price": None, "old_timestamp": None, "old_datetime": None}
+                continue
+            asset_data[column_name] = {
+                "percentage": f"{percentage:.{self.decimals[c]}f}",
+                "volatility": f"{volatility:.2f}" if not np.isnan(volatility) else None,
+                "old_price": float(old_price) if not np.isnan(old_price) else None,  # flow columns have no reference price
+                "old_timestamp": float(old_timestamp) if not np.isnan(old_timestamp) else None,
+            }
+        return asset_data
+
+    def read_changed(self):
+        """Returns {asset: row} of the records written since the last call; records mid-write wait for the next call."""
+        rows = {}
+        seqs = self.records["seq"].copy()
+        for i in np.nonzero((seqs != self.seen) & (seqs % 2 == 0))[0]:
+            values = self.records["values"][i].copy()
+            if self.records["seq"][i] != seqs[i]:
+                continue  # rewritten while copying
+            self.seen[i] = seqs[i]
+            rows[self.assets[i]] = self._to_row(values)
+        return rows
@@ -0,0 +1,119 @@
+import asyncio
+from datetime import datetime, timezone
+from core.logger import logger, format_symbols
+from core.scanner import VolatilityScanner
+from exchanges.tradingview import TradingViewExchange, INTERVAL_SUFFIXES, recommendation
+from utils import get_interval_seconds, get_current_utc_timestamp_ms
+
+WEEK_MS = 7 * 24 * 60 * 60 * 1000
+WEEK_ORIGIN_MS = -3 * 24 * 60 * 60 * 1000  # Monday 1969-12-29, weekly bars open on Mondays
+
+def next_bar_close_ms(interval, now_ms):
+    """Close (UTC) of the interval's bar that is open at now_ms."""
+    if interval == "1M":
+        now = datetime.fromtimestamp(now_ms / 1000, timezone.utc)
+        year, month = (now.year + 1, 1) if now.month == 12 else (now.year, now.month + 1)
+        return int(datetime(year, month, 1, tzinfo=timezone.utc).timestamp() * 1000)
+    if interval == "1w":
+        return WEEK_ORIGIN_MS + ((now_ms - WEEK_ORIGIN_MS) // WEEK_MS + 1) * WEEK_MS
+    interval_ms = get_interval_seconds(interval) * 1000
+    return (now_ms // interval_ms + 1) * interval_ms
+
+class TAColumns:
+    """TradingView ratings and indicators as extra columns of the results.
+
+    Each column is an indicator on an interval ("Recommend.All" on "1h" is the
+    1h summary rating). All columns of an interval are fetched for the whole
+    universe in one batched request (batch_size tickers each) and cached until
+    the interval's next bar closes, so TA costs a few requests per bar.
+    refresh() is meant to run as a periodic job: it only fetches intervals
+    whose bar closed, and the tickers of batches that failed since. The cells are merged into every row the scanner stores
+    (VolatilityScanner.ta_columns), so scans and price ticks keep them.
+    """
+
+    def __init__(self, assets, ta_config):
+        self.exchange = TradingViewExchange(
+            scan_url=ta_config.get("url"),
+            timeout=ta_config.get("timeout", 10),
+            max_retries=ta_config.get("max_retries", 3),
+            backoff_base=ta_config.get("backoff_base", 1),
+            batch_size=ta_config.get("batch_size", 500),
+        )
+        # Binance perpetual BTCUSDT is BINANCE:BTCUSDT.P on TradingView.
+        prefix = ta_config.get("exchange", "BINANCE")
+        suffix = ta_config.get("symbol_suffix", ".P")
+        self.tickers = {f"{prefix}:{asset}{suffix}": asset for asset in assets}
+        self.settle_ms = ta_config.get("settle", 5) * 1000
+        self.columns = []
+        self.indicators = {}  # interval -> indicators fetched for it
+        for column in ta_config.get("columns", []):
+            if column.get("interval") not in INTERVAL_SUFFIXES:
+                logger.error(f"TA column {column.get('name')}: unsupported interval {column.get('interval')}, skipping it")
+                continue
+            self.columns.append(column)
+            indicators = self.indicators.setdefault(column["interval"], [])
+            if column["indicator"] not in indicators:
+                indicators.append(column["indicator"])
+        self.names = {column["name"] for column in self.columns}
+        self.expires = {}  # interval -> ms until which its values are current (next bar close)
+        self.retry = {}    # interval -> tickers of failed batches, fetched again on every refresh until they succeed
+        self.rows = {}     # asset -> {column name: cell}
+
+    def _cell(self, column, value):
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return None
+        cell = {"value": f"{value:.2f}"}
+        if column["indicator"].startswith("Recommend."):
+            cell["rating"] = recommendation(value)
+        return cell
+
+    async def refresh(self):
+        """Fetches the intervals whose bar closed since the last fetch and merges changed cells into the results."""
+        now_ms = get_current_utc_timestamp_ms()
+        due = {}
+        for interval in self.indicators:
+            if now_ms >= self.expires.get(interval, 0):
+                due[interval] = list(self.tickers)
+            elif self.retry.get(interval):
+                due[interval] = self.retry[interval]
+        if not due:
+            return
+        results = await asyncio.gather(*(self.exchange.get_multiple_analysis_async(tickers, interval, self.indicators[interval]) for interval, tickers in due.items()))
+
+        changed = set()
+        for (interval, tickers), (analysis, failed) in zip(due.items(), results):
+            if len(failed) == len(tickers):
+                continue  # all failed, tried again on the next refresh
+            if now_ms >= self.expires.get(interval, 0):
+                self.expires[interval] = next_bar_close_ms(interval, now_ms) + self.settle_ms
+            self.retry[interval] = failed
+            failed = set(failed)
+            missing = [self.tickers[ticker] for ticker in tickers if ticker not in analysis and ticker not in failed]
+            if missing:
+                logger.info(f"No {interval} TA for {len(missing)} assets: {format_symbols(missing)}")
+            for column in self.columns:
+                if column["interval"] != interval:
+                    continue
+                for ticker, values in analysis.items():
+                    asset = self.tickers.get(ticker)
+                    if asset is None:
+                        continue
+                    row = self.rows.setdefault(asset, {})
+                    cell = self._cell(column, values.get(column["indicator"]))
+                    if row.get(column["name"]) == cell:
+                        continue
+                    if cell is None:
+                        row.pop(column["name"], None)
+                    else:
+                        row[column["name"]] = cell
+                    changed.add(asset)
+
+        async with VolatilityScanner.cache_lock:
+            for asset in changed:
+                # Stored rows carry the old cells; _set_asset_data merges in the current ones.
+                cached = VolatilityScanner.asset_data_cache.get(asset, {})
+                VolatilityScanner._set_asset_data(asset, {name: data for name, data in cached.items() if name not in self.names})
+        logger.info(f"TA refreshed for {', '.join(due)}: {len(changed)} assets changed, next in "
+                    + ", ".join(f"{interval} {(self.expires[interval] - now_ms) / 1000:.0f}s" for interval in due if interval in self.expires))
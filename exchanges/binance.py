@@ -1,19 +1,122 @@
+import asyncio
+import functools
+import random
+import threading
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from core.logger import logger
 import urllib.parse
-from utils import mytime_from_timestamp
+from core.klines import klines_from_raw
+from core import metrics
+from exchanges.weight_limiter import WeightLimiter, request_weight, BAN_STATUS_CODES
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
 
 class BinanceExchange:
-    def __init__(self):
-        self.base_url = "https://api.binance.com"
-        self.future_base_url = "https://fapi.binance.com"
+    def __init__(self, base_url=None, future_base_url=None, max_workers=16, pool_size=None, timeout=10, max_retries=3, backoff_base=0.5, backoff_max=30,
+                 weight_limit=2400, weight_share=0.8, min_concurrency=1, rate_share=None):
+        self.base_url = base_url or "https://api.binance.com"
+        self.future_base_url = future_base_url or "https://fapi.binance.com"
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="binance")
         self.spot_price_ticker = self.base_url + "/api/v3/ticker/price"
         self.future_price_ticker = self.future_base_url + "/fapi/v1/ticker/price"
 
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        # One keep-alive pool shared by all worker threads, sized so no worker waits for a connection.
+        self.adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size or max_workers)
+        self.session = requests.Session()
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+        self.session.headers.update({"Accept-Encoding": "gzip, deflate"})
+
+        # Every attempt, retries included, goes through the limiter; at most max_workers can be in flight anyway.
+        self.limiter = WeightLimiter(weight_limit, weight_share, min_concurrency, max_workers, default_pause=backoff_base, rate_share=rate_share)
+
+        self.stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0, "failures": 0, "parse_time": 0.0}
+
+    def _count(self, name, value=1):
+        with self.stats_lock:
+            self.stats[name] += value
+
+    def _get_retry_delay(self, attempt, retry_after=None):
+        """Jittered exponential backoff, or the server's Retry-After (seconds) when it sends one."""
+        if retry_after is not None:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _send(self, url, params, endpoint, weight):
+        """One HTTP attempt: waits for the rate limiter, then is timed and counted as in flight."""
+        self.limiter.acquire(weight)
+        metrics.exchange_in_flight.inc()
+        request_start = time.perf_counter()
+        response = None
+        try:
+            response = self.session.get(url, params=params, timeout=self.timeout)
+            return response
+        finally:
+            metrics.exchange_in_flight.dec()
+            metrics.exchange_request_seconds.observe(time.perf_counter() - request_start, endpoint=endpoint)
+            self.limiter.release(response)
+
+    def _get(self, url, params=None):
+        """GET with the pooled session, retrying timeouts, connection errors, 429 and 5xx."""
+        endpoint = urllib.parse.urlsplit(url).path
+        weight = request_weight(url, params)
+        for attempt in range(self.max_retries + 1):
+            self._count("requests")
+            try:
+                response = self._send(url, params, endpoint, weight)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                metrics.exchange_requests.inc(endpoint=endpoint, status="error")
+                if attempt == self.max_retries:
+                    self._count("failures")
+                    raise
+                delay = self._get_retry_delay(attempt)
+                logger.warning(f"Request to {url} failed ({e}), retrying in {delay:.2f}s")
+            else:
+                metrics.exchange_requests.inc(endpoint=endpoint, status=response.status_code)
+                if response.status_code not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                    if not response.ok:
+                        self._count("failures")
+                    response.raise_for_status()
+                    return response
+                if response.status_code in BAN_STATUS_CODES:
+                    delay = 0  # the limiter already holds every request until Retry-After
+                else:
+                    delay = self._get_retry_delay(attempt, response.headers.get("Retry-After"))
+                logger.warning(f"Request to {url} returned {response.status_code}, retrying in {delay:.2f}s")
+            self._count("retries")
+            time.sleep(delay)
+
+    def get_connection_stats(self):
+        """Request/retry counters plus how many requests reused a pooled connection instead of a new handshake."""
+        pools = self.adapter.poolmanager.pools
+        new_connections = 0
+        pooled_requests = 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                new_connections += pool.num_connections
+                pooled_requests += pool.num_requests
+        with self.stats_lock:
+            stats = dict(self.stats)
+        stats["new_connections"] = new_connections
+        stats["reused_connections"] = max(0, pooled_requests - new_connections)
+        return stats
+
     def get_current_prices(self):
         try:
-            response = requests.get(self.future_price_ticker)
-            response.raise_for_status()
+            response = self._get(self.future_price_ticker)
             prices = response.json()
             price_dict = {item['symbol']: float(item['price']) for item in prices}
             return price_dict
@@ -21,40 +124,36 @@ class BinanceExchange:
             logger.error(f"Error fetching current prices from Binance: {e}")
             return None
 
-    def get_historical_data(self, symbol, startTime, endTime, interval):
+    def get_historical_data(self, symbol, startTime, endTime, interval, limit=1000):
         try:
             query_string = urllib.parse.urlencode({
                 "symbol": symbol,
                 "interval": interval,
                 "startTime": startTime,
                 "endTime": endTime,
-                "limit": 1000
+                "limit": limit
             })
             url = f"{self.future_base_url}/fapi/v1/klines?{query_string}"
             #print(url)
-            response = requests.get(url)
-            response.raise_for_status()
-            klines = response.json()
-
-            historical_data = []
-            for kline in klines:
-                historical_data.append({
-                    "open_time": int(kline[0]),
-                    "open": float(kline[1]),
-                    "high": float(kline[2]),
-                    "low": float(kline[3]),
-                    "close": float(kline[4]),
-                    "volume": float(kline[5]),
-                    "close_time": int(kline[6]),
-                    "close_time_local": mytime_from_timestamp(int(kline[6])/1000.0),
-                    "base_asset_vol": float(kline[7]),
-                    "number_of_trades": int(kline[8]),
-                    "taker_buy_vol": float(kline[9]),
-                    "taker_buy_base_asset_vol": float(kline[10])
-                })
-            #print(historical_data)
-            return historical_data
+            response = self._get(url)
+            parse_start = time.perf_counter()
+            klines = klines_from_raw(response.json())
+            self._count("parse_time", time.perf_counter() - parse_start)
+            return klines
 
         except requests.exceptions.RequestException as e:
-            logger.error(f"Error fetching historical data from Binance: {e}")
-            return None
\ No newline at end of file
+            # Per symbol, so only in the log file; the scanner logs one warning for all failed symbols of a scan.
+            logger.debug(f"Error fetching historical data from Binance: {e}")
+            return None
+
+    async def _run_in_executor(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def get_current_prices_async(self):
+        """Non-blocking get_current_prices, runs on the exchange's worker pool."""
+        return await self._run_in_executor(self.get_current_prices)
+
+    async def get_historical_data_async(self, symbol, startTime, endTime, interval, limit=1000):
+        """Non-blocking get_historical_data, so many symbols can be in flight at once."""
+        return await self._run_in_executor(self.get_historical_data, symbol, startTime, endTime, interval, limit)
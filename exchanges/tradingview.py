@@ -1,123 +1,112 @@
-import json
+import asyncio
+import random
 import time
-from tradingview_ta import TA_Handler, Interval
+import urllib.parse
+import requests
+from concurrent.futures import ThreadPoolExecutor
 from core.logger import logger
+from core import metrics
 
-MAX_RETRIES = 3
-RETRY_DELAY = 1
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Suffix TradingView's scanner puts on an indicator to select its timeframe ("RSI|60" is the 1h RSI, daily has none).
+INTERVAL_SUFFIXES = {
+    "1m": "|1", "5m": "|5", "15m": "|15", "30m": "|30",
+    "1h": "|60", "2h": "|120", "4h": "|240",
+    "1d": "", "1w": "|1W", "1M": "|1M",
+}
+
+RATINGS = ("STRONG_SELL", "SELL", "NEUTRAL", "BUY", "STRONG_BUY")
+
+def recommendation(value):
+    """Rating of a Recommend.* value (-1..1), with the same bounds as tradingview_ta."""
+    if value is None:
+        return None
+    if value < -0.5:
+        return "STRONG_SELL"
+    if value < -0.1:
+        return "SELL"
+    if value <= 0.1:
+        return "NEUTRAL"
+    if value <= 0.5:
+        return "BUY"
+    return "STRONG_BUY"
 
 class TradingViewExchange:
-    def __init__(self):  # Removed username and password
-        pass
+    """Technical analysis from TradingView's scanner endpoint, many symbols per request.
 
-    def get_analysis(self, symbol, interval):
-        try:
-            exchange, ticker = symbol.split(":")
-        except ValueError:
-            logger.error(f"Invalid symbol format: {symbol}. Expected 'EXCHANGE:TICKER'.")
-            return None
+    One POST returns the requested indicator columns for every ticker in it,
+    instead of one TA_Handler request per symbol. Requests run in a small
+    thread pool; retries wait with asyncio.sleep, so they never block the loop.
+    """
 
-        handler = TA_Handler(symbol=ticker, screener="crypto", exchange=exchange, interval=interval) # Removed username and password
+    def __init__(self, scan_url=None, timeout=10, max_retries=3, backoff_base=1, backoff_max=30, batch_size=500, max_workers=2):
+        self.scan_url = scan_url or "https://scanner.tradingview.com/crypto/scan"
+        self.endpoint = urllib.parse.urlsplit(self.scan_url).path
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.batch_size = batch_size
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tradingview")
+        self.session = requests.Session()
+        self.session.headers.update({"Accept-Encoding": "gzip, deflate"})
 
-        for _ in range(MAX_RETRIES):
+    def _get_retry_delay(self, attempt, retry_after=None):
+        if retry_after is not None:
             try:
-                analysis = handler.get_analysis()
-                if analysis is not None:
-                    return analysis
-                else:
-                    logger.warning(f"Analysis is None for {symbol} on attempt {_ + 1}.")
-                    time.sleep(RETRY_DELAY)
-            except Exception as e:
-                logger.warning(f"Error getting analysis for {symbol} (Retry {_ + 1}/{MAX_RETRIES}): {e}")
-                time.sleep(RETRY_DELAY)
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
 
-        logger.error(f"Failed to get analysis for {symbol} after {MAX_RETRIES} retries.")
-        return None
-
-    def get_current_price(self, symbol):
+    def _post(self, payload):
+        request_start = time.perf_counter()
         try:
-            exchange, ticker = symbol.split(":")
-        except ValueError:
-            logger.error(f"Invalid symbol format: {symbol}. Expected 'EXCHANGE:TICKER'.")
-            return None
+            return self.session.post(self.scan_url, json=payload, timeout=self.timeout)
+        finally:
+            metrics.exchange_request_seconds.observe(time.perf_counter() - request_start, endpoint=self.endpoint)
 
-        for _ in range(MAX_RETRIES):
+    async def scan_async(self, tickers, columns):
+        """{ticker: {column: value}} for one batch of tickers; raises once the retries are used up."""
+        payload = {"symbols": {"tickers": list(tickers), "query": {"types": []}}, "columns": list(columns)}
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.max_retries + 1):
             try:
-                handler = TA_Handler(symbol=ticker, screener="crypto", exchange=exchange, interval=Interval.INTERVAL_1_MINUTE) # Removed username and password
-                analysis = handler.get_analysis()
-                if analysis is not None:
-                    if hasattr(analysis, 'close'):
-                        return analysis.close
-                    elif hasattr(analysis, 'indicators') and isinstance(analysis.indicators, dict) and 'close' in analysis.indicators:
-                        return analysis.indicators['close']
-                    elif hasattr(analysis, 'ohlc') and isinstance(analysis.ohlc, dict) and 'close' in analysis.ohlc:
-                        return analysis.ohlc['close']
-                    else:
-                        logger.warning(f"Analysis object for {symbol} does not have expected 'close' attribute or structure.")
-                        logger.debug(f"Analysis object: {analysis.__dict__ if hasattr(analysis, '__dict__') else analysis}")
-                        time.sleep(RETRY_DELAY)
-                        continue # continue to next retry
-                else:
-                    logger.warning(f"Analysis is None for {symbol} on attempt {_ + 1}.")
-                    time.sleep(RETRY_DELAY)
-                    continue # continue to next retry
-            except Exception as e:
-                logger.error(f"Error retrieving current price for {symbol}: {e}")
-                time.sleep(RETRY_DELAY)
-        logger.error(f"Failed to get current price for {symbol} after {MAX_RETRIES} retries.")
-        return None
+                response = await loop.run_in_executor(self.executor, self._post, payload)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                metrics.exchange_requests.inc(endpoint=self.endpoint, status="error")
+                if attempt == self.max_retries:
+                    raise
+                delay = self._get_retry_delay(attempt)
+                logger.warning(f"TradingView scan request failed ({e}), retrying in {delay:.2f}s")
+            else:
+                metrics.exchange_requests.inc(endpoint=self.endpoint, status=response.status_code)
+                if response.status_code not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                    response.raise_for_status()
+                    return {row["s"]: dict(zip(columns, row["d"])) for row in response.json().get("data") or []}
+                delay = self._get_retry_delay(attempt, response.headers.get("Retry-After"))
+                logger.warning(f"TradingView scan request returned {response.status_code}, retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    async def get_multiple_analysis_async(self, tickers, interval, indicators):
+        """({ticker: {indicator: value}}, failed tickers) of `indicators` on `interval` for all tickers, batch_size
+        tickers per request.
 
-    def get_historical_data(self, symbol, interval, limit):
-        logger.debug(f"Fetching historical data for {symbol} with interval {interval} and limit {limit}")
-        analysis = self.get_analysis(symbol, interval)
-        if analysis:
-            logger.debug(f"Analysis object: {json.dumps(analysis.__dict__, default=str) if hasattr(analysis, '__dict__') else analysis}")
-            if hasattr(analysis, 'indicators') and analysis.indicators is not None:
-                indicators = analysis.indicators
-                logger.debug(f"Indicators object: {json.dumps(indicators, default=str) if indicators else indicators}")
-                if isinstance(indicators, dict):
-                    if "open" in indicators and "high" in indicators and "low" in indicators and "close" in indicators and "volume" in indicators:
-                        opens = indicators['open']
-                        highs = indicators['high']
-                        lows = indicators['low']
-                        closes = indicators['close']
-                        volumes = indicators['volume']
+        A batch that fails is logged and its tickers returned as failed, the other batches are still returned.
+        """
+        suffix = INTERVAL_SUFFIXES[interval]
+        columns = [f"{indicator}{suffix}" for indicator in indicators]
+        batches = [tickers[i:i + self.batch_size] for i in range(0, len(tickers), self.batch_size)]
+        results = await asyncio.gather(*(self.scan_async(batch, columns) for batch in batches), return_exceptions=True)
 
-                        historical_data = []
-                        if isinstance(closes, list):
-                            data_len = len(closes)
-                            if data_len > 0:
-                                for i in range(min(data_len, limit)): # Limit the data points
-                                    historical_data.append({
-                                        'open': opens[i] if isinstance(opens, list) and i < len(opens) else opens,
-                                        'high': highs[i] if isinstance(highs, list) and i < len(highs) else highs,
-                                        'low': lows[i] if isinstance(lows, list) and i < len(lows) else lows,
-                                        'close': closes[i],
-                                        'volume': volumes[i] if isinstance(volumes, list) and i < len(volumes) else volumes
-                                    })
-                            else:
-                                logger.debug(f"No data found for {symbol} with interval {interval}.")
-                        elif isinstance(closes, (float, int)):
-                            historical_data = [{
-                                'open': opens,
-                                'high': highs,
-                                'low': lows,
-                                'close': closes,
-                                'volume': volumes
-                            }]
-                        else:
-                            logger.error(f"Unexpected data type for 'close' in indicators: {type(closes)}")
-                            return None
-                        if historical_data:
-                            return historical_data
-                        else:
-                            return None
-                    else:
-                        logger.error(f"Analysis.indicators for {symbol} is not a dictionary or does not have required keys: {json.dumps(indicators, default=str) if indicators else indicators}")
-                        return None
-                else:
-                    logger.error(f"Analysis object for {symbol} does not have 'indicators' attribute: {json.dumps(analysis.__dict__, default=str) if hasattr(analysis, '__dict__') else analysis}")
-                    return None
-        else:
-            logger.warning(f"Could not get analysis for {symbol}.")
-            return None
\ No newline at end of file
+        analysis = {}
+        failed = []
+        for batch, result in zip(batches, results):
+            if isinstance(result, Exception):
+                logger.error(f"TradingView {interval} analysis failed for {len(batch)} tickers: {result}")
+                failed += batch
+                continue
+            for ticker, values in result.items():
+                analysis[ticker] = {indicator: values.get(column) for indicator, column in zip(indicators, columns)}
+        return analysis, failed
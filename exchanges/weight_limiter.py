@@ -0,0 +1,135 @@
+import threading
+import time
+import urllib.parse
+from core.logger import logger
+from core import metrics
+
+BAN_STATUS_CODES = {429, 418}  # 429: over the limit, 418: IP banned for ignoring 429s
+
+def request_weight(url, params=None):
+    """Binance futures request weight of a GET; klines are charged by limit, the price ticker by symbol count."""
+    parsed = urllib.parse.urlsplit(url)
+    query = dict(urllib.parse.parse_qsl(parsed.query))
+    query.update(params or {})
+    if parsed.path.endswith("/klines"):
+        limit = int(query.get("limit", 500))
+        if limit < 100:
+            return 1
+        if limit < 500:
+            return 2
+        if limit <= 1000:
+            return 5
+        return 10
+    if parsed.path.endswith("/ticker/price"):
+        return 1 if "symbol" in query else 2
+    return 1
+
+class WeightLimiter:
+    """Keeps request weight under a share of Binance's per-minute budget, shared by all worker threads.
+
+    A token bucket holding `weight_share` of the minute's weight refills
+    evenly over the minute, so a scan is spread out instead of burning the
+    budget in its first seconds. The X-MBX-USED-WEIGHT-1M header of every
+    response is authoritative: it also counts weight used by other clients
+    on the same IP, and is held to weight_share of the limit. rate_share
+    (defaults to weight_share) sizes the bucket instead, so processes
+    sharing an IP can each take a part of the rate while the header keeps
+    them under the IP-wide budget together. Concurrency adapts: it grows while usage is comfortably
+    under budget and shrinks as it gets close. A 429/418 halves it and
+    pauses every request until Retry-After.
+    """
+
+    def __init__(self, weight_limit=2400, weight_share=0.8, min_concurrency=1, max_concurrency=16, default_pause=1, rate_share=None):
+        self.budget = weight_limit * weight_share  # IP-wide, checked against the exchange's used weight
+        self.bucket = weight_limit * (rate_share if rate_share is not None else weight_share)  # this process's rate
+        self.refill_rate = self.bucket / 60
+        self.tokens = self.bucket
+        self.updated = time.monotonic()
+        # At least one request may always be in flight, otherwise waiting workers are never woken.
+        self.min_concurrency = max(1, min_concurrency)
+        self.max_concurrency = max(self.min_concurrency, max_concurrency)
+        self.concurrency = float(max(self.min_concurrency, self.max_concurrency // 4))  # grows from here as responses come back
+        self.default_pause = default_pause
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.used_weight = 0        # weight used in used_weight_minute, per the exchange plus what we sent since
+        self.used_weight_minute = None
+        self.condition = threading.Condition()
+        metrics.rate_limit_concurrency.set(self.concurrency)
+
+    def _refill(self, now):
+        self.tokens = min(self.bucket, self.tokens + (now - self.updated) * self.refill_rate)
+        self.updated = now
+
+    def _get_wait(self, weight, now):
+        """Seconds until a request of `weight` may be sent, 0 if it may go now, None to wait for a release."""
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.in_flight >= int(self.concurrency):
+            return None
+        wall_time = time.time()
+        if self.used_weight_minute == int(wall_time // 60) and self.used_weight + weight > self.budget:
+            return 60 - wall_time % 60  # this minute's budget is spent, wait for the exchange's window to reset
+        if self.tokens < weight:
+            return (weight - self.tokens) / self.refill_rate
+        return 0
+
+    def acquire(self, weight):
+        """Blocks the calling worker thread until the request may be sent."""
+        wait_start = time.monotonic()
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._get_wait(weight, now)
+                if wait == 0:
+                    break
+                self.condition.wait(wait)
+            self.tokens -= weight
+            self.in_flight += 1
+            if self.used_weight_minute == int(time.time() // 60):
+                self.used_weight += weight  # counted until the response header brings the exchange's figure
+        metrics.rate_limit_wait_seconds.observe(time.monotonic() - wait_start)
+
+    def release(self, response=None):
+        """Records the outcome of a request sent after acquire(); response is None if it failed without one."""
+        with self.condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if response is not None:
+                self._track_used_weight(response.headers.get("X-MBX-USED-WEIGHT-1M"), now)
+                if response.status_code in BAN_STATUS_CODES:
+                    self._pause(response, now)
+                elif response.ok:
+                    self._adapt_concurrency()
+            metrics.rate_limit_concurrency.set(self.concurrency)
+            self.condition.notify_all()
+
+    def _track_used_weight(self, header, now):
+        if header is None:
+            return
+        used_weight = int(header)
+        minute = int(time.time() // 60)
+        # Responses can arrive out of order, within a minute the highest count is the latest.
+        self.used_weight = max(self.used_weight, used_weight) if self.used_weight_minute == minute else used_weight
+        self.used_weight_minute = minute
+        self._refill(now)
+        self.tokens = min(self.tokens, self.budget - self.used_weight)
+        metrics.exchange_used_weight.set(used_weight)
+
+    def _adapt_concurrency(self):
+        usage = self.used_weight / self.budget if self.used_weight_minute == int(time.time() // 60) else 0
+        if usage > 0.9:
+            self.concurrency = max(self.min_concurrency, self.concurrency * 0.9)
+        elif usage < 0.75:
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+
+    def _pause(self, response, now):
+        try:
+            pause = float(response.headers.get("Retry-After", self.default_pause))
+        except ValueError:
+            pause = self.default_pause
+        self.paused_until = max(self.paused_until, now + pause)
+        self.concurrency = max(self.min_concurrency, self.concurrency / 2)
+        metrics.rate_limit_pauses.inc(status=response.status_code)
+        logger.warning(f"Exchange returned {response.status_code}, pausing all requests for {pause:.1f}s, concurrency now {int(self.concurrency)}")
@@ -1,164 +1,220 @@
+import time
+STARTED = time.perf_counter()  # before the imports below, for the --once startup time
+import argparse
 import asyncio
 import signal
 import sys
-import time
-from rich.live import Live
-from core.config_loader import assets_config, scanner_config
-from core.scanner import VolatilityScanner
-from core.logger import logger
-from core.display_manager import DisplayManager
-from rich.console import Console
 import traceback
-from threading import Thread, Event
+from core.config_loader import assets_config, scanner_config, require_config
+from core.logger import logger
+# Everything else is imported where it is used, so --once does not pay for the display, streams and API.
 
-console = Console()
-data_updater = None
-scan_updater = None
+scheduler = None
 
 def signal_handler(sig, frame):
     logger.info('You pressed Ctrl+C! Exiting gracefully...')
-    global data_updater, scan_updater
-    if data_updater:
-        data_updater.stop()
-    if scan_updater:
-        scan_updater.stop()
+    if scheduler:
+        scheduler.stop()
     sys.exit(0)
 
 signal.signal(signal.SIGINT, signal_handler)
 
-initial_prices_updated = Event()
-
-def initial_prices_update(assets):
-    async def run_initial_prices_update():
-        try:
-            scanner = VolatilityScanner(assets)
-            await scanner._update_current_prices()
-        except Exception as e:
-            logger.error(f"Error during initial price update: {e}")
-            traceback.print_exc()
-        finally:
-            initial_prices_updated.set()
-
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    loop.run_until_complete(run_initial_prices_update())
-    loop.close()
-
-def initial_scan(assets, scanner):
-    async def run_initial_scan():
-        try:
-            await scanner.scan()
-        except Exception as e:
-            logger.error(f"Error during initial scan: {e}")
-            traceback.print_exc()
-
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    loop.run_until_complete(run_initial_scan())
-    loop.close()
-
-class DataUpdaterThread(Thread):
-    def __init__(self, scanner):
-        super().__init__(daemon=True)
-        self.running = True
-        self.scanner = scanner
-
-    def run(self):
-        async def run_async():
-            while self.running:
-                try:
-                    await asyncio.sleep(scanner_config["intervals"]["data_refresh"])
-                    asyncio.run_coroutine_threadsafe(self.scanner._update_current_prices(), asyncio.get_running_loop())
-                except Exception as e:
-                    logger.error(f"Error during data update: {e}")
-                    traceback.print_exc()
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            loop.run_until_complete(run_async())
-        finally:
-            loop.close()
-
-    def stop(self):
-        self.running = False
-
-class ScanUpdaterThread(Thread):
-    def __init__(self, scanner):
-        super().__init__(daemon=True)
-        self.running = True
-        self.scanner = scanner
-
-    def run(self):
-        async def run_async():
-            while self.running:
-                try:
-                    await asyncio.sleep(scanner_config["intervals"]["data_refresh"])
-                    asyncio.run_coroutine_threadsafe(self.scanner.scan(), asyncio.get_running_loop())
-                except Exception as e:
-                    logger.error(f"Error during scan update: {e}")
-                    traceback.print_exc()
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            loop.run_until_complete(run_async())
-        finally:
-            loop.close()
-    
-    def stop(self):
-        self.running = False
-
-async def main():
-    global data_updater, scan_updater
-    display_manager = DisplayManager()
+def parse_args():
+    parser = argparse.ArgumentParser(description="Crypto volatility scanner")
+    parser.add_argument("--headless", action="store_true", help="no terminal table, serve the results over the HTTP API only")
+    parser.add_argument("--shards", type=int, help="split the assets over this many scanner processes (default: sharding.processes)")
+    parser.add_argument("--shard", help="scan only shard I/N of the assets and post the results to --aggregator")
+    parser.add_argument("--aggregator", help="API url of the scanner that shows the results of all shards")
+    parser.add_argument("--aggregate", action="store_true", help="do not scan, show the results remote shards post to /ingest")
+    parser.add_argument("--once", action="store_true", help="run one scan, write the results and exit (for cron and job runners)")
+    parser.add_argument("--format", choices=["json", "csv"], default="json", help="--once output format")
+    parser.add_argument("--output", help="--once output file, default stdout")
+    args = parser.parse_args()
+    if bool(args.shard) != bool(args.aggregator):
+        parser.error("--shard and --aggregator go together")
+    return args
+
+async def create_scanner(assets):
+    """Scanner for `assets` plus its scheduler and the streams to run next to it."""
+    from core.scanner import VolatilityScanner
+    from core.price_stream import PriceStream
+    from core.kline_stream import KlineStream
+    from core.scheduler import Scheduler
     intervals = scanner_config["intervals"]
 
-    scanner = VolatilityScanner(assets_config)
-
-    # Start initial prices update in a separate thread
-    initial_prices_thread = Thread(target=initial_prices_update, args=(assets_config,))
-    initial_prices_thread.start()
-    initial_prices_updated.wait() #Wait for prices to be updated
-
-    # Start initial scan in a separate thread (NO join here)
-    initial_scan_thread = Thread(target=initial_scan, args=(assets_config, scanner))
-    initial_scan_thread.start() #Do not join here
-
-    data_updater = DataUpdaterThread(scanner)
-    data_updater.start()
-
-    scan_updater = ScanUpdaterThread(scanner)
-    scan_updater.start()
-
-    with Live(console=console) as live:
-        i = 0
-        while True:
+    scanner = VolatilityScanner(assets)
+    scan_refresh = intervals["data_refresh"]
+    price_refresh = intervals["data_refresh"]
+    background = []
+
+    kline_stream_config = scanner_config.get("kline_stream", {})
+    if kline_stream_config.get("enabled"):
+        # After the first (REST) scan backfills history, scans only recompute from streamed klines,
+        # so they can run far more often than data_refresh.
+        scanner.kline_stream = KlineStream(scanner, kline_stream_config)
+        background.append(scanner.kline_stream.run())
+        scan_refresh = kline_stream_config.get("scan_refresh", scan_refresh)
+
+    # Prices are needed before the first scan can compute anything.
+    await scanner._update_current_prices()
+
+    price_stream_config = scanner_config.get("price_stream", {})
+    if price_stream_config.get("enabled"):
+        # Streamed prices replace the periodic REST poll; the stream falls back to polling on its own.
+        background.append(PriceStream(scanner, price_stream_config).run())
+        price_refresh = None
+
+    scheduler = Scheduler(
+        scanner,
+        scan_interval=scan_refresh,
+        price_interval=price_refresh,
+        display_interval=intervals["display_refresh"],
+        scan_deadline=intervals.get("scan_deadline"),
+        summary_interval=scanner_config.get("metrics", {}).get("summary_interval"),
+    )
+    return scanner, scheduler, background
+
+async def run_shard(shard_index, shard_count, sink):
+    """Scans one shard of the assets and publishes its rows to the shared table or the remote aggregator."""
+    from core.sharding import split_assets, ShardPublisher
+    global scheduler
+    assets = split_assets(assets_config, shard_index, shard_count)
+    logger.info(f"Shard {shard_index + 1}/{shard_count}: scanning {len(assets)} of {len(assets_config)} assets")
+    scanner, scheduler, background = await create_scanner(assets)
+    publisher = ShardPublisher(sink, f"{shard_index + 1}/{shard_count}")
+    publish_interval = scanner_config.get("sharding", {}).get("publish_interval", 1)
+    await scheduler.run(background=background, jobs=[("publish", publish_interval, publisher.publish)])
+
+def run_shard_process(shard_index, shard_count, table_name):
+    """Entry point of a local shard process; the parent stops it with SIGTERM."""
+    import logging
+    from core.logger import start_logging, stream_handler
+    from core.flow_columns import column_decimals
+    from core.shared_results import SharedResultTable
+    from core.sharding import configure_shard
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Exit normally on the parent's SIGTERM, so the queued log records are written.
+    signal.signal(signal.SIGTERM, lambda sig, frame: sys.exit(0))
+    # The log thread does not survive the fork; every shard writes (and rotates) its own file.
+    start_logging(f"logs/app-shard{shard_index + 1}.log")
+    # The parent owns the terminal, shards only complain on the console.
+    stream_handler.setLevel(logging.WARNING)
+    configure_shard(scanner_config, shard_index, shard_count)
+    table = SharedResultTable(assets_config, [column["name"] for column in scanner_config["columns"]], name=table_name,
+                              decimals=[column_decimals(column) for column in scanner_config["columns"]])
+    try:
+        asyncio.run(run_shard(shard_index, shard_count, table))
+    finally:
+        table.close()
+
+def start_shard_processes(shard_count):
+    """Starts the local shard processes and the shared table they write to."""
+    import multiprocessing
+    from core.flow_columns import column_decimals
+    from core.shared_results import SharedResultTable
+    table = SharedResultTable(assets_config, [column["name"] for column in scanner_config["columns"]],
+                              decimals=[column_decimals(column) for column in scanner_config["columns"]])
+    processes = [multiprocessing.Process(target=run_shard_process, args=(i, shard_count, table.name), name=f"shard-{i + 1}", daemon=True)
+                 for i in range(shard_count)]
+    for process in processes:
+        process.start()
+    logger.info(f"Started {shard_count} shard processes for {len(assets_config)} assets")
+    return table, processes
+
+async def main(args, table=None):
+    from core.scanner import VolatilityScanner
+    from core.scheduler import Scheduler
+    from core.api_server import ApiServer
+    from core.alerts import AlertEngine
+    from core.ta_columns import TAColumns
+    from core.sharding import parse_shard, configure_shard, RemoteResultSink, SharedTableReader
+    global scheduler
+    intervals = scanner_config["intervals"]
+    api_config = scanner_config.get("api", {})
+    metrics_config = scanner_config.get("metrics", {})
+    jobs = []
+
+    if args.shard:
+        shard_index, shard_count = parse_shard(args.shard)
+        configure_shard(scanner_config, shard_index, shard_count, local=False)
+        await run_shard(shard_index, shard_count, RemoteResultSink(args.aggregator, api_config.get("ingest_token")))
+        return
+
+    background = []
+    if table is not None or args.aggregate:
+        # Results come from shard processes (shared table) or other hosts (POST /ingest), nothing is scanned here.
+        if table is not None:
+            jobs.append(("shards", scanner_config.get("sharding", {}).get("publish_interval", 1), SharedTableReader(table).pull))
+        if args.aggregate:
+            api_config = {**api_config, "ingest": True}
+        scheduler = Scheduler(None, scan_interval=intervals["data_refresh"], display_interval=intervals["display_refresh"],
+                              summary_interval=metrics_config.get("summary_interval"))
+    else:
+        scanner, scheduler, background = await create_scanner(assets_config)
+
+    alerts_config = scanner_config.get("alerts", {})
+    if alerts_config.get("enabled"):
+        # Checked on every change to the results cache, here where the rows of all shards end up.
+        VolatilityScanner.alert_engine = AlertEngine(scanner_config["columns"], alerts_config)
+        background.append(VolatilityScanner.alert_engine.run())
+
+    ta_config = scanner_config.get("ta", {})
+    if ta_config.get("enabled"):
+        # Also only here: one batched fetch per interval and bar covers the assets of all shards.
+        VolatilityScanner.ta_columns = TAColumns(assets_config, ta_config)
+        jobs.append(("ta", ta_config.get("check_interval", 10), VolatilityScanner.ta_columns.refresh))
+
+    if args.headless or args.aggregate or api_config.get("enabled") or metrics_config.get("enabled"):
+        background.append(ApiServer(api_config).run())
+
+    if args.headless:
+        await scheduler.run(background=background, jobs=jobs)
+        return
+
+    from rich.console import Console
+    from rich.live import Live
+    from core.display_manager import DisplayManager
+    display_manager = DisplayManager()
+    with Live(console=Console()) as live:
+        async def refresh_display():
             async with VolatilityScanner.cache_lock:
                 results = VolatilityScanner.asset_data_cache.copy()
-                current_prices = VolatilityScanner.current_prices_cache.copy()
+                versions = VolatilityScanner.asset_data_versions.copy()
+                current_prices = VolatilityScanner.current_prices_cache.get("prices")
 
-            if current_prices and current_prices.get("prices"): #Check if prices exists
+            if current_prices or VolatilityScanner.current_prices_cache.get("timestamp"): #Check if prices exists
                 if results:
-                    table = display_manager.display_results(assets_config, results, current_prices)
+                    table = display_manager.display_results(assets_config, results, current_prices, versions)
                     live.update(table)
                 else:
                     live.update("Waiting for initial scan...") #Show waiting message
             else:
                 live.update("Waiting for prices...") #Show waiting message
-            display_refresh = intervals["display_refresh"]
-            i = i + 2
-            if (i * intervals["display_refresh"]) > intervals["data_refresh"]:
-                display_refresh = int(intervals["data_refresh"] / 2) # increase sleep time
-            await asyncio.sleep(display_refresh)
+
+        await scheduler.run(display_job=refresh_display, background=background, jobs=jobs)
 
 if __name__ == "__main__":
+    require_config()
+    args = parse_args()
+    if args.once:
+        from core.oneshot import run_once
+        sys.exit(asyncio.run(run_once(args.format, args.output, scanner_config["intervals"].get("scan_deadline"), STARTED)))
+
+    table, processes = None, []
     try:
-        asyncio.run(main())
+        shard_count = args.shards if args.shards is not None else scanner_config.get("sharding", {}).get("processes", 1)
+        if shard_count > 1 and not args.shard and not args.aggregate:
+            table, processes = start_shard_processes(shard_count)
+        asyncio.run(main(args, table))
     except Exception as e:
         logger.error(f"An error occurred: {e}")
         traceback.print_exc()
     finally:
-        if data_updater:
-            data_updater.stop()
-        if scan_updater:
-            scan_updater.stop()
-        logger.info("Application finished.")
\ No newline at end of file
+        if scheduler:
+            scheduler.stop()
+        for process in processes:
+            process.terminate()
+            process.join()
+        if table is not None:
+            table.close()
+        logger.info("Application finished.")
@@ -0,0 +1,84 @@
+import numpy as np
+from core.flow_columns import compute_flow_columns
+
+INTERVAL_MS = 300_000
+
+def make_fields(num_assets=30, num_steps=320, seed=3, holes=0.003):
+    rng = np.random.default_rng(seed)
+    fields = {}
+    fields["close"] = 100 * np.exp(np.cumsum(rng.normal(0, 0.003, (num_assets, num_steps)), axis=1))
+    fields["high"] = fields["close"] * (1 + rng.random((num_assets, num_steps)) * 0.004)
+    fields["low"] = fields["close"] * (1 - rng.random((num_assets, num_steps)) * 0.004)
+    fields["volume"] = rng.gamma(2, 500, (num_assets, num_steps))
+    fields["taker_buy_vol"] = fields["volume"] * rng.random((num_assets, num_steps))
+    fields["number_of_trades"] = rng.integers(10, 500, (num_assets, num_steps)).astype(float)
+    missing = rng.random((num_assets, num_steps)) < holes
+    for matrix in fields.values():
+        matrix[missing] = np.nan
+    return fields
+
+def naive(fields, asset, column):
+    """Loop version of one cell: volume_zscore and trades end on the newest closed candle, the others on the forming one."""
+    candles = column["duration"] * 1000 // INTERVAL_MS
+    num_steps = fields["close"].shape[1]
+    end = num_steps - 1 if column["type"] in ("volume_zscore", "trades") else num_steps
+
+    def window_sum(field, back):
+        start = end - (back + 1) * candles
+        if start < 0:
+            return None
+        window = fields[field][asset, start:start + candles]
+        return None if np.isnan(window).any() else window.sum()
+
+    if column["type"] in ("volume_zscore", "trades"):
+        field = "volume" if column["type"] == "volume_zscore" else "number_of_trades"
+        recent = window_sum(field, 0)
+        previous = [s for s in (window_sum(field, k) for k in range(1, column["lookback"] // column["duration"] + 1)) if s is not None]
+        if recent is None or len(previous) < 2:
+            return np.nan
+        if column["type"] == "volume_zscore":
+            std = np.std(previous)
+            return np.nan if std == 0 else (recent - np.mean(previous)) / std
+        return (recent / np.mean(previous) - 1) * 100
+    if column["type"] == "taker_buy":
+        volume, taker_buy = window_sum("volume", 0), window_sum("taker_buy_vol", 0)
+        return np.nan if volume is None or taker_buy is None else (2 * taker_buy / volume - 1) * 100
+    true_ranges = []
+    for step in range(num_steps - candles, num_steps):
+        high, low, previous_close = fields["high"][asset, step], fields["low"][asset, step], fields["close"][asset, step - 1]
+        if np.isnan(high) or np.isnan(low):
+            return np.nan
+        true_ranges.append(high - low if np.isnan(previous_close) else max(high - low, abs(high - previous_close), abs(low - previous_close)))
+    return np.mean(true_ranges) / fields["close"][asset, -1] * 100
+
+def test_matches_naive_loops():
+    fields = make_fields()
+    columns = [
+        {"name": "z", "type": "volume_zscore", "duration": 3600, "lookback": 86400},
+        {"name": "tb", "type": "taker_buy", "duration": 3600},
+        {"name": "tr", "type": "trades", "duration": 1800, "lookback": 43200},
+        {"name": "atr", "type": "atr", "duration": 3600},
+    ]
+    results = compute_flow_columns(fields, columns, INTERVAL_MS)
+    for column, values in zip(columns, results):
+        expected = np.array([naive(fields, asset, column) for asset in range(len(values))])
+        np.testing.assert_allclose(values, expected, rtol=1e-9, equal_nan=True)
+        assert np.isfinite(values).any()
+
+def test_partial_forming_candle_is_left_out():
+    # Steady volume and trades, the forming candle only a few seconds old.
+    fields = make_fields(num_assets=5, holes=0)
+    rng = np.random.default_rng(7)
+    fields["volume"] = 1000 + rng.normal(0, 10, fields["volume"].shape)
+    fields["number_of_trades"] = np.round(200 + rng.normal(0, 5, fields["number_of_trades"].shape))
+    fields["volume"][:, -1] = 5
+    fields["number_of_trades"][:, -1] = 1
+    columns = [
+        {"name": "z 5m", "type": "volume_zscore", "duration": 300, "lookback": 86400},
+        {"name": "z 1h", "type": "volume_zscore", "duration": 3600, "lookback": 86400},
+        {"name": "trades 5m", "type": "trades", "duration": 300, "lookback": 86400},
+    ]
+    z_short, z_long, trades = compute_flow_columns(fields, columns, INTERVAL_MS)
+    assert np.all(np.abs(z_short) < 5)
+    assert np.all(np.abs(z_long) < 5)
+    assert np.all(np.abs(trades) < 10)
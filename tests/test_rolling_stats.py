@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+from core.column_engine import compute_change_columns, compute_change_series
+from core.rolling_stats import RollingVolatility
+from utils import calculate_volatility
+
+INTERVAL_MS = 300_000
+DURATIONS = [3600, 7200, 14400, 86400]
+
+def make_closes(num_assets, num_steps, seed, holes=0.01):
+    """Large prices with tiny moves (prone to cancellation), a share of the candles missing."""
+    rng = np.random.default_rng(seed)
+    base = 1000 + 1e6 * rng.random((num_assets, 1))
+    closes = base * np.exp(np.cumsum(rng.normal(0, 0.002, (num_assets, num_steps)), axis=1))
+    closes[rng.random((num_assets, num_steps)) < holes] = np.nan
+    open_times = np.arange(num_steps, dtype=np.int64) * INTERVAL_MS + 10**12 // INTERVAL_MS * INTERVAL_MS
+    return open_times, closes
+
+def reference_volatility(closes, duration, min_coverage):
+    """calculate_volatility over the window's step % changes, the last close being the forming candle's."""
+    window = closes[-(duration * 1000 // INTERVAL_MS):]
+    changes = [None if np.isnan(previous) or np.isnan(close) else (close - previous) / previous * 100
+               for previous, close in zip(window[:-1], window[1:])]
+    volatility = calculate_volatility(changes, 2, min_coverage)
+    return np.nan if volatility is None else volatility
+
+@pytest.mark.parametrize("min_coverage", [1.0, 0.9])
+def test_rolling_matches_engine_and_calculate_volatility(min_coverage):
+    rng = np.random.default_rng(1)
+    num_assets, num_steps = 20, 700
+    open_all, closes_all = make_closes(num_assets, num_steps, seed=1)
+    assets = [f"A{i}" for i in range(num_assets)]
+    # A short reanchor, so rows are rebuilt and re-anchored many times along the way.
+    rolling = RollingVolatility(assets, DURATIONS, INTERVAL_MS, 2, min_coverage=min_coverage, reanchor=50)
+    step = previous_step = 300
+    while step < num_steps:
+        now_ms = int(open_all[step]) + int(rng.integers(0, INTERVAL_MS))
+        first = max(0, step - max(DURATIONS) * 1000 // INTERVAL_MS - 1)
+        open_times = open_all[first:step + 1]
+        if rng.random() < 0.1:
+            closes_all[rng.integers(0, num_assets), previous_step - 1] *= 1.01  # a revised close of a candle already pushed
+        # Every update only sees some of the assets, like a scan with deferred symbols.
+        subset = np.sort(rng.choice(num_assets, size=int(rng.integers(num_assets // 2, num_assets + 1)), replace=False))
+        closes = closes_all[subset, first:step + 1]
+        names = [assets[i] for i in subset]
+
+        rolling.update(names, open_times, closes)
+        got = rolling.volatility(names, closes[:, -1], now_ms)
+        engine = compute_change_columns(open_times, closes, np.zeros_like(closes, dtype=np.int64), closes[:, -1], DURATIONS, INTERVAL_MS,
+                                        now_ms, 2, min_coverage=min_coverage)["volatility"]
+        np.testing.assert_allclose(got, engine, rtol=1e-9, equal_nan=True)
+        assert np.isfinite(got).any()
+        for row in range(0, len(subset), 5):
+            expected = [reference_volatility(closes[row], duration, min_coverage) for duration in DURATIONS]
+            np.testing.assert_allclose(got[row], expected, rtol=1e-9, equal_nan=True)
+        previous_step = step
+        step += int(rng.choice([1, 1, 2, 3]))
+
+def test_rolling_reprices_the_forming_candle():
+    open_times, closes = make_closes(3, 400, seed=2, holes=0)
+    assets = ["A", "B", "C"]
+    rolling = RollingVolatility(assets, DURATIONS, INTERVAL_MS, 2)
+    rolling.update(assets, open_times, closes)
+    now_ms = int(open_times[-1]) + 1
+    prices = closes[:, -1] * 1.003
+    got = rolling.volatility(assets, prices, now_ms)
+    repriced = closes.copy()
+    repriced[:, -1] = prices
+    for row in range(len(assets)):
+        np.testing.assert_allclose(got[row], [reference_volatility(repriced[row], duration, 1.0) for duration in DURATIONS], rtol=1e-9)
+    # A candle closed since the update: the row cannot be priced until it is brought up to date.
+    assert np.isnan(rolling.volatility(assets, prices, now_ms + INTERVAL_MS)).all()
+    assert not rolling.is_current(assets, now_ms + INTERVAL_MS).any()
+
+def test_no_drift_without_reanchoring():
+    rng = np.random.default_rng(3)
+    num_steps, window = 30000, 300
+    closes = 50000 * np.exp(np.cumsum(rng.normal(0, 0.001, num_steps)))
+    open_times = np.arange(num_steps, dtype=np.int64) * INTERVAL_MS
+    rolling = RollingVolatility(["X"], [86400], INTERVAL_MS, 1, reanchor=10**9)
+    for step in range(window, num_steps + 1):
+        rolling.update(["X"], open_times[step - window:step], closes[None, step - window:step])
+    recent = closes[-288:]
+    exact = np.std(np.diff(recent) / recent[:-1] * 100)
+    got = rolling.volatility(["X"], [closes[-1]], int(open_times[-1]) + 1)[0, 0]
+    assert abs(got - exact) / exact < 1e-9
+
+def test_change_series_matches_calculate_volatility():
+    open_times, closes = make_closes(6, 500, seed=4)
+    eval_times = open_times[300::7] + 12345
+    prices = np.nan_to_num(closes[:, 300::7], nan=1000.0)
+    values = compute_change_series(open_times, closes, np.zeros_like(closes, dtype=np.int64), prices, DURATIONS, INTERVAL_MS, eval_times, 2,
+                                   min_coverage=0.9)
+    for t, eval_time in enumerate(eval_times):
+        last_step = (eval_time - open_times[0]) // INTERVAL_MS
+        for row in range(len(closes)):
+            visible = closes[row, :last_step + 1]
+            expected = [reference_volatility(visible, duration, 0.9) for duration in DURATIONS]
+            np.testing.assert_allclose(values["volatility"][row, t], expected, rtol=1e-9, equal_nan=True)
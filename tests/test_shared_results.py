@@ -0,0 +1,19 @@
+import json
+from core.shared_results import SharedResultTable
+
+def test_round_trips_change_and_flow_cells():
+    row = {
+        "1h Change": {"percentage": "-1.5", "volatility": "0.42", "old_price": 101.25, "old_timestamp": 1792281899.999},
+        "ATR 1h": {"percentage": "0.58", "volatility": None, "old_price": None, "old_timestamp": None},
+        "Trades 1h": {"percentage": "12", "volatility": None, "old_price": None, "old_timestamp": None},
+    }
+    table = SharedResultTable(["BTCUSDT", "ETHUSDT"], list(row), decimals=[1, 2, 0])
+    try:
+        table.write_rows({"BTCUSDT": row})
+        read = table.read_changed()
+        assert list(read) == ["BTCUSDT"]
+        assert read["BTCUSDT"] == row
+        json.dumps(read, allow_nan=False)  # what /snapshot and the SSE frames send
+        assert table.read_changed() == {}
+    finally:
+        table.close()
@@ -0,0 +1,215 @@
+"""Reproducible scan benchmark against the local fake Binance server.
+
+Starts tools.fake_binance in a subprocess (so its threads do not skew the
+timings), then runs full cycles of price update, scan and table render:
+
+    python3 -m tools.benchmark --symbols 2000 --cycles 5 --latency 30 --jitter 20 --error-rate 0.01
+
+Per cycle it records wall time, requests and request weight (as charged by
+the server), retries, per-stage time and peak RSS, and writes everything to
+a JSON file. --compare old.json prints the change against an earlier run.
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import platform
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from datetime import datetime, timezone
+
+from rich.console import Console
+
+from core.config_loader import assets_config, scanner_config, require_config
+from core.display_manager import DisplayManager
+from core.logger import stream_handler
+from core.scanner import VolatilityScanner
+from tools.fake_binance import synthetic_symbols
+
+STAGES = ["prices", "fetch", "compute", "publish", "render"]  # wall time, one after the other
+# parse_cpu is kline parsing time summed over the fetch worker threads: CPU seconds that overlap fetch, not a stage.
+SUMMARY_METRICS = ["wall", "requests", "weight", "throttled", "retries", "parse_cpu"] + STAGES
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KB on Linux
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def start_fake_server(args):
+    port = _free_port()
+    command = [
+        sys.executable, "-m", "tools.fake_binance", "--port", str(port), "--symbols", str(args.symbols),
+        "--latency", str(args.latency), "--jitter", str(args.jitter), "--error-rate", str(args.error_rate),
+        "--retry-after", str(args.retry_after), "--seed", str(args.seed),
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    process.stdout.readline()  # "Fake Binance serving ..." once it is listening
+    return process, f"http://127.0.0.1:{port}"
+
+
+def server_stats(url):
+    with urllib.request.urlopen(f"{url}/fake/stats", timeout=10) as response:
+        return json.load(response)
+
+
+async def run_cycles(args, url):
+    symbols = synthetic_symbols(args.symbols, assets_config)
+    scanner = VolatilityScanner(symbols)
+    display_manager = DisplayManager()
+    console = Console(file=io.StringIO(), width=args.width, force_terminal=True)
+
+    cycles = []
+    for cycle in range(args.cycles):
+        server_before = server_stats(url)
+        exchange_before = scanner.exchange.get_connection_stats()
+        cycle_start = time.perf_counter()
+
+        await scanner._update_current_prices()
+        prices_done = time.perf_counter()
+        await scanner.scan()
+        render_start = time.perf_counter()
+        async with VolatilityScanner.cache_lock:
+            results = VolatilityScanner.asset_data_cache.copy()
+            versions = VolatilityScanner.asset_data_versions.copy()
+            current_prices = VolatilityScanner.current_prices_cache.get("prices")
+        frame = display_manager.display_results(symbols, results, current_prices, versions)
+        console.print(frame)
+        console.file.seek(0)
+        console.file.truncate()
+        cycle_end = time.perf_counter()
+
+        server_after = server_stats(url)
+        exchange_after = scanner.exchange.get_connection_stats()
+        cycles.append({
+            "cycle": cycle + 1,
+            "wall": cycle_end - cycle_start,
+            "requests": server_after["requests"] - server_before["requests"],
+            "weight": server_after["weight"] - server_before["weight"],
+            "throttled": server_after["throttled"] - server_before["throttled"],
+            "retries": exchange_after["retries"] - exchange_before["retries"],
+            "kline_requests": scanner.kline_requests,
+            "parse_cpu": exchange_after["parse_time"] - exchange_before["parse_time"],
+            "stages": {
+                "prices": prices_done - cycle_start,
+                "fetch": scanner.scan_stats.get("fetch", 0.0),
+                "compute": scanner.scan_stats.get("compute", 0.0),
+                "publish": scanner.scan_stats.get("publish", 0.0),
+                "render": cycle_end - render_start,
+            },
+            "peak_rss_mb": _peak_rss_mb(),
+        })
+        print(_format_cycle(cycles[-1]), flush=True)
+        if args.cycle_interval and cycle + 1 < args.cycles:
+            await asyncio.sleep(args.cycle_interval)
+
+    scanner.exchange.executor.shutdown(wait=False)
+    return cycles
+
+
+def _metric(cycle, name):
+    return cycle["stages"][name] if name in STAGES else cycle[name]
+
+
+def summarize(cycles):
+    """Cold (first) cycle as is, warm cycles as medians."""
+    summary = {"cold": {name: _metric(cycles[0], name) for name in SUMMARY_METRICS}}
+    warm = cycles[1:]
+    if warm:
+        summary["warm_median"] = {name: statistics.median(_metric(cycle, name) for cycle in warm) for name in SUMMARY_METRICS}
+    summary["peak_rss_mb"] = max(cycle["peak_rss_mb"] for cycle in cycles)
+    return summary
+
+
+def _format_cycle(cycle):
+    stages = " ".join(f"{name} {cycle['stages'][name] * 1000:.1f}ms" for name in STAGES)
+    return (f"cycle {cycle['cycle']}: wall {cycle['wall']:.3f}s, requests {cycle['requests']}, weight {cycle['weight']}, "
+            f"429s {cycle['throttled']}, retries {cycle['retries']} | {stages} | parse CPU {cycle['parse_cpu'] * 1000:.1f}ms "
+            f"(all workers) | peak RSS {cycle['peak_rss_mb']:.0f}MB")
+
+
+def print_comparison(baseline, current):
+    print(f"{'':<14}{'metric':<12}{'baseline':>12}{'current':>12}{'change':>10}")
+    for phase in ("cold", "warm_median"):
+        if phase not in baseline["summary"] or phase not in current["summary"]:
+            continue
+        for name in SUMMARY_METRICS:
+            if name not in baseline["summary"][phase]:
+                continue  # not measured by the baseline's version
+            old, new = baseline["summary"][phase][name], current["summary"][phase][name]
+            change = f"{(new - old) / old * 100:+.1f}%" if old else "-"
+            print(f"{phase:<14}{name:<12}{old:>12.4g}{new:>12.4g}{change:>10}")
+    old, new = baseline["summary"]["peak_rss_mb"], current["summary"]["peak_rss_mb"]
+    print(f"{'':<14}{'peak_rss_mb':<12}{old:>12.4g}{new:>12.4g}{(new - old) / old * 100:>+9.1f}%")
+
+
+def main():
+    require_config()
+    parser = argparse.ArgumentParser(description="Benchmark scan cycles against the local fake Binance server.")
+    parser.add_argument("--symbols", type=int, default=len(assets_config), help="number of symbols to scan (padded with synthetic ones)")
+    parser.add_argument("--cycles", type=int, default=3, help="scan cycles to run, the first one is cold")
+    parser.add_argument("--cycle-interval", type=float, default=0, help="seconds to wait between cycles")
+    parser.add_argument("--latency", type=float, default=0, help="ms the server adds to every response")
+    parser.add_argument("--jitter", type=float, default=0, help="up to this many extra ms per response")
+    parser.add_argument("--error-rate", type=float, default=0, help="share of requests answered with 429 (0-1)")
+    parser.add_argument("--retry-after", type=float, default=0, help="Retry-After seconds sent with a 429")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the server's jitter and 429 injection")
+    parser.add_argument("--width", type=int, default=200, help="terminal width the table is rendered at")
+    parser.add_argument("--kline-cache", action="store_true", help="keep the on-disk kline cache enabled (off by default so runs are comparable)")
+    parser.add_argument("--output", default="benchmark.json", help="where to write the JSON results")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    # Warnings and errors still show; per-scan info lines would only add console I/O to the timings.
+    stream_handler.setLevel(logging.WARNING)
+
+    process, url = start_fake_server(args)
+    try:
+        scanner_config.setdefault("exchange", {})["future_base_url"] = url
+        scanner_config.setdefault("kline_cache", {})["enabled"] = args.kline_cache
+        cycles = asyncio.run(run_cycles(args, url))
+    finally:
+        process.terminate()
+        process.wait()
+
+    results = {
+        "meta": {
+            "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "summary": summarize(cycles),
+        "cycles": cycles,
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
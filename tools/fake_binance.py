@@ -0,0 +1,267 @@
+"""Local stand-in for the Binance futures REST endpoints used by the scanner.
+
+Serves deterministic synthetic data so scans can be run without touching the real API:
+
+    python3 -m tools.fake_binance --port 8765
+
+then point the scanner at it in scanner_config.json:
+
+    "exchange": {"future_base_url": "http://127.0.0.1:8765"}
+
+--latency/--jitter (ms) delay every response, --error-rate answers that share
+of requests with 429, --symbols pads the asset list with synthetic symbols.
+Request weight is charged like Binance does and reported in the
+X-MBX-USED-WEIGHT-1M header; GET /fake/stats returns the totals.
+
+POST /crypto/scan stands in for TradingView's scanner, for the TA columns:
+
+    "ta": {"url": "http://127.0.0.1:8765/crypto/scan"}
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import urllib.parse
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils import get_interval_seconds
+
+DEFAULT_ASSETS_FILE = "config/assets.json"
+
+
+def _symbol_seed(symbol):
+    return zlib.crc32(symbol.encode())
+
+
+def synthetic_symbols(count, symbols=()):
+    """`symbols` padded (or cut) to `count` with made-up perpetual names."""
+    symbols = list(symbols)[:count]
+    return symbols + [f"BENCH{i:05d}USDT" for i in range(count - len(symbols))]
+
+
+def klines_weight(limit):
+    """Request weight of /fapi/v1/klines, which Binance charges by limit."""
+    if limit < 100:
+        return 1
+    if limit < 500:
+        return 2
+    if limit <= 1000:
+        return 5
+    return 10
+
+
+def synthetic_price(symbol, timestamp_ms):
+    """Deterministic price for a symbol at a point in time (same inputs, same price)."""
+    seed = _symbol_seed(symbol)
+    base = 0.01 + (seed % 100000) / 100.0
+    phase = (seed % 628) / 100.0
+    period = 3600 * (1 + seed % 24)
+    t = timestamp_ms / 1000.0
+    wave = 0.03 * math.sin(t / period + phase) + 0.01 * math.sin(t / 977.0 + phase * 3)
+    return base * (1 + wave)
+
+
+def synthetic_indicator(symbol, column, now_ms):
+    """Deterministic TradingView scanner value, changing every minute: Recommend.* in -1..1, RSI in 0..100."""
+    seed = _symbol_seed(f"{symbol}{column}{now_ms // 60000}")
+    if column.startswith("Recommend."):
+        return round((seed % 2001) / 1000 - 1, 4)
+    if column.startswith("RSI"):
+        return round((seed % 10000) / 100, 2)
+    return synthetic_price(symbol, now_ms)
+
+
+def synthetic_klines(symbol, interval, start_time, end_time, limit, now_ms):
+    interval_ms = get_interval_seconds(interval) * 1000
+    end_time = min(end_time if end_time is not None else now_ms, now_ms)
+    if start_time is None:
+        start_time = end_time - interval_ms * limit
+    open_time = (start_time + interval_ms - 1) // interval_ms * interval_ms
+
+    klines = []
+    while open_time <= end_time and len(klines) < limit:
+        close_time = open_time + interval_ms - 1
+        last_time = min(close_time, now_ms)
+        open_price = synthetic_price(symbol, open_time)
+        close_price = synthetic_price(symbol, last_time)
+        high = max(open_price, close_price) * 1.002
+        low = min(open_price, close_price) * 0.998
+        volume = 1000 + _symbol_seed(f"{symbol}{open_time}") % 5000
+        trades = 50 + _symbol_seed(f"{open_time}{symbol}") % 500
+        klines.append([
+            open_time, f"{open_price:.6f}", f"{high:.6f}", f"{low:.6f}", f"{close_price:.6f}", f"{volume:.3f}",
+            close_time, f"{volume * close_price:.4f}", trades, f"{volume / 2:.3f}", f"{volume * close_price / 2:.4f}", "0",
+        ])
+        open_time += interval_ms
+    return klines
+
+
+class FakeBinanceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    symbols = []
+    latency = 0.0     # seconds added to every response
+    jitter = 0.0      # up to this many extra seconds, uniformly
+    error_rate = 0.0  # share of API requests answered with 429
+    retry_after = 1   # Retry-After (seconds) sent with a 429
+    rng = random.Random(0)
+    state = None      # shared counters, see make_server
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, str(value))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _charge(self, path, weight, now_ms):
+        """Counts the request and its weight; returns (throttled, weight used this minute, response delay)."""
+        state = self.state
+        with state["lock"]:
+            minute = now_ms // 60000
+            if state["minute"] != minute:
+                state["minute"], state["minute_weight"] = minute, 0
+            throttled = self.rng.random() < self.error_rate
+            stats = state["stats"]
+            stats["requests"] += 1
+            stats["requests_by_path"][path] = stats["requests_by_path"].get(path, 0) + 1
+            if throttled:
+                stats["throttled"] += 1
+            else:
+                stats["weight"] += weight
+                state["minute_weight"] += weight
+            delay = self.latency + (self.rng.uniform(0, self.jitter) if self.jitter else 0)
+            return throttled, state["minute_weight"], delay
+
+    def do_POST(self):
+        parsed = urllib.parse.urlparse(self.path)
+        now_ms = int(time.time() * 1000)
+        if parsed.path != "/crypto/scan":
+            self._send_json({"code": -1, "msg": "Not found."}, status=404)
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            tickers, columns = body["symbols"]["tickers"], body["columns"]
+        except (ValueError, KeyError, TypeError):
+            self._send_json({"error": "bad request"}, status=400)
+            return
+
+        throttled, _, delay = self._charge(parsed.path, 1, now_ms)
+        if delay:
+            time.sleep(delay)
+        if throttled:
+            self._send_json({"error": "Too many requests."}, status=429, headers={"Retry-After": self.retry_after})
+            return
+        # Like TradingView, tickers it does not know are left out. "BINANCE:BTCUSDT.P" is BTCUSDT.
+        known = set(self.symbols)
+        data = []
+        for ticker in tickers:
+            symbol = ticker.split(":")[-1].removesuffix(".P")
+            if symbol in known:
+                data.append({"s": ticker, "d": [synthetic_indicator(symbol, column, now_ms) for column in columns]})
+        self._send_json({"totalCount": len(data), "data": data})
+
+    def do_GET(self):
+        parsed = urllib.parse.urlparse(self.path)
+        params = dict(urllib.parse.parse_qsl(parsed.query))
+        now_ms = int(time.time() * 1000)
+
+        if parsed.path == "/fake/stats":
+            with self.state["lock"]:
+                self._send_json(self.state["stats"])
+            return
+
+        if parsed.path == "/fapi/v1/ticker/price":
+            weight = 1 if "symbol" in params else 2
+        elif parsed.path == "/fapi/v1/klines":
+            weight = klines_weight(int(params.get("limit", 500)))
+        else:
+            self._send_json({"code": -1, "msg": "Not found."}, status=404)
+            return
+
+        throttled, used_weight, delay = self._charge(parsed.path, weight, now_ms)
+        if delay:
+            time.sleep(delay)
+        weight_header = {"X-MBX-USED-WEIGHT-1M": used_weight}
+        if throttled:
+            self._send_json({"code": -1003, "msg": "Too many requests."}, status=429, headers={**weight_header, "Retry-After": self.retry_after})
+            return
+
+        if parsed.path == "/fapi/v1/ticker/price":
+            prices = [{"symbol": s, "price": f"{synthetic_price(s, now_ms):.6f}", "time": now_ms} for s in self.symbols]
+            self._send_json(prices, headers=weight_header)
+        else:
+            symbol = params.get("symbol")
+            if symbol not in self.symbols:
+                self._send_json({"code": -1121, "msg": "Invalid symbol."}, status=400)
+                return
+            klines = synthetic_klines(
+                symbol,
+                params.get("interval", "5m"),
+                int(params["startTime"]) if "startTime" in params else None,
+                int(params["endTime"]) if "endTime" in params else None,
+                int(params.get("limit", 500)),
+                now_ms,
+            )
+            self._send_json(klines, headers=weight_header)
+
+
+def make_server(host="127.0.0.1", port=8765, symbols=None, latency_ms=0, jitter_ms=0, error_rate=0.0, retry_after=1, seed=0):
+    state = {
+        "lock": threading.Lock(),
+        "minute": None,
+        "minute_weight": 0,
+        "stats": {"requests": 0, "weight": 0, "throttled": 0, "requests_by_path": {}},
+    }
+    handler = type("Handler", (FakeBinanceHandler,), {
+        "symbols": list(symbols or []),
+        "latency": latency_ms / 1000,
+        "jitter": jitter_ms / 1000,
+        "error_rate": error_rate,
+        "retry_after": retry_after,
+        "rng": random.Random(seed),
+        "state": state,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local fake Binance futures API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--assets", default=DEFAULT_ASSETS_FILE, help="JSON list of symbols to serve")
+    parser.add_argument("--symbols", type=int, help="serve exactly this many symbols, padding the list with synthetic ones")
+    parser.add_argument("--latency", type=float, default=0, help="ms added to every response")
+    parser.add_argument("--jitter", type=float, default=0, help="up to this many extra ms per response")
+    parser.add_argument("--error-rate", type=float, default=0, help="share of requests answered with 429 (0-1)")
+    parser.add_argument("--retry-after", type=float, default=1, help="Retry-After seconds sent with a 429")
+    parser.add_argument("--seed", type=int, default=0, help="seed for jitter and 429 injection")
+    args = parser.parse_args()
+
+    with open(args.assets) as f:
+        symbols = json.load(f)
+    if args.symbols is not None:
+        symbols = synthetic_symbols(args.symbols, symbols)
+
+    server = make_server(args.host, args.port, symbols, args.latency, args.jitter, args.error_rate, args.retry_after, args.seed)
+    print(f"Fake Binance serving {len(symbols)} symbols on http://{args.host}:{args.port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
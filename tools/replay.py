@@ -0,0 +1,280 @@
+"""Replays stored kline history through the scanner's column computation, in simulated time.
+
+Pull a month of base interval klines once (kept in --cache-dir for later runs):
+
+    python3 -m tools.replay --fetch --start 2026-09-01 --end 2026-10-01
+
+then try thresholds and durations offline, with a copy of scanner_config.json:
+
+    python3 -m tools.replay --start 2026-09-01 --end 2026-10-01 --config my_config.json --alerts alerts.jsonl --output replay.npz
+
+Every column is evaluated for all symbols at each base candle close (or every
+--step) in a few vectorized passes over the whole history, with the same
+column math and alert levels (threshold2/threshold, hysteresis, cooldown) as
+the live scanner. --output saves percentage and volatility of every column
+over time (.npz, symbols x times), --alerts every alert as a JSON line.
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from core.config_loader import assets_config, scanner_config, require_config
+from core.alerts import AlertEngine, get_level
+from core.column_engine import compute_change_series
+from core.kline_cache import KlineCache
+from core.klines import merge_klines
+from core.scanner import VolatilityScanner
+from utils import get_interval_seconds
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+def parse_time(value):
+    """ISO date or datetime, UTC unless it has an offset -> ms."""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp() * 1000)
+
+
+def format_time(ms):
+    return datetime.fromtimestamp(ms / 1000, timezone.utc).isoformat(timespec="seconds")
+
+
+async def fetch_history(scanner, cache, assets, start_ms, end_ms):
+    """Pulls the base interval klines of [start_ms, end_ms] the cache does not hold yet, page by page."""
+    interval, interval_ms = scanner.base_interval, scanner.base_interval_ms
+    semaphore = asyncio.Semaphore(scanner.max_concurrency)
+
+    async def fetch_range(asset, range_start_ms, range_end_ms):
+        pages = []
+        while range_start_ms <= range_end_ms:
+            klines = await scanner.exchange.get_historical_data_async(asset, range_start_ms, range_end_ms, interval, 1000)
+            if klines is None or len(klines) == 0:
+                break
+            pages.append(klines)
+            if len(klines) < 1000:
+                break
+            range_start_ms = int(klines["close_time"][-1]) + 1
+        return pages
+
+    async def fetch_asset(asset):
+        async with semaphore:
+            klines = cache.load(asset, interval, end_ms, repair=False)
+            ranges = [(start_ms, end_ms)] if len(klines) == 0 else [
+                (start_ms, int(klines["open_time"][0]) - 1),
+                (int(klines["open_time"][-1]) + interval_ms, end_ms),
+            ]
+            pages = []
+            for range_start_ms, range_end_ms in ranges:
+                if range_start_ms <= range_end_ms:
+                    pages += await fetch_range(asset, range_start_ms, range_end_ms)
+            if not pages:
+                return 0
+            for page in pages:
+                klines = merge_klines(klines, page)
+            cache.store(asset, interval, klines[klines["close_time"] <= end_ms])  # closed candles only
+            return sum(len(page) for page in pages)
+
+    fetched = await asyncio.gather(*(fetch_asset(asset) for asset in assets))
+    print(f"Fetched {sum(fetched)} klines for {sum(1 for n in fetched if n)} symbols", flush=True)
+
+
+def load_base_grid(cache, assets, interval, interval_ms, grid_start_ms, end_ms):
+    """Every symbol's stored closes on one base interval grid: (open_times, closes), NaN where a candle is missing."""
+    num_steps = (end_ms - grid_start_ms) // interval_ms + 1
+    open_times = grid_start_ms + np.arange(num_steps, dtype=np.int64) * interval_ms
+    closes = np.full((len(assets), num_steps), np.nan)
+    for row, asset in enumerate(assets):
+        klines = cache.load(asset, interval, end_ms, repair=False)
+        klines = klines[(klines["open_time"] >= grid_start_ms) & (klines["open_time"] <= end_ms)]
+        closes[row, (klines["open_time"] - grid_start_ms) // interval_ms] = klines["close"]
+    return open_times, closes
+
+
+def rollup_closes(open_times, closes, ratio):
+    """Closes of bars `ratio` base candles long: each bar's last present candle, like rollup_klines."""
+    num_assets, num_steps = closes.shape
+    num_bars = -(-num_steps // ratio)
+    padded = np.full((num_assets, num_bars * ratio), np.nan)
+    padded[:, :num_steps] = closes
+    padded = padded.reshape(num_assets, num_bars, ratio)
+    last_present = np.where(~np.isnan(padded), np.arange(ratio), -1).max(axis=2)
+    bar_closes = np.take_along_axis(padded, np.maximum(last_present, 0)[:, :, None], axis=2)[:, :, 0]
+    bar_closes[last_present < 0] = np.nan
+    return open_times[::ratio], bar_closes
+
+
+def replay_columns(scanner, open_times, closes, eval_steps, chunk_size):
+    """Column values at every eval step: {column name: {"percentage", "volatility"}} of symbols x eval steps."""
+    base_ms = scanner.base_interval_ms
+    eval_times = open_times[eval_steps] + base_ms - 1  # each base candle's close
+    prices = closes[:, eval_steps]
+    multiplier = scanner.volatility_config["std_dev_multiplier"]
+    min_coverage = scanner.volatility_config.get("min_coverage", 1.0)
+
+    results = {}
+    for interval, durations in scanner._get_interval_groups().items():
+        interval_ms = get_interval_seconds(interval) * 1000
+        ratio = interval_ms // base_ms
+        group_times, group_closes = rollup_closes(open_times, closes, ratio) if ratio > 1 else (open_times, closes)
+        group_close_times = np.broadcast_to(group_times + interval_ms - 1, group_closes.shape)
+        lookback_bars = max(durations) * 1000 // interval_ms + 2
+        matrices = {name: np.full((closes.shape[0], len(eval_steps), len(durations)), np.nan, dtype=np.float32) for name in ("percentage", "volatility")}
+
+        for chunk_start in range(0, len(eval_steps), chunk_size):
+            chunk = slice(chunk_start, chunk_start + chunk_size)
+            chunk_times = eval_times[chunk]
+            # Only the bars the chunk's windows reach; the forming bar's close is the price at each eval time.
+            first_bar = max(0, int((chunk_times[0] - group_times[0]) // interval_ms) - lookback_bars)
+            last_bar = int((chunk_times[-1] - group_times[0]) // interval_ms) + 1
+            values = compute_change_series(
+                group_times[first_bar:last_bar], group_closes[:, first_bar:last_bar], group_close_times[:, first_bar:last_bar],
+                prices[:, chunk], durations, interval_ms, chunk_times, multiplier,
+                last_closes=prices[:, chunk] if ratio > 1 else None, min_coverage=min_coverage,
+            )
+            matrices["percentage"][:, chunk, :] = np.round(values["percentage"], 1)  # as the live rows hold it, "%.1f"
+            matrices["volatility"][:, chunk, :] = values["volatility"]
+
+        for column in scanner.change_columns:
+            if scanner.column_intervals[column["name"]] == interval:
+                i = durations.index(int(column["duration"]))
+                results[column["name"]] = {name: matrix[:, :, i] for name, matrix in matrices.items()}
+    return eval_times, results
+
+
+def replay_alerts(engine, assets, eval_times, results):
+    """Steps the live alert rules through time, vectorized over symbols."""
+    alerts = []
+    for column_name, levels in engine.columns.items():
+        thresholds = [threshold for _, threshold in levels]
+        percentages = np.round(results[column_name]["percentage"].astype(np.float64), 1)  # back to the exact "%.1f" values
+        volatilities = results[column_name]["volatility"]
+        level = np.zeros(len(assets), dtype=np.int64)
+        direction = np.zeros(len(assets), dtype=np.int64)  # 1 up, -1 down, 0 not seen yet
+        last_sent = np.full((len(assets), len(levels) + 1, 2), -np.inf)
+
+        for step, event_time_ms in enumerate(eval_times):
+            percentage = percentages[:, step]
+            present = ~np.isnan(percentage)
+            new_direction = np.where(percentage >= 0, 1, -1)
+            previous = np.where(direction == new_direction, level, 0)
+            new_level = get_level(thresholds, np.abs(np.nan_to_num(percentage)), previous, engine.hysteresis)
+            raised = present & (direction != 0) & (new_level > previous)
+            side = (new_direction > 0).astype(np.int64)
+            raised &= event_time_ms - last_sent[np.arange(len(assets)), new_level, side] >= engine.cooldown_ms
+            level = np.where(present, new_level, level)
+            direction = np.where(present, new_direction, direction)
+
+            for row in np.flatnonzero(raised):
+                last_sent[row, new_level[row], side[row]] = event_time_ms
+                name, threshold = levels[new_level[row] - 1]
+                volatility = volatilities[row, step]
+                alerts.append({
+                    "time": format_time(event_time_ms),
+                    "event_time_ms": int(event_time_ms),
+                    "asset": assets[row],
+                    "column": column_name,
+                    "level": name,
+                    "threshold": threshold,
+                    "direction": "up" if new_direction[row] > 0 else "down",
+                    "percentage": f"{percentage[row]:.1f}",
+                    "volatility": None if np.isnan(volatility) else f"{volatility:.2f}",
+                })
+    alerts.sort(key=lambda alert: alert["event_time_ms"])
+    return alerts
+
+
+def main():
+    require_config()
+    parser = argparse.ArgumentParser(description="Replay stored klines through the scanner's columns and alerts in simulated time.")
+    parser.add_argument("--start", help="first evaluated time, ISO date/datetime (UTC), default 7 days before --end")
+    parser.add_argument("--end", help="last evaluated time, default now")
+    parser.add_argument("--step", help="evaluate every this interval (a multiple of base_interval), default base_interval")
+    parser.add_argument("--config", help="scanner config JSON to replay with instead of config/scanner_config.json")
+    parser.add_argument("--cache-dir", default="cache/replay", help="where the replayed history is kept (separate from the live kline cache)")
+    parser.add_argument("--fetch", action="store_true", help="pull history missing from --cache-dir from the exchange first")
+    parser.add_argument("--symbols", type=int, help="replay only the first N symbols of assets.json")
+    parser.add_argument("--chunk", type=int, default=288, help="eval times computed per batch, bounds memory")
+    parser.add_argument("--output", help="write column values over time to this .npz file")
+    parser.add_argument("--alerts", help="write the alerts to this JSONL file")
+    args = parser.parse_args()
+
+    if args.config:
+        with open(args.config) as f:
+            replay_config = json.load(f)
+        scanner_config.clear()  # the scanner reads this same dict
+        scanner_config.update(replay_config)
+    scanner_config.setdefault("kline_cache", {})["enabled"] = False  # the live cache is left alone
+
+    assets = [asset.replace("BINANCE:", "") for asset in assets_config[:args.symbols]]
+    scanner = VolatilityScanner(assets)
+    base_ms = scanner.base_interval_ms
+    end_ms = parse_time(args.end) if args.end else int(time.time() * 1000)
+    end_ms = end_ms // base_ms * base_ms - 1  # the last closed candle
+    start_ms = parse_time(args.start) if args.start else end_ms - 7 * DAY_MS
+    step = get_interval_seconds(args.step) * 1000 // base_ms if args.step else 1
+
+    # History must reach back a full window before the first eval time; the grid starts on a day
+    # boundary so every coarser column interval's bars line up with it.
+    lookback_ms = max((max(durations) * 1000 + 2 * get_interval_seconds(interval) * 1000) for interval, durations in scanner._get_interval_groups().items())
+    grid_start_ms = (start_ms - lookback_ms) // DAY_MS * DAY_MS
+    # Retention back to the epoch: loading must never trim history a longer replay fetched.
+    cache = KlineCache({scanner.base_interval: end_ms}, {"directory": args.cache_dir})
+
+    timings = {}
+    started = time.perf_counter()
+    if args.fetch:
+        asyncio.run(fetch_history(scanner, cache, assets, grid_start_ms, end_ms))
+        timings["fetch"] = time.perf_counter() - started
+    scanner.exchange.executor.shutdown(wait=False)
+
+    stage_start = time.perf_counter()
+    open_times, closes = load_base_grid(cache, assets, scanner.base_interval, base_ms, grid_start_ms, end_ms)
+    timings["load"] = time.perf_counter() - stage_start
+    missing = int(np.isnan(closes[:, -1]).sum())
+    if missing == len(assets):
+        print(f"No history in {args.cache_dir} up to {format_time(end_ms)}, run with --fetch first")
+        return
+
+    stage_start = time.perf_counter()
+    first_step = max(0, -(-(start_ms - base_ms + 1 - grid_start_ms) // base_ms))
+    eval_steps = np.arange(first_step, len(open_times), step)
+    eval_times, results = replay_columns(scanner, open_times, closes, eval_steps, args.chunk)
+    timings["columns"] = time.perf_counter() - stage_start
+
+    stage_start = time.perf_counter()
+    # Only the % change columns are replayed, the history grid holds closes only.
+    engine = AlertEngine(scanner.change_columns, {**scanner_config.get("alerts", {}), "sinks": []})
+    alerts = replay_alerts(engine, assets, eval_times, results)
+    timings["alerts"] = time.perf_counter() - stage_start
+
+    print(f"Replayed {len(assets)} symbols x {len(eval_times)} steps ({format_time(eval_times[0])} to {format_time(eval_times[-1])}), "
+          f"{missing} symbols without history at the end")
+    print(" ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items()) +
+          f", {len(assets) * len(eval_times) / max(timings['columns'], 1e-9) / 1e6:.1f}M symbol-steps/s")
+    for column in scanner.change_columns:
+        column_alerts = [alert for alert in alerts if alert["column"] == column["name"]]
+        counts = ", ".join(f"{name} {sum(1 for alert in column_alerts if alert['level'] == name)}" for name in ("threshold2", "threshold"))
+        print(f"  {column['name']}: {len(column_alerts)} alerts ({counts})")
+
+    if args.alerts:
+        with open(args.alerts, "w") as f:
+            for alert in alerts:
+                f.write(json.dumps(alert) + "\n")
+        print(f"Alerts written to {args.alerts}")
+    if args.output:
+        arrays = {"times": eval_times, "assets": np.array(assets)}
+        for column_name, values in results.items():
+            for name, matrix in values.items():
+                arrays[f"{column_name}/{name}"] = matrix
+        np.savez(args.output, **arrays)
+        print(f"Column values written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
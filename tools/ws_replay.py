@@ -0,0 +1,108 @@
+"""Local WebSocket stand-in that replays recorded Binance stream frames.
+
+Record a few minutes of the real stream:
+
+    python3 -m tools.ws_replay record --output frames.jsonl --seconds 120
+
+Replay it to the scanner:
+
+    python3 -m tools.ws_replay serve --input frames.jsonl --port 8766
+
+and set "price_stream": {"url": "ws://127.0.0.1:8766"} in scanner_config.json.
+Each line of the recording is {"t": <seconds since start>, "frame": "<raw text frame>"}.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+DEFAULT_RECORD_URL = "wss://fstream.binance.com/ws"
+
+
+def load_frames(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+async def replay(websocket, frames, speed=1.0, loop=False, close_after=None):
+    """Waits for the client's SUBSCRIBE, then sends the frames with their recorded spacing."""
+    request = json.loads(await websocket.recv())
+    await websocket.send(json.dumps({"result": None, "id": request.get("id")}))
+
+    sent = 0
+    while True:
+        start = time.monotonic()
+        for frame in frames:
+            wait = frame["t"] / speed - (time.monotonic() - start)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            await websocket.send(frame["frame"])
+            sent += 1
+            if close_after is not None and sent >= close_after:
+                await websocket.close()  # lets clients exercise their reconnect path
+                return
+        if not loop:
+            return
+
+
+async def serve(frames, host, port, speed, loop, close_after):
+    import websockets
+
+    async def handler(websocket):
+        await replay(websocket, frames, speed, loop, close_after)
+
+    async with websockets.serve(handler, host, port):
+        print(f"Replaying {len(frames)} frames on ws://{host}:{port}")
+        await asyncio.Future()
+
+
+async def record(url, stream, output, seconds):
+    import websockets
+
+    async with websockets.connect(url, max_size=None) as websocket:
+        await websocket.send(json.dumps({"method": "SUBSCRIBE", "params": [stream], "id": 1}))
+        start = time.monotonic()
+        count = 0
+        with open(output, "w") as f:
+            while time.monotonic() - start < seconds:
+                try:
+                    message = await asyncio.wait_for(websocket.recv(), timeout=seconds)
+                except asyncio.TimeoutError:
+                    break
+                if '"result"' in message[:20]:
+                    continue  # subscription ack
+                f.write(json.dumps({"t": round(time.monotonic() - start, 3), "frame": message}) + "\n")
+                count += 1
+    print(f"Recorded {count} frames to {output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record and replay Binance WebSocket frames.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve")
+    serve_parser.add_argument("--input", required=True)
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8766)
+    serve_parser.add_argument("--speed", type=float, default=1.0, help="replay speed multiplier")
+    serve_parser.add_argument("--loop", action="store_true", help="replay the recording forever")
+    serve_parser.add_argument("--close-after", type=int, help="close the connection after this many frames")
+
+    record_parser = subparsers.add_parser("record")
+    record_parser.add_argument("--url", default=DEFAULT_RECORD_URL)
+    record_parser.add_argument("--stream", default="!miniTicker@arr")
+    record_parser.add_argument("--output", required=True)
+    record_parser.add_argument("--seconds", type=float, default=60)
+
+    args = parser.parse_args()
+    try:
+        if args.command == "serve":
+            asyncio.run(serve(load_frames(args.input), args.host, args.port, args.speed, args.loop, args.close_after))
+        else:
+            asyncio.run(record(args.url, args.stream, args.output, args.seconds))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 from datetime import datetime, timedelta, timezone
 import numpy as np
 import json
+import math
 
 def get_interval_seconds(interval):
     """Converts interval string (e.g., "1m", "1h") to seconds."""
@@ -56,13 +57,14 @@ def calculate_percentage_change(old_price, current_price):
     except ZeroDivisionError:
         return None
 
-def calculate_volatility(price_changes, std_dev_multiplier):
-    """Calculates volatility based on price changes."""
-    if not price_changes or any(change is None for change in price_changes):
+def calculate_volatility(price_changes, std_dev_multiplier, min_coverage=1.0):
+    """Calculates volatility based on price changes. Missing (None) changes are left out as long as
+    at least min_coverage of them are there."""
+    if not price_changes:
         return None
 
     valid_changes = [change for change in price_changes if change is not None]
-    if not valid_changes or len(valid_changes) < 2:  # Need at least 2 points for std dev
+    if len(valid_changes) < max(2, math.ceil(min_coverage * len(price_changes) - 1e-9)):  # Need at least 2 points for std dev
         return None
 
     std_dev = np.std(valid_changes)